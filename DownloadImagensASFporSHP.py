@@ -1,133 +1,188 @@
-#DownloadImagensASFporSHP
-#_________________________________________________________________________________________
-# Rotina para buscar imagens de setélite na plataforma ASF ao longo do tempo em um local 
-# determinado por um shapefile 
-#Abre e lê arquivo shp> Transforma as coords em WKT> Faz a busca no ASF com os parametros 
-#determinados> Salva a busca em um arquivo .csv> Autentica as credenciais do ASF para o 
-#download dos arquivos> Realiza o download da pesquisa.
-#_________________________________________________________________________________________
-# MIT License
-# 
-# Permission is hereby granted, free of charge, to any person obtaining a copy
-# of this software and associated documentation files (the "Software"), to deal
-# in the Software without restriction, including without limitation the rights
-# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
-# copies of the Software, and to permit persons to whom the Software is
-# furnished to do so, subject to the following conditions:
-# 
-# The above copyright notice and this permission notice shall be included in all
-# copies or substantial portions of the Software.
-# 
-# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
-# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
-# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
-# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
-# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
-# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
-# SOFTWARE.
-#__________________________________________________________________________________________
-# Author: Maria Paula Graziotto
-# Github: Graziottomp
-# Email: graziotto.mp@outlook.com
-# Created: 2024-06-20
-#__________________________________________________________________________________________
-
-
-#Bibliotecas
-import os
-from pathlib import Path    #Acessa os diretórios do computador
-import asf_search as asf    #Acessa a plataforma ASF
-import getpass              #Recebe e verifica as credeenciais para acesso aos dados
-import glob                 #Percorre a lista de arquivos no diretório
-import geopandas as gpd     #Para ler e processar o arquivo .shp
-import shapely.geometry     #Manipulação dos polígonos
-import csv                  #Cria, abre e manipula arquivos .csv
-
-#Cria ou confere se existe o diretório que será salvo as imagens
-def create_directories(dirs):
-    for d in dirs:
-        Path(d).mkdir(parents=True, exist_ok=True)
-
-#Abre os arquivos .shp e extrai as coordenadas do polígonos
-def read_shapefiles(shapefile_directory):
-    shapefiles = glob.glob(os.path.join(shapefile_directory, '*.shp'))
-    polygons = []
-    for shp_file in shapefiles:
-        gdf = gpd.read_file(shp_file)
-        for _, row in gdf.iterrows():
-            polygons.append(row.geometry)
-    return polygons
-
-#Transforma as coordenadas dos polígonos em WTK para criar a Area Of Interest
-def get_wkt_from_polygons(polygons):
-    wkt_list = [polygon.wkt for polygon in polygons]
-    return wkt_list
-
-#Armazena o resultado da busca feita no ASF em um .csv para ter o catálogo de imagens 
-
-def save_results_to_csv(results, filename):
-    with open(filename, "w") as f:
-        f.writelines(results.csv())
-    print(*results.csv(), sep='')
-
-
-#Função que define aonde e o que será feito
-def main():
-    # Definição dos diretórios
-    dirs = "caminho para o arquivo"
-    shp_dir = "caminho para o arquivo"
-
-    # Leitura dos arquivos shapefile e criação da Área de Interesse (AOI)
-    polygons = read_shapefiles(shp_dir)
-    if not polygons:
-        print("Nenhum shapefile encontrado.")
-        return
-
-    wkt_list = get_wkt_from_polygons(polygons)
-    if not wkt_list:
-        print("Nenhum polígono válido encontrado.")
-        return
-
-    aoi = wkt_list[0]  # Exemplo: usa o primeiro polígono da lista
-
-    # Parâmetros da pesquisa, trocar conforme a necessidade
-    search_opts = {
-        'platform': asf.PLATFORM.SENTINEL1,  
-        'beamMode': asf.BEAMMODE.IW,
-        'polarization': asf.POLARIZATION.VV, 
-        'start': '2024-01-01T00:00:00Z',
-        'end': '2024-06-20T23:59:59Z'
-    }
-
-    # Executa a pesquisa e obtém os resultados
-    results = asf.geo_search(intersectsWith=aoi, **search_opts)
-    print(f'{len(results)} resultados encontrados')
-    print(results)
-
-    # Salva os resultados em um arquivo CSV, pode trocar o nome "search_results.csv"
-    save_results_to_csv(results, "search_results.csv")
-
-    # Pergunta ao usuário se deseja continuar com o download das imagens
-    proceed = input("Deseja continuar com o download das imagens? (s/n): ")
-    if proceed.lower() != 's':
-        print("Download cancelado pelo usuário.")
-        return
-    
-    # Autenticação - digite sua autenticação 
-    username = input('Username:')
-    password = getpass.getpass('Password:')
-
-    try:
-        session = asf.ASFSession().auth_with_creds(username, password)
-    except asf.ASFAuthenticationError as e:
-        print(f'Falha na autenticação: {e}')
-        return
-    else:
-        print('Autenticação bem-sucedida!')
-
-    # Realiza o download das imagens
-    results.download(path=dirs[0], session=session, processes=50)
-
-
-if __name__ == "__main__":
-    main()
+#DownloadImagensASFporSHP
+#_________________________________________________________________________________________
+# Rotina para buscar imagens de setélite na plataforma ASF ao longo do tempo em um local 
+# determinado por um shapefile 
+#Abre e lê arquivo shp> Transforma as coords em WKT> Faz a busca no ASF com os parametros 
+#determinados> Salva a busca em um arquivo .csv> Autentica as credenciais do ASF para o 
+#download dos arquivos> Realiza o download da pesquisa.
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2024-06-20
+#__________________________________________________________________________________________
+
+
+#Bibliotecas
+import os
+from pathlib import Path    #Acessa os diretórios do computador
+import asf_search as asf    #Acessa a plataforma ASF
+import getpass              #Recebe e verifica as credeenciais para acesso aos dados
+import glob                 #Percorre a lista de arquivos no diretório
+import argparse             #Opções de linha de comando
+import asyncio
+import shlex
+import subprocess           #Executa as etapas seguintes no modo de monitoramento
+from datetime import timedelta
+from asf_downloader import download_granules   #Download retomável e verificado dos granules
+from asf_aoi_search import export_catalog, search_new_granules  #Busca de todas as AOIs, com cache
+from scene_matching import read_vector_layers   #Leitura colunar dos shapefiles
+from catalog_state import CatalogState, FOUND, DOWNLOADED, PROCESSED   #Estado do monitoramento
+
+#Cria ou confere se existe o diretório que será salvo as imagens
+def create_directories(dirs):
+    for d in dirs:
+        Path(d).mkdir(parents=True, exist_ok=True)
+
+#Abre os arquivos .shp de uma vez (leitura colunar) e extrai as geometrias dos polígonos,
+#em lon/lat, pois as buscas no ASF são feitas em lon/lat
+def read_shapefiles(shapefile_directory):
+    shapefiles = glob.glob(os.path.join(shapefile_directory, '*.shp'))
+    if not shapefiles:
+        return []
+    gdf = read_vector_layers(shapefiles, columns=[], crs='EPSG:4326')
+    return gdf.geometry.to_numpy()
+
+
+#Autentica no Earthdata: usa as variáveis de ambiente EARTHDATA_USERNAME e EARTHDATA_PASSWORD
+#ou, se não existirem, pede as credenciais
+def authenticate():
+    username = os.environ.get('EARTHDATA_USERNAME') or input('Username:')
+    password = os.environ.get('EARTHDATA_PASSWORD') or getpass.getpass('Password:')
+
+    try:
+        session = asf.ASFSession().auth_with_creds(username, password)
+    except asf.ASFAuthenticationError as e:
+        print(f'Falha na autenticação: {e}')
+        return None
+    print('Autenticação bem-sucedida!')
+    return session
+
+#Imprime o resumo dos downloads e devolve os arquivos baixados (ou já existentes)
+def report_downloads(statuses):
+    downloaded = sum(status == 'downloaded' for _, status in statuses)
+    skipped = sum(status == 'skipped' for _, status in statuses)
+    print(f'{downloaded} imagens baixadas, {skipped} já existentes')
+    for file_name, status in statuses:
+        if status not in ('downloaded', 'skipped'):
+            print(f'Falha no download de {file_name}: {status}')
+    return [file_name for file_name, status in statuses if status in ('downloaded', 'skipped')]
+
+#Modo de monitoramento: busca apenas as aquisições posteriores à última execução (com uma margem
+#de lookback_days dias, para os granules publicados com atraso), baixa os granules novos (e os
+#que falharam antes) e chama o comando das etapas seguintes com as imagens novas
+def watch(polygons, search_opts, dirs, state_db, on_new=None, lookback_days=3):
+    with CatalogState(state_db) as state:
+        new, footprints = search_new_granules(polygons, search_opts, state,
+                                              lookback=timedelta(days=lookback_days))
+        print(f'{len(new)} granules novos em {len(footprints)} áreas de busca')
+
+        pending = state.with_status(FOUND)
+        if pending:
+            session = authenticate()
+            if session is None:
+                return
+            create_directories([dirs])
+            statuses = asyncio.run(download_granules(pending, dirs, session, max_concurrent=8))
+            ok = set(report_downloads(statuses))
+            state.set_status([g['granule_id'] for g in pending if g['fileName'] in ok], DOWNLOADED)
+
+        # Etapas seguintes (recorte, estatísticas...) só para as imagens ainda não processadas
+        to_process = state.with_status(DOWNLOADED)
+        if on_new and to_process:
+            files = [os.path.join(dirs, g['fileName']) for g in to_process]
+            completed = subprocess.run(shlex.split(on_new) + files)
+            if completed.returncode == 0:
+                state.set_status([g['granule_id'] for g in to_process], PROCESSED)
+            else:
+                print(f'O comando "{on_new}" falhou (código {completed.returncode}); '
+                      f'as imagens serão reenviadas na próxima execução')
+
+#Função que define aonde e o que será feito
+def main():
+    parser = argparse.ArgumentParser(description="Busca e download de imagens do ASF pelas AOIs dos shapefiles")
+    # Definição dos diretórios
+    parser.add_argument('--img-dir', default="caminho para o arquivo")
+    parser.add_argument('--shp-dir', default="caminho para o arquivo")
+    parser.add_argument('--watch', action='store_true',
+                        help="monitoramento: busca e baixa só as aquisições novas desde a última execução")
+    parser.add_argument('--state-db', default='catalog_state.sqlite',
+                        help="banco com o estado do monitoramento")
+    parser.add_argument('--on-new', default=None,
+                        help="comando executado com os caminhos das imagens novas (modo --watch)")
+    parser.add_argument('--lookback-days', type=float, default=3,
+                        help="margem, em dias, antes da última aquisição vista (modo --watch), para "
+                             "encontrar granules publicados com atraso")
+    args = parser.parse_args()
+    dirs = args.img_dir
+
+    # Leitura dos arquivos shapefile e criação da Área de Interesse (AOI)
+    polygons = read_shapefiles(args.shp_dir)
+    if len(polygons) == 0:
+        print("Nenhum shapefile encontrado.")
+        return
+
+    # Parâmetros da pesquisa, trocar conforme a necessidade
+    search_opts = {
+        'platform': asf.PLATFORM.SENTINEL1,  
+        'beamMode': asf.BEAMMODE.IW,
+        'polarization': asf.POLARIZATION.VV, 
+        'start': '2024-01-01T00:00:00Z',
+        'end': '2024-06-20T23:59:59Z'
+    }
+
+    if args.watch:
+        watch(polygons, search_opts, dirs, args.state_db, args.on_new, args.lookback_days)
+        return
+
+    # Executa a pesquisa em todas as AOIs (agrupadas em poucas áreas de busca) gravando o
+    # catálogo das imagens, com os footprints, à medida que as páginas de resultados chegam
+    # (sem granules repetidos); as respostas ficam em cache por 24 h.
+    # Pode trocar o nome "search_results.csv" (ou usar .geojsonl)
+    catalog_file = "search_results.csv"
+    targets, footprints = export_catalog(polygons, search_opts, catalog_file, cache_dir='asf_cache')
+    if not footprints:
+        print("Nenhum polígono válido encontrado.")
+        return
+    total_gb = sum(target['bytes'] or 0 for target in targets) / 1e9
+    print(f'{len(targets)} resultados encontrados em {len(footprints)} áreas de busca '
+          f'({total_gb:.1f} GB), catálogo salvo em {catalog_file}')
+
+    # Pergunta ao usuário se deseja continuar com o download das imagens
+    proceed = input("Deseja continuar com o download das imagens? (s/n): ")
+    if proceed.lower() != 's':
+        print("Download cancelado pelo usuário.")
+        return
+    
+    # Autenticação - digite sua autenticação 
+    session = authenticate()
+    if session is None:
+        return
+
+    # Realiza o download das imagens (retoma arquivos parciais e pula os já baixados)
+    create_directories([dirs])
+    report_downloads(asyncio.run(download_granules(targets, dirs, session, max_concurrent=8)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+#asf_aoi_search
+#_________________________________________________________________________________________
+# Busca no ASF de todas as áreas de interesse (AOIs): agrupa os polígonos próximos em poucas
+# áreas de busca, consulta o catálogo de forma concorrente, remove os granules repetidos entre
+# as áreas e guarda as respostas em disco, com validade (TTL), para não repetir as consultas
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import csv
+import json
+import queue
+import time
+import asyncio
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import shapely
+import shapely.geometry
+import asf_search as asf
+from asf_search.search.search_generator import as_ASFProduct
+from catalog_state import aoi_key
+from asf_downloader import granule_targets
+
+def query_footprints(polygons, merge_distance=0.1, max_vertices=300, tolerance=0.01):
+    """
+    Reduz os polígonos das AOIs a poucas áreas de busca: polígonos a menos de merge_distance
+    uns dos outros formam um grupo, e cada grupo vira a envoltória convexa dos seus polígonos.
+    Envoltórias com mais de max_vertices vértices são simplificadas sem deixar de cobrir os
+    polígonos (expandidas por tolerance antes da simplificação).
+
+    Parâmetros:
+    polygons (list): Geometrias das AOIs em lon/lat (EPSG:4326).
+    merge_distance (float): Distância máxima, em graus, entre polígonos do mesmo grupo.
+    max_vertices (int): Número máximo de vértices de cada área de busca.
+    tolerance (float): Tolerância da simplificação, em graus.
+
+    Retorna:
+    list: Polígonos das áreas de busca.
+    """
+    geoms = shapely.make_valid(np.asarray(polygons, dtype=object))
+    geoms = geoms[~(shapely.is_missing(geoms) | shapely.is_empty(geoms))]
+    if len(geoms) == 0:
+        return []
+
+    # Grupos: partes da união dos polígonos expandidos por metade da distância
+    clusters = shapely.get_parts(shapely.union_all(shapely.buffer(geoms, merge_distance / 2)))
+    tree = shapely.STRtree(clusters)
+    _, cluster_idx = tree.query(shapely.point_on_surface(geoms), predicate='intersects')
+
+    footprints = []
+    for idx in range(len(clusters)):
+        members = geoms[cluster_idx == idx]
+        if len(members) == 0:
+            continue
+        footprint = shapely.convex_hull(shapely.union_all(members))
+        if shapely.get_num_coordinates(footprint) > max_vertices:
+            footprint = shapely.simplify(shapely.buffer(footprint, tolerance), tolerance)
+        footprints.append(footprint)
+    return footprints
+
+class _CacheWriter:
+    # Grava uma resposta no cache à medida que as páginas chegam; o arquivo só substitui o
+    # anterior quando a busca termina sem erro
+    def __init__(self, path, params):
+        self.path = path
+        self.tmp_file = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        self.f = open(self.tmp_file, 'w')
+        self.f.write(json.dumps({'created': time.time(), 'params': params}, default=str) + '\n')
+
+    def write(self, products):
+        for product in products:
+            self.f.write(json.dumps({'umm': product.umm, 'meta': product.meta}, default=str) + '\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.f.close()
+        if exc_type is None:
+            os.replace(self.tmp_file, self.path)
+        else:
+            os.remove(self.tmp_file)
+
+class SearchCache:
+    """
+    Cache em disco das respostas de busca do ASF: um arquivo JSON Lines por consulta,
+    identificado pelo hash dos parâmetros, com um cabeçalho (data e parâmetros) e os registros
+    originais (umm/meta) de cada granule, um por linha, que reconstroem os produtos exatamente
+    como na busca. Respostas mais antigas que ttl segundos são ignoradas. Gravação e leitura
+    são feitas registro a registro, sem carregar a resposta inteira.
+    """
+
+    def __init__(self, cache_dir, ttl=24 * 3600):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(params):
+        return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _path(self, params):
+        return os.path.join(self.cache_dir, self.key(params) + '.jsonl')
+
+    def iter_products(self, params, session=None):
+        """
+        Gerador dos produtos guardados para os parâmetros, ou None se não houver ou se expiraram.
+        """
+        path = self._path(params)
+        try:
+            with open(path) as f:
+                header = json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+        if time.time() - header['created'] > self.ttl:
+            return None
+        session = session or asf.ASFSession()
+
+        def products():
+            with open(path) as f:
+                next(f)
+                for line in f:
+                    yield as_ASFProduct(json.loads(line), session)
+        return products()
+
+    def writer(self, params):
+        """
+        Context manager para gravar uma resposta página a página (método write(products)).
+        """
+        return _CacheWriter(self._path(params), params)
+
+def granule_id(product):
+    """
+    Identificador único do granule (fileID, ou sceneName na falta dele).
+    """
+    return product.properties.get('fileID') or product.properties['sceneName']
+
+def intersecting_granules(products, aoi_tree):
+    """
+    Mantém só os granules cujo footprint intercepta alguma AOI original: as áreas de busca são
+    envoltórias dos grupos de AOIs e também cobrem o espaço entre elas. Granules sem geometria
+    são mantidos.
+
+    Parâmetros:
+    products (list): Granules (ASFProduct).
+    aoi_tree (shapely.STRtree): Árvore das geometrias das AOIs.
+    """
+    products = list(products)
+    with_geometry = [idx for idx, product in enumerate(products) if product.geometry]
+    geometries = [shapely.geometry.shape(products[idx].geometry) for idx in with_geometry]
+    hits, _ = aoi_tree.query(geometries, predicate='intersects')
+    keep = set(np.asarray(with_geometry, dtype=int)[hits].tolist())
+    keep.update(idx for idx, product in enumerate(products) if not product.geometry)
+    return [product for idx, product in enumerate(products) if idx in keep]
+
+def deduplicate_granules(results_list):
+    """
+    Junta os resultados de várias buscas mantendo uma única cópia de cada granule, na ordem em
+    que aparecem.
+    """
+    seen = set()
+    unique = []
+    for results in results_list:
+        for product in results:
+            gid = granule_id(product)
+            if gid not in seen:
+                seen.add(gid)
+                unique.append(product)
+    return asf.ASFSearchResults(unique)
+
+async def _run_queries(queries, max_concurrent):
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def search(params):
+        async with semaphore:
+            return await asyncio.to_thread(asf.geo_search, **params)
+
+    return await asyncio.gather(*(search(params) for params in queries))
+
+# Margem das buscas do monitoramento antes da última aquisição vista: granules publicados com
+# atraso (ou frames de uma passagem que aparecem fora de ordem) têm aquisição anterior a ela
+DEFAULT_LOOKBACK = timedelta(days=3)
+
+def _lookback_start(last_acquisition, lookback, start=None):
+    # Início da busca: a última aquisição menos a margem, sem recuar antes do início pedido
+    last = datetime.fromisoformat(last_acquisition.replace('Z', '+00:00'))
+    if last.tzinfo is None:
+        last = last.replace(tzinfo=timezone.utc)
+    begin = last - lookback
+    if start is not None:
+        requested = datetime.fromisoformat(str(start).replace('Z', '+00:00'))
+        if requested.tzinfo is None:
+            requested = requested.replace(tzinfo=timezone.utc)
+        begin = max(begin, requested)
+    return begin.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def search_new_granules(polygons, search_opts, state, max_concurrent=4, lookback=DEFAULT_LOOKBACK,
+                        **footprint_opts):
+    """
+    Modo de monitoramento: busca cada área a partir da sua última aquisição registrada em state,
+    menos a margem lookback (ou de search_opts['start'] na primeira vez), até agora, e devolve
+    somente os granules ainda não vistos, que ficam registrados em state como encontrados.
+
+    Parâmetros:
+    polygons (list): Geometrias das AOIs em lon/lat (EPSG:4326).
+    search_opts (dict): Parâmetros da busca; 'end' é ignorado.
+    state (CatalogState): Estado do monitoramento.
+    max_concurrent (int): Número máximo de buscas simultâneas.
+    lookback (timedelta): Margem antes da última aquisição vista, para encontrar granules
+        publicados com atraso.
+    footprint_opts: Repassados a query_footprints.
+
+    Retorna:
+    tuple: Granules novos (ASFSearchResults) e as áreas de busca usadas.
+    """
+    footprints = query_footprints(polygons, **footprint_opts)
+    keys = [aoi_key(footprint) for footprint in footprints]
+    queries = []
+    for footprint, key in zip(footprints, keys):
+        params = {k: v for k, v in search_opts.items() if k != 'end'}
+        # A janela começa lookback antes da última aquisição vista; o que se repetir é descartado abaixo
+        last = state.last_acquisition(key)
+        if last is not None:
+            params['start'] = _lookback_start(last, lookback, search_opts.get('start'))
+        params['intersectsWith'] = footprint.wkt
+        queries.append(params)
+
+    results_list = asyncio.run(_run_queries(queries, max_concurrent))
+    for key, results in zip(keys, results_list):
+        starts = [product.properties.get('startTime') for product in results]
+        state.update_aoi(key, max((s for s in starts if s), default=None))
+
+    # A última aquisição de cada área conta todos os resultados; os granules, só os que tocam as AOIs
+    aoi_tree = shapely.STRtree(list(polygons))
+    results = deduplicate_granules(intersecting_granules(results, aoi_tree) for results in results_list)
+    new_ids = set(state.unseen(granule_id(product) for product in results))
+    new = asf.ASFSearchResults([product for product in results if granule_id(product) in new_ids])
+    state.add(dict(target, granule_id=granule_id(product), startTime=product.properties.get('startTime'))
+              for product, target in zip(new, granule_targets(new)))
+    return new, footprints
+
+# Colunas do catálogo de busca (além da geometria do footprint)
+CATALOG_COLUMNS = ['granule_id', 'sceneName', 'fileName', 'startTime', 'stopTime', 'platform',
+                   'beamModeType', 'polarization', 'flightDirection', 'pathNumber', 'frameNumber',
+                   'bytes', 'md5sum', 'url']
+
+class CatalogWriter:
+    """
+    Grava o catálogo de busca registro a registro: CSV (geometria em WKT, coluna geometry) ou
+    GeoJSON em sequência (.geojsonl, um Feature por linha; .geojsons, com o separador RS).
+    """
+
+    def __init__(self, filename):
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in ('.csv', '.geojsonl', '.geojsons'):
+            raise ValueError(f"Formato de catálogo não suportado: {ext} (use .csv, .geojsonl ou .geojsons)")
+        self.ext = ext
+        self.f = open(filename, 'w', newline='')
+        if ext == '.csv':
+            self.csv_writer = csv.writer(self.f)
+            self.csv_writer.writerow(CATALOG_COLUMNS + ['geometry'])
+
+    def write(self, products):
+        for product, target in zip(products, granule_targets(products)):
+            p = product.properties
+            row = dict({name: p.get(name) for name in CATALOG_COLUMNS}, granule_id=granule_id(product),
+                       fileName=target['fileName'], bytes=target['bytes'], md5sum=target['md5sum'],
+                       url=target['url'])
+            if self.ext == '.csv':
+                geometry = shapely.geometry.shape(product.geometry).wkt if product.geometry else ''
+                self.csv_writer.writerow([row[name] for name in CATALOG_COLUMNS] + [geometry])
+            else:
+                feature = {'type': 'Feature', 'geometry': product.geometry, 'properties': row}
+                prefix = '\x1e' if self.ext == '.geojsons' else ''
+                self.f.write(prefix + json.dumps(feature, default=str) + '\n')
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def _iter_pages(params, cache, page_size=250):
+    # Páginas de resultados de uma consulta: do cache, se houver, ou de asf.search_generator,
+    # gravando no cache à medida que chegam
+    if cache is not None:
+        products = cache.iter_products(params)
+        if products is not None:
+            while True:
+                page = list(islice(products, page_size))
+                if not page:
+                    return
+                yield page
+        with cache.writer(params) as writer:
+            for page in asf.search_generator(**params):
+                writer.write(page)
+                yield page
+    else:
+        yield from asf.search_generator(**params)
+
+# Marca de fim das páginas de uma consulta na fila
+_DONE = object()
+
+def export_catalog(polygons, search_opts, filename, cache_dir=None, ttl=24 * 3600, max_concurrent=4,
+                   **footprint_opts):
+    """
+    Busca no ASF os granules de todas as AOIs e grava o catálogo (com os footprints) página a
+    página, à medida que as respostas chegam, sem montar a lista completa de resultados. As
+    consultas das áreas de busca rodam em paralelo (threads) e entregam as páginas a uma fila
+    limitada, de onde são gravadas; granules repetidos entre áreas são gravados uma única vez.
+
+    Parâmetros:
+    polygons (list): Geometrias das AOIs em lon/lat (EPSG:4326).
+    search_opts (dict): Parâmetros da busca (platform, beamMode, start, end...), exceto a área.
+    filename (str): Arquivo do catálogo (.csv, .geojsonl ou .geojsons).
+    cache_dir (str): Pasta do cache das respostas (None = sem cache).
+    ttl (float): Validade das respostas em cache, em segundos.
+    max_concurrent (int): Número máximo de consultas simultâneas.
+    footprint_opts: Repassados a query_footprints.
+
+    Retorna:
+    tuple: Alvos de download (dicionários de asf_downloader.granule_targets, com granule_id) e
+           as áreas de busca usadas.
+    """
+    footprints = query_footprints(polygons, **footprint_opts)
+    cache = SearchCache(cache_dir, ttl) if cache_dir else None
+    queries = [dict(search_opts, intersectsWith=footprint.wkt) for footprint in footprints]
+
+    pages = queue.Queue(maxsize=2 * max_concurrent)
+    stop = threading.Event()
+
+    def produce(params):
+        try:
+            for page in _iter_pages(params, cache):
+                if stop.is_set():
+                    break
+                pages.put(page)
+        finally:
+            pages.put(_DONE)
+
+    aoi_tree = shapely.STRtree(list(polygons))
+    seen = set()
+    targets = []
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrent)) as executor, CatalogWriter(filename) as writer:
+        futures = [executor.submit(produce, params) for params in queries]
+        remaining = len(futures)
+        try:
+            while remaining:
+                page = pages.get()
+                if page is _DONE:
+                    remaining -= 1
+                    continue
+                new = []
+                for product in intersecting_granules(page, aoi_tree):
+                    gid = granule_id(product)
+                    if gid not in seen:
+                        seen.add(gid)
+                        new.append(product)
+                writer.write(new)
+                targets.extend(dict(target, granule_id=granule_id(product))
+                               for product, target in zip(new, granule_targets(new)))
+        finally:
+            # Em caso de erro, libera as threads que ainda estão gravando na fila
+            stop.set()
+            while remaining:
+                if pages.get() is _DONE:
+                    remaining -= 1
+        for future in futures:
+            future.result()
+    return targets, footprints
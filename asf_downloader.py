@@ -0,0 +1,214 @@
+#asf_downloader
+#_________________________________________________________________________________________
+# Download assíncrono e retomável dos granules encontrados na busca do ASF: baixa vários
+# arquivos ao mesmo tempo (concorrência limitada), continua arquivos parciais (.part) com
+# requisições HTTP Range, confere tamanho e MD5 com os metadados da busca, pula os arquivos
+# já baixados e repete as tentativas que falham com espera crescente
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import time
+import asyncio
+import hashlib
+from urllib.parse import urlparse
+import requests
+
+# Tamanho dos blocos lidos da resposta e gravados no arquivo parcial (numa queda de conexão,
+# perde-se no máximo um bloco)
+CHUNK_SIZE = 1024 * 1024
+
+class DownloadError(Exception):
+    """Falha no download ou na verificação de um arquivo."""
+
+def _file_metadata(value, url):
+    # md5sum e bytes podem vir como valor único ou como dicionário por nome de arquivo
+    if isinstance(value, dict):
+        value = value.get(os.path.basename(urlparse(url).path))
+        if isinstance(value, dict):
+            value = value.get('bytes')
+    if value in (None, '', 'NA'):
+        return None
+    return value
+
+def granule_targets(results):
+    """
+    Extrai dos resultados da busca (asf_search) o que é preciso para baixar cada granule.
+
+    Parâmetros:
+    results (ASFSearchResults): Resultados de asf.geo_search / asf.search.
+
+    Retorna:
+    list: Dicionários com url, fileName, bytes (ou None) e md5sum (ou None) de cada granule.
+    """
+    targets = []
+    for product in results:
+        p = product.properties
+        size = _file_metadata(p.get('bytes'), p['url'])
+        targets.append({
+            'url': p['url'],
+            'fileName': p.get('fileName') or os.path.basename(urlparse(p['url']).path),
+            'bytes': int(size) if size is not None else None,
+            'md5sum': _file_metadata(p.get('md5sum'), p['url']),
+        })
+    return targets
+
+def _md5_of_file(path, digest=None):
+    digest = digest or hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest
+
+def _verify(path, size=None, md5=None, digest=None):
+    """
+    Confere tamanho e MD5 de um arquivo. digest é o MD5 já acumulado durante o download
+    (evita reler o arquivo).
+    """
+    actual_size = os.path.getsize(path)
+    if size is not None and actual_size != size:
+        raise DownloadError(f"tamanho {actual_size}, esperado {size}")
+    if md5 is not None:
+        actual_md5 = (digest or _md5_of_file(path)).hexdigest()
+        if actual_md5.lower() != md5.lower():
+            raise DownloadError(f"MD5 {actual_md5}, esperado {md5}")
+
+def is_downloaded(path, size=None, md5=None, check_md5=False):
+    """
+    Verifica se o arquivo já está baixado e completo: pelo tamanho e, se check_md5, pelo MD5.
+    """
+    if not os.path.isfile(path):
+        return False
+    try:
+        _verify(path, size, md5 if check_md5 else None)
+    except DownloadError:
+        return False
+    return True
+
+def _download_once(session, url, part_file, size=None, md5=None, timeout=60):
+    """
+    Uma tentativa de download: continua o arquivo parcial a partir do ponto em que parou
+    (cabeçalho Range) e acumula o MD5 enquanto grava. Devolve o MD5 do arquivo completo.
+    """
+    offset = os.path.getsize(part_file) if os.path.isfile(part_file) else 0
+    digest = hashlib.md5()
+    if size is not None and offset > size:
+        # Parcial maior que o arquivo: recomeça
+        os.remove(part_file)
+        offset = 0
+    if offset and md5 is not None:
+        _md5_of_file(part_file, digest)
+    if size is not None and offset == size:
+        return digest
+
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 416:
+            # Nada a partir de offset: o parcial já está completo
+            return digest
+        response.raise_for_status()
+        if offset and response.status_code != 206:
+            # O servidor ignorou o Range e devolveu o arquivo inteiro
+            offset = 0
+            digest = hashlib.md5()
+        with open(part_file, 'ab' if offset else 'wb') as f:
+            for block in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(block)
+                digest.update(block)
+    return digest
+
+def download_file(session, url, path, size=None, md5=None, retries=5, backoff=2.0, timeout=60,
+                  check_md5_existing=False):
+    """
+    Baixa um arquivo com retomada e verificação. O download é feito em <path>.part, que só é
+    renomeado para path depois de conferidos tamanho e MD5; uma interrupção deixa o parcial,
+    que é continuado na próxima tentativa (ou na próxima execução).
+
+    Parâmetros:
+    session (requests.Session): Sessão autenticada (asf.ASFSession) ou qualquer requests.Session.
+    url (str): URL do arquivo.
+    path (str): Caminho final do arquivo.
+    size (int): Tamanho esperado em bytes (None = não confere).
+    md5 (str): MD5 esperado (None = não confere).
+    retries (int): Número máximo de tentativas.
+    backoff (float): Espera, em segundos, antes da segunda tentativa; dobra a cada falha.
+    timeout (float): Tempo limite de conexão e de leitura, em segundos.
+    check_md5_existing (bool): Se True, confere também o MD5 de arquivos já existentes.
+
+    Retorna:
+    str: 'skipped' se o arquivo já estava baixado, 'downloaded' se foi baixado.
+    """
+    if is_downloaded(path, size, md5, check_md5_existing):
+        return 'skipped'
+
+    part_file = path + '.part'
+    for attempt in range(retries):
+        try:
+            digest = _download_once(session, url, part_file, size, md5, timeout)
+            try:
+                _verify(part_file, size, md5, digest)
+            except DownloadError:
+                # Parcial corrompido: a próxima tentativa recomeça do zero
+                os.remove(part_file)
+                raise
+            os.replace(part_file, path)
+            return 'downloaded'
+        except (requests.RequestException, DownloadError, OSError) as e:
+            if attempt == retries - 1:
+                raise DownloadError(f"{os.path.basename(path)}: {e}") from e
+            time.sleep(backoff * 2 ** attempt)
+
+async def download_granules(targets, directory, session, max_concurrent=4, **kwargs):
+    """
+    Baixa vários arquivos ao mesmo tempo, com no máximo max_concurrent downloads simultâneos.
+    Cada download roda em uma thread (asyncio.to_thread), pois requests é bloqueante.
+
+    Parâmetros:
+    targets (list): Dicionários de granule_targets.
+    directory (str): Pasta de destino.
+    session (requests.Session): Sessão usada por todos os downloads.
+    max_concurrent (int): Número máximo de downloads simultâneos.
+    kwargs: Repassados a download_file (retries, backoff, timeout, check_md5_existing).
+
+    Retorna:
+    list: (fileName, status) de cada granule, na ordem de targets; status é 'downloaded',
+          'skipped' ou a mensagem de erro.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def fetch(target):
+        async with semaphore:
+            path = os.path.join(directory, target['fileName'])
+            try:
+                status = await asyncio.to_thread(download_file, session, target['url'], path,
+                                                 target['bytes'], target['md5sum'], **kwargs)
+            except DownloadError as e:
+                status = str(e)
+            return target['fileName'], status
+
+    return await asyncio.gather(*(fetch(target) for target in targets))
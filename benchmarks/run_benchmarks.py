@@ -0,0 +1,340 @@
+#run_benchmarks
+#_________________________________________________________________________________________
+# Mede o tempo e a memória de cada etapa (mascaramento, recortes, fundos, estatísticas...)
+# em dados sintéticos de vários tamanhos, cada etapa em um processo novo, e guarda os
+# resultados de cada execução em benchmarks/results/ para comparar execuções. Roda offline
+# Uso: python benchmarks/run_benchmarks.py --scales small medium --label antes
+#      python benchmarks/run_benchmarks.py --compare antes depois
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import sys
+import gc
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import rasterio
+import geopandas as gpd
+from synthetic_data import make_dataset
+from crop_slicks_outOf_image import mask_polygons_in_image, mask_polygons_in_image_windowed
+from get_slick_poly_from_multipoly import getSlickPolyFromMultiPolygon
+from crop_image_around_polygon import extract_backgrounds
+from stats_obj_img import load_class_data, list_chip_tasks, stats_batch
+from zonal_stats import zonal_features
+from pipeline import run_pipeline
+from raster_access import RASTER_POOL, BLOCK_CACHE, block_cache_stats
+
+# Tamanhos pré-definidos: dimensões da cena e número de manchas
+SCALES = {
+    'small': {'height': 1024, 'width': 1024, 'polygons': 50},
+    'medium': {'height': 4096, 'width': 4096, 'polygons': 300},
+    'large': {'height': 10240, 'width': 10240, 'polygons': 1000},
+}
+
+# Etapas registradas: nome -> (função, preparação)
+STAGES = {}
+
+def register_stage(name, setup=None):
+    """
+    Registra uma etapa medida. A função recebe (dados, pasta de saída, processos, contexto),
+    onde o contexto é o retorno de setup(dados, pasta de trabalho, processos), executado antes
+    das medições e fora delas (ex.: leitura dos polígonos, geração dos recortes de entrada).
+    """
+    def decorator(func):
+        STAGES[name] = (func, setup)
+        return func
+    return decorator
+
+def _read_inputs(data, workdir, workers):
+    return gpd.read_file(data['shp']), load_class_data(data['classes'])
+
+@register_stage('mask_in_memory', setup=_read_inputs)
+def _mask_in_memory(data, run_dir, workers, context):
+    mask_polygons_in_image(data['scene'], context[0])
+
+@register_stage('mask_windowed', setup=_read_inputs)
+def _mask_windowed(data, run_dir, workers, context):
+    mask_polygons_in_image_windowed(data['scene'], context[0], os.path.join(run_dir, 'masked.tif'))
+
+@register_stage('slick_crops')
+def _slick_crops(data, run_dir, workers, context):
+    getSlickPolyFromMultiPolygon(run_dir, data['database'], data['shp'], data['scene'])
+
+@register_stage('backgrounds', setup=_read_inputs)
+def _backgrounds(data, run_dir, workers, context):
+    for _ in extract_backgrounds(data['scene'], context[0].geometry, 0.05):
+        pass
+
+@register_stage('zonal_stats', setup=_read_inputs)
+def _zonal_stats(data, run_dir, workers, context):
+    zonal_features(data['scene'], context[0], context[1])
+
+@register_stage('pipeline', setup=_read_inputs)
+def _pipeline(data, run_dir, workers, context):
+    run_pipeline(run_dir, data['database'], data['shp'], [data['scene']], context[1], max_workers=workers)
+
+def _chip_tasks(data, workdir, workers):
+    # Recortes de entrada da etapa de estatísticas: os arquivos de auditoria do pipeline
+    class_data = load_class_data(data['classes'])
+    chips_dir = os.path.join(workdir, 'chips')
+    run_pipeline(chips_dir, data['database'], data['shp'], [data['scene']], class_data, max_workers=1, audit=True)
+    tasks = []
+    for root, _, files in os.walk(chips_dir):
+        if any(name.endswith('_background.tif') for name in files):
+            tasks.extend(list_chip_tasks(root))
+    return tasks, class_data
+
+@register_stage('chip_stats', setup=_chip_tasks)
+def _chip_stats(data, run_dir, workers, context):
+    tasks, class_data = context
+    for _ in stats_batch(tasks, class_data, max_workers=workers):
+        pass
+
+def _reset_caches():
+    # Cada medição começa com as imagens fechadas e o cache de blocos vazio
+    RASTER_POOL.close()
+    BLOCK_CACHE.clear()
+    gc.collect()
+
+def _proc_status(field):
+    # Campo de /proc/self/status em bytes (Linux), ou None
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+def _reset_peak_rss():
+    # Zera o pico de RSS do processo (VmHWM), para medir só a etapa (Linux 4.0+)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def _run_stage(name, data, workdir, workers, repeat):
+    """
+    Executa uma etapa em um processo novo: repeat medições de tempo e uma medição de memória
+    (pico do tracemalloc, que inclui os arrays do numpy, e pico de RSS durante a etapa, a
+    comparar com o RSS antes da etapa, já com as importações e a preparação).
+    """
+    import resource
+
+    func, setup = STAGES[name]
+    context = setup(data, workdir, workers) if setup else None
+    times = []
+    for _ in range(repeat):
+        _reset_caches()
+        with tempfile.TemporaryDirectory(dir=workdir) as run_dir:
+            start = time.perf_counter()
+            func(data, run_dir, workers, context)
+            times.append(time.perf_counter() - start)
+
+    _reset_caches()
+    baseline_rss = _proc_status('VmRSS')
+    _reset_peak_rss()
+    with tempfile.TemporaryDirectory(dir=workdir) as run_dir:
+        tracemalloc.start()
+        func(data, run_dir, workers, context)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        'times': times,
+        'time_min': min(times),
+        'time_median': float(np.median(times)),
+        'tracemalloc_peak': peak,
+        # Sem /proc, o pico é o do processo inteiro (ru_maxrss, em KB no Linux)
+        'max_rss': _proc_status('VmHWM') or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'baseline_rss': baseline_rss,
+        'block_cache': block_cache_stats(),
+    }
+
+def run_stage_isolated(name, data, workdir, workers=1, repeat=3):
+    """
+    Executa a etapa em um processo criado do zero (spawn), para que a memória e os caches de uma
+    etapa não interfiram na seguinte.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(_run_stage, name, data, workdir, workers, repeat).result()
+
+def environment():
+    """
+    Versões e máquina da execução, guardadas junto com os resultados.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'rasterio': rasterio.__version__,
+        'gdal': rasterio.__gdal_version__,
+        'geopandas': gpd.__version__,
+    }
+
+def run_benchmarks(scales, stages, data_dir, workers=1, repeat=3, vertices=24, multipart_fraction=0.2,
+                   dtype='float32', tile=256, seed=0):
+    """
+    Mede as etapas em cada tamanho. Os dados sintéticos de cada tamanho são gerados uma vez em
+    data_dir e reaproveitados nas execuções seguintes com os mesmos parâmetros.
+
+    :param scales: dicionário {nome: {'height', 'width', 'polygons'}}.
+    :return: lista de resultados, um por (tamanho, etapa).
+    """
+    results = []
+    for scale_name, scale in scales.items():
+        key = (f"{scale['height']}x{scale['width']}_{scale['polygons']}p_{vertices}v_"
+               f"{multipart_fraction}m_{dtype}_{tile}t_{seed}s")
+        dataset_dir = os.path.join(data_dir, key)
+        marker = os.path.join(dataset_dir, 'paths.json')
+        if os.path.exists(marker):
+            with open(marker) as f:
+                data = json.load(f)
+        else:
+            print(f"Gerando dados sintéticos {key}...")
+            data = make_dataset(dataset_dir, scale['height'], scale['width'], scale['polygons'], vertices,
+                                multipart_fraction, dtype, tile, seed=seed)
+            with open(marker, 'w') as f:
+                json.dump(data, f)
+
+        for stage in stages:
+            record = {'scale': scale_name, 'stage': stage, **scale, 'vertices': vertices,
+                      'multipart_fraction': multipart_fraction, 'dtype': dtype, 'tile': tile, 'workers': workers}
+            try:
+                # Saídas da etapa (e da sua preparação) apagadas ao final; os dados sintéticos ficam
+                with tempfile.TemporaryDirectory(prefix=f'{stage}_', dir=dataset_dir) as workdir:
+                    record.update(run_stage_isolated(stage, data, workdir, workers, repeat))
+                print(f"{scale_name:>8} {stage:<16} {record['time_median']:9.3f} s "
+                      f"{record['tracemalloc_peak'] / 2 ** 20:9.1f} MB (tracemalloc) "
+                      f"{record['max_rss'] / 2 ** 20:9.1f} MB (pico RSS, "
+                      f"{(record['baseline_rss'] or 0) / 2 ** 20:.1f} MB antes da etapa)")
+            except Exception as e:
+                record['error'] = repr(e)
+                print(f"{scale_name:>8} {stage:<16} erro: {e!r}")
+            results.append(record)
+    return results
+
+def save_results(results, results_dir, label, params):
+    os.makedirs(results_dir, exist_ok=True)
+    output_file = os.path.join(results_dir, f'{label}.json')
+    with open(output_file, 'w') as f:
+        json.dump({'label': label, 'created': datetime.now(timezone.utc).isoformat(),
+                   'environment': environment(), 'params': params, 'results': results}, f, indent=1)
+    return output_file
+
+def load_results(name, results_dir):
+    path = name if os.path.exists(name) else os.path.join(results_dir, f'{name}.json')
+    with open(path) as f:
+        return json.load(f)
+
+def compare_results(base, new):
+    """
+    Tabela de comparação de duas execuções por (tamanho, etapa): tempos medianos, picos de
+    memória e a razão nova/base (abaixo de 1 = mais rápido ou menor).
+    """
+    base_records = {(r['scale'], r['stage']): r for r in base['results'] if 'error' not in r}
+    lines = [f"{'tamanho':>8} {'etapa':<16} {'base (s)':>10} {'nova (s)':>10} {'razão':>7} "
+             f"{'base (MB)':>10} {'nova (MB)':>10} {'razão':>7}"]
+    for record in new['results']:
+        old = base_records.get((record['scale'], record['stage']))
+        if old is None or 'error' in record:
+            continue
+        old_mb, new_mb = old['tracemalloc_peak'] / 2 ** 20, record['tracemalloc_peak'] / 2 ** 20
+        lines.append(f"{record['scale']:>8} {record['stage']:<16} {old['time_median']:10.3f} "
+                     f"{record['time_median']:10.3f} {record['time_median'] / old['time_median']:7.2f} "
+                     f"{old_mb:10.1f} {new_mb:10.1f} {new_mb / old_mb if old_mb else float('nan'):7.2f}")
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks das etapas com dados sintéticos")
+    parser.add_argument('--scales', nargs='+', default=['small', 'medium'],
+                        help=f"tamanhos pré-definidos ({', '.join(SCALES)}) ou ALTURAxLARGURA:POLÍGONOS")
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=list(STAGES))
+    parser.add_argument('--vertices', type=int, default=24, help="vértices do contorno de cada mancha")
+    parser.add_argument('--multipart', type=float, default=0.2, help="fração de multipolígonos")
+    parser.add_argument('--dtype', default='float32')
+    parser.add_argument('--tile', type=int, default=256, help="lado dos tiles (0 = faixas)")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'sismom_benchmarks'))
+    parser.add_argument('--results-dir', default=os.path.join(BENCHMARKS_DIR, 'results'))
+    parser.add_argument('--label', default=None, help="nome da execução (padrão: data e hora)")
+    parser.add_argument('--compare', nargs='+', metavar='EXECUÇÃO',
+                        help="compara duas execuções gravadas (ou a indicada com a mais recente) e sai")
+    args = parser.parse_args()
+
+    if args.compare:
+        names = args.compare
+        if len(names) == 1:
+            saved = sorted((os.path.join(args.results_dir, name) for name in os.listdir(args.results_dir)
+                            if name.endswith('.json')), key=os.path.getmtime)
+            names = names + [saved[-1]]
+        print(compare_results(load_results(names[0], args.results_dir), load_results(names[1], args.results_dir)))
+        return
+
+    scales = {}
+    for scale in args.scales:
+        if scale in SCALES:
+            scales[scale] = SCALES[scale]
+        else:
+            size, polygons = scale.split(':')
+            height, width = size.lower().split('x')
+            scales[scale] = {'height': int(height), 'width': int(width), 'polygons': int(polygons)}
+
+    results = run_benchmarks(scales, args.stages, args.data_dir, args.workers, args.repeat, args.vertices,
+                             args.multipart, args.dtype, args.tile, args.seed)
+    label = args.label or datetime.now().strftime('%Y%m%d-%H%M%S')
+    params = {key: value for key, value in vars(args).items() if key not in ('compare', 'results_dir', 'data_dir')}
+    print(f"Resultados salvos em {save_results(results, args.results_dir, label, params)}")
+
+if __name__ == "__main__":
+    main()
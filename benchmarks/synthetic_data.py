@@ -0,0 +1,191 @@
+#synthetic_data
+#_________________________________________________________________________________________
+# Gera dados sintéticos para os benchmarks: cenas SAR com speckle (GeoTIFF de tamanho,
+# tiles e tipo configuráveis) e camadas de manchas (polígonos e multipolígonos alongados,
+# com número de vértices configurável), com a tabela de IDs e de classes usadas pelos scripts
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import csv
+import numpy as np
+import geopandas as gpd
+import rasterio
+from rasterio.features import rasterize
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+from shapely import affinity
+from shapely.geometry import MultiPolygon, Polygon
+
+# Grade das cenas sintéticas (UTM 23S, 10 m, como as GRD reamostradas)
+CRS = 'EPSG:32723'
+PIXEL_SIZE = 10.0
+ORIGIN = (500000.0, 7400000.0)
+# Largura da faixa sem dados na borda esquerda das cenas, em fração da largura
+BORDER_FRACTION = 0.02
+
+def scene_transform():
+    return from_origin(ORIGIN[0], ORIGIN[1], PIXEL_SIZE, PIXEL_SIZE)
+
+def slick_polygon(rng, center, length, width, angle, vertices):
+    """
+    Mancha alongada: polígono estrelado com raios suavemente irregulares, esticado para
+    length x width, girado de angle graus e centrado em center.
+    """
+    theta = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    # Irregularidade suave do contorno (poucas harmônicas com fases aleatórias)
+    radius = np.ones(vertices)
+    for harmonic in range(2, 6):
+        radius += rng.uniform(0, 0.25 / harmonic * 2) * np.cos(harmonic * theta + rng.uniform(0, 2 * np.pi))
+    radius = np.clip(radius, 0.3, None)
+    polygon = Polygon(np.column_stack([radius * np.cos(theta) * length / 2, radius * np.sin(theta) * width / 2]))
+    polygon = affinity.rotate(polygon, angle, origin=(0, 0))
+    polygon = affinity.translate(polygon, *center).buffer(0)
+    if polygon.geom_type == 'MultiPolygon':
+        polygon = max(polygon.geoms, key=lambda part: part.area)
+    return polygon
+
+def make_slick_polygons(height, width, count, vertices=24, multipart_fraction=0.2, img_number=1, seed=0):
+    """
+    Camada de manchas aleatórias dentro da cena: comprimentos log-normais (em torno de 1/20 da
+    largura da cena), larguras de 5% a 30% do comprimento, e multipolígonos de 2 a 4 partes
+    alinhadas em multipart_fraction das manchas.
+
+    As manchas ficam fora da faixa sem dados da borda (BORDER_FRACTION).
+
+    :return: GeoDataFrame com ID_POLY, IMG_NUMBER e a geometria.
+    """
+    rng = np.random.default_rng(seed)
+    transform = scene_transform()
+    left, top = transform.c, transform.f
+    right, bottom = left + width * PIXEL_SIZE, top - height * PIXEL_SIZE
+    scene_size = min(right - left, top - bottom)
+
+    geometries = []
+    for _ in range(count):
+        length = float(np.clip(rng.lognormal(np.log(scene_size / 20), 0.6), 5 * PIXEL_SIZE, scene_size / 3))
+        slick_width = length * rng.uniform(0.05, 0.3)
+        angle = rng.uniform(0, 180)
+        margin = length
+        center = np.array([rng.uniform(left + BORDER_FRACTION * (right - left) + margin, right - margin),
+                           rng.uniform(bottom + margin, top - margin)])
+
+        n_parts = int(rng.integers(2, 5)) if rng.random() < multipart_fraction else 1
+        direction = np.array([np.cos(np.radians(angle)), np.sin(np.radians(angle))])
+        parts = []
+        for part in range(n_parts):
+            # Partes em sequência ao longo da direção da mancha, separadas por um pequeno intervalo
+            offset = (part - (n_parts - 1) / 2) * length / n_parts * 1.2
+            parts.append(slick_polygon(rng, center + offset * direction, length / n_parts, slick_width, angle,
+                                       vertices))
+        geometries.append(parts[0] if n_parts == 1 else MultiPolygon(parts))
+
+    return gpd.GeoDataFrame({'ID_POLY': np.arange(1, count + 1), 'IMG_NUMBER': img_number},
+                            geometry=geometries, crs=CRS)
+
+def make_sar_scene(path, height, width, polygons=None, dtype='float32', tile=256, looks=4, seed=0,
+                   strip_rows=1024, acquisition_time=None):
+    """
+    Grava uma cena SAR sintética: retroespalhamento do mar decrescente com o ângulo de
+    incidência (ao longo das colunas), speckle multiplicativo gama com looks visadas, manchas
+    escurecidas (amortecimento de 60% a 85%) e uma faixa sem dados na borda esquerda, como nas
+    cenas GRD. A cena é gerada e gravada em faixas, sem ocupar a memória da imagem inteira.
+
+    :param dtype: 'float32' (sigma0 linear, nodata NaN) ou inteiro (sigma0 x 10000, nodata 0).
+    :param tile: lado dos tiles do GeoTIFF (0 = gravado em faixas).
+    :return: path.
+    """
+    rng = np.random.default_rng(seed)
+    transform = scene_transform()
+    is_float = np.dtype(dtype).kind == 'f'
+    nodata = np.nan if is_float else 0
+    profile = dict(driver='GTiff', height=height, width=width, count=1, dtype=dtype, crs=CRS,
+                   transform=transform, nodata=nodata, compress='deflate')
+    if tile:
+        profile.update(tiled=True, blockxsize=tile, blockysize=tile)
+        strip_rows = max(tile, strip_rows // tile * tile)
+
+    damping = None
+    if polygons is not None and len(polygons):
+        damping = rng.uniform(0.15, 0.4, len(polygons)).astype('float32')
+    border = int(width * BORDER_FRACTION)
+    incidence = (0.08 * (1 - 0.6 * np.arange(width) / width)).astype('float32')
+
+    with rasterio.open(path, 'w', **profile) as dst:
+        for row_off in range(0, height, strip_rows):
+            rows = min(strip_rows, height - row_off)
+            window = Window(0, row_off, width, rows)
+            sigma0 = incidence * rng.gamma(looks, 1 / looks, (rows, width)).astype('float32')
+            if damping is not None:
+                labels = rasterize(((geometry, idx + 1) for idx, geometry in enumerate(polygons.geometry)),
+                                   out_shape=(rows, width), transform=dst.window_transform(window),
+                                   fill=0, dtype='int32')
+                factor = np.concatenate([[1.0], damping]).astype('float32')
+                sigma0 *= factor[labels]
+            if is_float:
+                data = sigma0.astype(dtype)
+            else:
+                data = np.clip(sigma0 * 10000, 1, np.iinfo(dtype).max).astype(dtype)
+            data[:, :border] = nodata
+            dst.write(data, 1, window=window)
+        if acquisition_time:
+            dst.update_tags(ACQUISITION_START_TIME=acquisition_time)
+    return path
+
+def make_dataset(directory, height, width, polygons, vertices=24, multipart_fraction=0.2, dtype='float32',
+                 tile=256, img_number=1, seed=0):
+    """
+    Conjunto completo no formato esperado pelos scripts: '<IMG_NUMBER> synthetic.tif',
+    slicks.shp, database.csv (IMG_NUMBER e ID_POLY) e classes.csv (ID_POLY, CLASSE e SUBCLASSE).
+
+    :return: dicionário com os caminhos (scene, shp, database, classes).
+    """
+    os.makedirs(directory, exist_ok=True)
+    slicks = make_slick_polygons(height, width, polygons, vertices, multipart_fraction, img_number, seed)
+    paths = {
+        'scene': os.path.join(directory, f'{img_number} synthetic.tif'),
+        'shp': os.path.join(directory, 'slicks.shp'),
+        'database': os.path.join(directory, 'database.csv'),
+        'classes': os.path.join(directory, 'classes.csv'),
+    }
+    make_sar_scene(paths['scene'], height, width, slicks, dtype, tile, seed=seed,
+                   acquisition_time='2024-01-01T08:30:00')
+    slicks.to_file(paths['shp'])
+
+    rng = np.random.default_rng(seed)
+    with open(paths['database'], 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['IMG_NUMBER', 'ID_POLY'])
+        writer.writerows((img_number, id_poly) for id_poly in slicks['ID_POLY'])
+    with open(paths['classes'], 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['ID_POLY', 'CLASSE', 'SUBCLASSE'])
+        for id_poly in slicks['ID_POLY']:
+            classe = rng.choice(['Oil', 'LookAlike'])
+            writer.writerow([id_poly, classe, 'Seep' if classe == 'Oil' and rng.random() < 0.5 else 'Other'])
+    return paths
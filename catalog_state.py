@@ -0,0 +1,147 @@
+#catalog_state
+#_________________________________________________________________________________________
+# Estado persistente do monitoramento: granules já vistos (e se já foram baixados e
+# processados) e a data da última aquisição de cada área de busca, em um banco SQLite, para
+# que cada execução busque e baixe apenas as aquisições novas
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import hashlib
+import sqlite3
+from datetime import datetime, timezone
+
+# Situação de cada granule no monitoramento
+FOUND, DOWNLOADED, PROCESSED = 'found', 'downloaded', 'processed'
+
+def aoi_key(footprint):
+    """
+    Identificador de uma área de busca (hash da sua geometria em WKT).
+    """
+    return hashlib.sha1(footprint.wkt.encode()).hexdigest()[:16]
+
+class CatalogState:
+    """
+    Banco SQLite com os granules vistos nas buscas e a última aquisição de cada área de busca.
+    """
+
+    def __init__(self, db_file):
+        self.conn = sqlite3.connect(db_file)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS granules (
+                granule_id TEXT PRIMARY KEY,
+                file_name TEXT,
+                url TEXT,
+                bytes INTEGER,
+                md5sum TEXT,
+                start_time TEXT,
+                status TEXT NOT NULL,
+                updated TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS aois (
+                aoi TEXT PRIMARY KEY,
+                last_acquisition TEXT,
+                last_run TEXT NOT NULL
+            );
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def _now():
+        return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def last_acquisition(self, aoi):
+        """
+        Data (ISO) da aquisição mais recente já vista na área de busca, ou None.
+        """
+        row = self.conn.execute("SELECT last_acquisition FROM aois WHERE aoi = ?", (aoi,)).fetchone()
+        return row[0] if row else None
+
+    def update_aoi(self, aoi, last_acquisition=None):
+        """
+        Registra a busca de uma área, avançando a última aquisição (nunca a recua).
+        """
+        previous = self.last_acquisition(aoi)
+        if previous is not None and (last_acquisition is None or last_acquisition < previous):
+            last_acquisition = previous
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO aois VALUES (?, ?, ?)",
+                              (aoi, last_acquisition, self._now()))
+
+    def unseen(self, granule_ids):
+        """
+        Filtra os identificadores ainda não registrados, mantendo a ordem.
+        """
+        seen = set()
+        ids = list(granule_ids)
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ", ".join("?" * len(batch))
+            seen.update(row[0] for row in self.conn.execute(
+                f"SELECT granule_id FROM granules WHERE granule_id IN ({placeholders})", batch))
+        return [gid for gid in ids if gid not in seen]
+
+    def add(self, granules):
+        """
+        Registra granules novos como encontrados, com o necessário para baixá-los depois.
+
+        :param granules: iterável de dicionários com granule_id, fileName, url, bytes, md5sum e
+                         startTime (ver asf_downloader.granule_targets).
+        """
+        now = self._now()
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO granules VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                  [(g['granule_id'], g['fileName'], g['url'], g['bytes'], g['md5sum'],
+                                    g['startTime'], FOUND, now) for g in granules])
+
+    def set_status(self, granule_ids, status):
+        """
+        Atualiza a situação dos granules (FOUND, DOWNLOADED ou PROCESSED).
+        """
+        now = self._now()
+        with self.conn:
+            self.conn.executemany("UPDATE granules SET status = ?, updated = ? WHERE granule_id = ?",
+                                  [(status, now, gid) for gid in granule_ids])
+
+    def with_status(self, status):
+        """
+        Lista os granules em uma situação, em ordem de aquisição, como dicionários no formato de
+        asf_downloader.granule_targets (com granule_id e startTime).
+        """
+        rows = self.conn.execute("SELECT granule_id, file_name, url, bytes, md5sum, start_time "
+                                 "FROM granules WHERE status = ? ORDER BY start_time", (status,))
+        return [{'granule_id': gid, 'fileName': name, 'url': url, 'bytes': size, 'md5sum': md5,
+                 'startTime': start} for gid, name, url, size, md5, start in rows]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
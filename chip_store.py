@@ -0,0 +1,176 @@
+#chip_store
+#_________________________________________________________________________________________
+# Armazena os recortes (chips) de todos os polígonos em um único GeoTIFF tiled e o
+# índice dos polígonos (ID_POLY, IMG_NUMBER e posição de cada chip) em uma camada
+# GeoPackage ou GeoParquet, para leitura dos chips por ID sem percorrer diretórios
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import warnings
+import geopandas as gpd
+import rasterio
+from rasterio.windows import Window
+from rasterio.errors import NotGeoreferencedWarning
+from affine import Affine
+from rasterio.crs import CRS
+from pyproj import CRS as ProjCRS
+import numpy as np
+
+# Colunas do índice com a posição e a georreferência de cada chip
+CHIP_COLUMNS = ["CHIP_FILE", "CHIP_ROW", "CHIP_COL", "CHIP_HEIGHT", "CHIP_WIDTH", "CHIP_BANDS",
+                "TR_A", "TR_B", "TR_C", "TR_D", "TR_E", "TR_F"]
+
+def pack_chips(shapes, max_width=8192, tile_size=256):
+    """
+    Distribui os chips em prateleiras (linhas) de um mosaico, na ordem recebida.
+    Cada prateleira começa em um múltiplo do tamanho do tile, para que a gravação
+    avance tile a tile sem regravar blocos já comprimidos.
+    
+    Parâmetros:
+    shapes (list): Lista de (altura, largura) de cada chip.
+    max_width (int): Largura máxima do mosaico (chips mais largos ocupam uma prateleira própria).
+    tile_size (int): Tamanho do tile do GeoTIFF do mosaico.
+    
+    Retorna:
+    tuple: Lista de (linha, coluna) de cada chip e dimensões (altura, largura) do mosaico.
+    """
+    offsets = []
+    shelf_row, shelf_height, col = 0, 0, 0
+    atlas_width = 0
+    for height, width in shapes:
+        if col > 0 and col + width > max_width:
+            shelf_row += -(-shelf_height // tile_size) * tile_size
+            shelf_height, col = 0, 0
+        offsets.append((shelf_row, col))
+        col += width
+        shelf_height = max(shelf_height, height)
+        atlas_width = max(atlas_width, col)
+
+    atlas_height = shelf_row + shelf_height
+    return offsets, (max(atlas_height, 1), max(atlas_width, 1))
+
+def create_chip_atlas(chip_file, height, width, count, dtype='float32', nodata=np.nan, tile_size=256,
+                      compress='deflate'):
+    """
+    Cria o GeoTIFF (tiled, comprimido e esparso) que recebe os chips.
+    
+    Retorna:
+    DatasetWriter: Arquivo aberto para gravação.
+    """
+    # O mosaico não é georreferenciado: a transformação de cada chip fica no índice
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', NotGeoreferencedWarning)
+        return rasterio.open(chip_file, 'w', driver='GTiff', height=height, width=width, count=count,
+                             dtype=dtype, nodata=nodata, tiled=True, blockxsize=tile_size,
+                             blockysize=tile_size, compress=compress, sparse_ok=True, bigtiff='IF_SAFER')
+
+def chip_record(chip_file, offset, image, transform):
+    """
+    Monta os atributos do índice que localizam um chip no mosaico.
+    """
+    row, col = offset
+    return {
+        "CHIP_FILE": os.path.basename(chip_file),
+        "CHIP_ROW": row,
+        "CHIP_COL": col,
+        "CHIP_HEIGHT": image.shape[1],
+        "CHIP_WIDTH": image.shape[2],
+        "CHIP_BANDS": image.shape[0],
+        "TR_A": transform.a, "TR_B": transform.b, "TR_C": transform.c,
+        "TR_D": transform.d, "TR_E": transform.e, "TR_F": transform.f,
+    }
+
+def write_chip_index(index, index_file, layer='slicks'):
+    """
+    Grava o índice dos chips em GeoPackage (.gpkg) ou GeoParquet (.parquet).
+    """
+    if index_file.endswith('.parquet'):
+        index.to_parquet(index_file)
+    else:
+        index.to_file(index_file, layer=layer, driver='GPKG')
+
+def _sql_text(value):
+    # Texto SQL com as aspas simples escapadas ('' dentro da string)
+    escaped = str(value).replace("'", "''")
+    return f"'{escaped}'"
+
+def read_chip_index(index_file, id_poly=None, img_number=None, layer='slicks'):
+    """
+    Lê o índice dos chips, opcionalmente filtrando por ID_POLY e IMG_NUMBER. Os dois são
+    comparados como texto: IMG_NUMBER é o número da imagem ou, com matchScenes, o nome da cena
+    (ver get_slick_poly_from_multipoly.sceneNumber), e é gravado sempre como texto.
+    """
+    if index_file.endswith('.parquet'):
+        filters = [('ID_POLY', '=', str(id_poly))] if id_poly is not None else None
+        index = gpd.read_parquet(index_file, filters=filters)
+        if img_number is not None:
+            index = index[index['IMG_NUMBER'].astype(str) == str(img_number)]
+        return index
+
+    conditions = []
+    if id_poly is not None:
+        conditions.append(f"ID_POLY = {_sql_text(id_poly)}")
+    if img_number is not None:
+        # CAST: índices antigos guardavam o IMG_NUMBER como inteiro
+        conditions.append(f"CAST(IMG_NUMBER AS TEXT) = {_sql_text(img_number)}")
+    where = ' AND '.join(conditions) if conditions else None
+    return gpd.read_file(index_file, layer=layer, where=where)
+
+def read_chip(index_file, id_poly, img_number=None, layer='slicks'):
+    """
+    Lê o chip de um polígono direto do mosaico, usando o índice.
+    
+    Parâmetros:
+    index_file (str): Caminho do índice (.gpkg ou .parquet).
+    id_poly (str): ID_POLY do polígono (ou da parte do multipolígono, ex.: "12_1").
+    img_number (int ou str): IMG_NUMBER da imagem, quando o mesmo ID_POLY aparece em várias imagens.
+    
+    Retorna:
+    tuple: Chip (bandas, linhas, colunas), transformação e CRS (rasterio.crs.CRS, como nos
+    recortes gravados um a um, ou None), com os dois formatos de índice.
+    """
+    index = read_chip_index(index_file, id_poly, img_number, layer)
+    if index.empty:
+        raise KeyError(f"Chip {id_poly} não encontrado em {index_file}")
+    record = index.iloc[0]
+
+    chip_file = os.path.join(os.path.dirname(index_file), record['CHIP_FILE'])
+    window = Window(int(record['CHIP_COL']), int(record['CHIP_ROW']),
+                    int(record['CHIP_WIDTH']), int(record['CHIP_HEIGHT']))
+    # O mosaico não é georreferenciado: a transformação de cada chip fica no índice
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', NotGeoreferencedWarning)
+        atlas = rasterio.open(chip_file)
+    with atlas:
+        image = atlas.read(indexes=list(range(1, int(record['CHIP_BANDS']) + 1)), window=window)
+
+    transform = Affine(record['TR_A'], record['TR_B'], record['TR_C'],
+                       record['TR_D'], record['TR_E'], record['TR_F'])
+    crs = None if index.crs is None else CRS.from_wkt(ProjCRS.from_user_input(index.crs).to_wkt())
+    return image, transform, crs
@@ -1,118 +1,237 @@
-#Substitui o valor dos pixels dentro de cada poligonos por NaN e deixa o valor dos pixels
-#ao redor deles intacto 
-#_________________________________________________________________________________________
-# MIT License
-# 
-# Permission is hereby granted, free of charge, to any person obtaining a copy
-# of this software and associated documentation files (the "Software"), to deal
-# in the Software without restriction, including without limitation the rights
-# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
-# copies of the Software, and to permit persons to whom the Software is
-# furnished to do so, subject to the following conditions:
-# 
-# The above copyright notice and this permission notice shall be included in all
-# copies or substantial portions of the Software.
-# 
-# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
-# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
-# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
-# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
-# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
-# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
-# SOFTWARE.
-#__________________________________________________________________________________________
-# Author: Maria Paula Graziotto
-# Github: Graziottomp
-# Email: graziotto.mp@outlook.com
-# Created: 2024-06-20
-#__________________________________________________________________________________________
-
-
-import os
-import glob
-import geopandas as gpd
-import rasterio
-from rasterio import mask
-from rasterio.features import geometry_mask
-from shapely.geometry import box
-import numpy as np
-
-def crop_image_around_polygon(image_file, polygon, buffer_percent):
-    """
-    Recorta a imagem ao redor de um polígono com um buffer adicional.
-    
-    Parâmetros:
-    image_file (str): Caminho do arquivo da imagem.
-    polygon (Polygon): Polígono do shapefile.
-    buffer_percent (float): Percentual de buffer ao redor do polígono.
-    
-    Retorna:
-    tuple: Imagem recortada, transformação e metadados atualizados.
-    """
-    with rasterio.open(image_file) as src:
-        bbox = polygon.bounds
-        minx, miny, maxx, maxy = bbox
-
-        x_buffer = (maxx - minx) * buffer_percent
-        y_buffer = (maxy - miny) * buffer_percent
-
-        bbox_expanded = box(minx - x_buffer, miny - y_buffer, maxx + x_buffer, maxy + y_buffer)
-
-        out_image, out_transform = mask.mask(src, [bbox_expanded], crop=True)
-        out_meta = src.meta
-        out_meta.update({
-            "driver": "GTiff",
-            "height": out_image.shape[1],
-            "width": out_image.shape[2],
-            "transform": out_transform
-        })
-
-        return out_image, out_transform, out_meta
-
-def create_masked_image(image, polygon, transform):
-    """
-    Cria uma imagem mascarada onde a área dentro do polígono é definida como NaN.
-    
-    Parâmetros:
-    image (numpy.ndarray): Imagem de entrada.
-    polygon (Polygon): Polígono do shapefile.
-    transform (Affine): Transformação da imagem.
-    
-    Retorna:
-    numpy.ndarray: Imagem com a área do polígono mascarada.
-    """
-    transformed_polygon = [polygon]
-    mask_data = geometry_mask(transformed_polygon, transform=transform, invert=True, out_shape=image.shape[1:])
-    inverse_mask_data = ~mask_data
-    masked_image = np.where(inverse_mask_data, image, np.nan)
-
-    return masked_image
-
-# Uso do exemplo:
-dir_img = 'caminho para o arquivo'
-image_file = f'{dir_img}caminho para o arquivo.tif'
-shp_dir = f'{dir_img}'
-buffer_percent = 0.05  # 5% de buffer ao redor do polígono
-
-# Garantir que o diretório de saída exista
-os.makedirs(shp_dir, exist_ok=True)
-
-# Iterar sobre cada shapefile no diretório
-for shp_f in glob.glob(os.path.join(shp_dir, '*.shp')):
-    polygons = gpd.read_file(shp_f)
-    
-    for idx, polygon in polygons.iterrows():
-        out_image, out_transform, out_meta = crop_image_around_polygon(image_file, polygon.geometry, buffer_percent)
-        masked_image = create_masked_image(out_image, polygon.geometry, out_transform)
-        
-        output_image_file = os.path.join(shp_dir, f'{os.path.splitext(os.path.basename(shp_f))[0]}_background.tif')
-        with rasterio.open(output_image_file, 'w', **out_meta) as dst:
-            dst.write(masked_image)
-        
-        print(f"Imagem recortada para {os.path.basename(shp_f)} salva com sucesso em {output_image_file}.")
-
-
-
-
-
-
+#Substitui o valor dos pixels dentro de cada poligonos por NaN e deixa o valor dos pixels
+#ao redor deles intacto 
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2024-06-20
+#__________________________________________________________________________________________
+
+
+import os
+import glob
+import geopandas as gpd
+import rasterio
+from rasterio import mask
+from rasterio.features import geometry_mask
+from rasterio.features import geometry_window
+from rasterio.errors import WindowError
+from shapely.geometry import box
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from rasterio.io import DatasetReaderBase
+from crop_slicks_outOf_image import resolve_masked_dtype
+from raster_access import ChunkedRaster, open_raster
+
+def crop_image_around_polygon(image_file, polygon, buffer_percent):
+    """
+    Recorta a imagem ao redor de um polígono com um buffer adicional.
+    
+    Parâmetros:
+    image_file (str): Caminho do arquivo da imagem.
+    polygon (Polygon): Polígono do shapefile.
+    buffer_percent (float): Percentual de buffer ao redor do polígono.
+    
+    Retorna:
+    tuple: Imagem recortada, transformação e metadados atualizados.
+    """
+    with open_raster(image_file) as src:
+        bbox = polygon.bounds
+        minx, miny, maxx, maxy = bbox
+
+        x_buffer = (maxx - minx) * buffer_percent
+        y_buffer = (maxy - miny) * buffer_percent
+
+        bbox_expanded = box(minx - x_buffer, miny - y_buffer, maxx + x_buffer, maxy + y_buffer)
+
+        out_image, out_transform = mask.mask(src, [bbox_expanded], crop=True)
+        out_meta = src.meta
+        out_meta.update({
+            "driver": "GTiff",
+            "height": out_image.shape[1],
+            "width": out_image.shape[2],
+            "transform": out_transform
+        })
+
+        return out_image, out_transform, out_meta
+
+def create_masked_image(image, polygon, transform, nodata=None):
+    """
+    Cria uma imagem mascarada onde a área dentro do polígono recebe NaN (ou o valor nodata),
+    sem promover a imagem para float64. Quando a imagem já está no tipo de saída, ela é
+    mascarada no próprio array, sem cópia.
+    
+    Parâmetros:
+    image (numpy.ndarray): Imagem de entrada.
+    polygon (Polygon): Polígono do shapefile.
+    transform (Affine): Transformação da imagem.
+    nodata (float): Valor dos pixels mascarados (ver resolve_masked_dtype).
+    
+    Retorna:
+    numpy.ndarray: Imagem com a área do polígono mascarada.
+    """
+    out_dtype, fill_value = resolve_masked_dtype(image.dtype, nodata=nodata)
+    masked_image = image.astype(out_dtype, copy=False)
+
+    transformed_polygon = [polygon]
+    mask_data = geometry_mask(transformed_polygon, transform=transform, invert=True, out_shape=image.shape[1:])
+    masked_image[..., mask_data] = fill_value
+
+    return masked_image
+
+def buffered_bbox(polygon, buffer_percent):
+    """
+    Retorna o retângulo envolvente do polígono expandido pelo percentual de buffer.
+    """
+    minx, miny, maxx, maxy = polygon.bounds
+
+    x_buffer = (maxx - minx) * buffer_percent
+    y_buffer = (maxy - miny) * buffer_percent
+
+    return box(minx - x_buffer, miny - y_buffer, maxx + x_buffer, maxy + y_buffer)
+
+def extract_backgrounds(image_file, polygons, buffer_percent):
+    """
+    Recorta o fundo de todos os polígonos abrindo a imagem uma única vez. As janelas são lidas
+    em uma única varredura ordenada (por linha e coluna) da imagem, e cada recorte é igual ao
+    de crop_image_around_polygon seguido de create_masked_image, exceto que os pixels fora do
+    retângulo e os pixels nodata recebem o mesmo valor dos pixels mascarados (NaN, ou o nodata
+    da origem em imagens inteiras), e não o nodata da origem ou 0.
+    
+    Parâmetros:
+    image_file (str): Caminho do arquivo da imagem, ou a imagem já aberta com rasterio.
+    polygons (GeoSeries): Polígonos do shapefile.
+    buffer_percent (float): Percentual de buffer ao redor de cada polígono.
+    
+    Retorna:
+    generator: Tuplas (posição do polígono, imagem mascarada, metadados atualizados), na ordem da varredura.
+    """
+    opened = nullcontext(image_file) if isinstance(image_file, (DatasetReaderBase, ChunkedRaster)) else open_raster(image_file)
+    with opened as src:
+        # Pixels fora do retângulo, nodata e dentro do polígono recebem o mesmo valor, gravado como nodata
+        out_dtype, fill_value = resolve_masked_dtype(src.dtypes[0], src_nodata=src.nodata)
+
+        jobs = []
+        for position, polygon in enumerate(polygons):
+            bbox_expanded = buffered_bbox(polygon, buffer_percent)
+            try:
+                window = geometry_window(src, [bbox_expanded])
+            except WindowError:
+                raise ValueError('Input shapes do not overlap raster.')
+            jobs.append((window.row_off, window.col_off, position, window, bbox_expanded))
+
+        for _, _, position, window, bbox_expanded in sorted(jobs, key=lambda job: job[:3]):
+            out_transform = src.window_transform(window)
+            out_image = src.read(window=window, masked=True, out_dtype=out_dtype)
+            out_image.mask = out_image.mask | geometry_mask([bbox_expanded], transform=out_transform,
+                                                             out_shape=out_image.shape[1:])
+            out_image = out_image.filled(fill_value)
+
+            masked_image = create_masked_image(out_image, polygons.iloc[position], out_transform, fill_value)
+
+            out_meta = src.meta
+            out_meta.update({
+                "driver": "GTiff",
+                "height": masked_image.shape[1],
+                "width": masked_image.shape[2],
+                "transform": out_transform,
+                "dtype": out_dtype,
+                "nodata": fill_value
+            })
+            yield position, masked_image, out_meta
+
+def background_file_names(shp_f, polygons):
+    """
+    Define um nome único de arquivo de fundo para cada polígono do shapefile:
+    <shapefile>_background.tif quando há um único polígono, <ID_POLY>_background.tif quando
+    o ID_POLY é único, ou <shapefile>_<índice>_background.tif nos demais casos.
+    """
+    stem = os.path.splitext(os.path.basename(shp_f))[0]
+    if len(polygons) == 1:
+        return [f'{stem}_background.tif']
+    if 'ID_POLY' in polygons.columns and polygons['ID_POLY'].is_unique:
+        return [f'{id_poly}_background.tif' for id_poly in polygons['ID_POLY']]
+    return [f'{stem}_{idx}_background.tif' for idx in polygons.index]
+
+def crop_backgrounds(image_file, shp_files, buffer_percent):
+    """
+    Grava o recorte de fundo de cada polígono dos shapefiles, ao lado de cada shapefile.
+    
+    Parâmetros:
+    image_file (str): Caminho do arquivo da imagem.
+    shp_files (list): Shapefiles com os polígonos da imagem.
+    buffer_percent (float): Percentual de buffer ao redor de cada polígono.
+    
+    Retorna:
+    list: Caminhos dos arquivos gravados.
+    """
+    written = []
+    for shp_f in shp_files:
+        polygons = gpd.read_file(shp_f)
+        output_dir = os.path.dirname(shp_f)
+        names = background_file_names(shp_f, polygons)
+
+        for position, masked_image, out_meta in extract_backgrounds(image_file, polygons.geometry, buffer_percent):
+            output_image_file = os.path.join(output_dir, names[position])
+            with rasterio.open(output_image_file, 'w', **out_meta) as dst:
+                dst.write(masked_image)
+            written.append(output_image_file)
+
+        print(f"Imagem recortada para {os.path.basename(shp_f)} salva com sucesso em {output_dir}.")
+    return written
+
+def _crop_backgrounds_job(job):
+    image_file, shp_files, buffer_percent = job
+    return crop_backgrounds(image_file, shp_files, buffer_percent)
+
+def crop_backgrounds_parallel(scenes, buffer_percent, max_workers=None):
+    """
+    Executa crop_backgrounds para várias imagens em paralelo (um processo por imagem).
+    
+    Parâmetros:
+    scenes (list): Lista de tuplas (image_file, lista de shapefiles da imagem).
+    buffer_percent (float): Percentual de buffer ao redor de cada polígono.
+    max_workers (int): Número de processos (padrão: número de núcleos).
+    
+    Retorna:
+    list: Para cada imagem, a lista de arquivos gravados (na ordem de scenes).
+    """
+    jobs = [(image_file, shp_files, buffer_percent) for image_file, shp_files in scenes]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_crop_backgrounds_job, jobs))
+
+def main():
+    # Uso do exemplo:
+    dir_img = 'caminho para o arquivo'
+    image_file = f'{dir_img}caminho para o arquivo.tif'
+    shp_dir = f'{dir_img}'
+    buffer_percent = 0.05  # 5% de buffer ao redor do polígono
+
+    # Garantir que o diretório de saída exista
+    os.makedirs(shp_dir, exist_ok=True)
+
+    # Recorta o fundo de cada polígono de cada shapefile do diretório
+    crop_backgrounds(image_file, glob.glob(os.path.join(shp_dir, '*.shp')), buffer_percent)
+
+if __name__ == "__main__":
+    main()
@@ -1,88 +1,247 @@
-#crop_slicks_outOf_image
-# _______________________________________________________________________________________
-#Substitui o valor dos pixels dentro de todos os poligonos(não separando eles) referente 
-# à imagem por NaN e deixa o valor dos pixels ao redor deles intacto 
-# _______________________________________________________________________________________
-# MIT License
-# 
-# Permission is hereby granted, free of charge, to any person obtaining a copy
-# of this software and associated documentation files (the "Software"), to deal
-# in the Software without restriction, including without limitation the rights
-# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
-# copies of the Software, and to permit persons to whom the Software is
-# furnished to do so, subject to the following conditions:
-# 
-# The above copyright notice and this permission notice shall be included in all
-# copies or substantial portions of the Software.
-# 
-# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
-# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
-# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
-# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
-# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
-# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
-# SOFTWARE.
-#__________________________________________________________________________________________
-# Author: Maria Paula Graziotto
-# Github: Graziottomp
-# Email: graziotto.mp@outlook.com
-# Created: 2024-06-20
-#__________________________________________________________________________________________
-
-
-import os
-import glob
-import geopandas as gpd
-import rasterio
-from rasterio.features import geometry_mask
-import numpy as np
-
-def mask_polygons_in_image(image_file, polygons):
-    """
-    Mascara a área de todos os polígonos em uma imagem.
-    
-    Parâmetros:
-    image_file (str): Caminho do arquivo da imagem.
-    polygons (GeoDataFrame): Geodataframe com os polígonos.
-    
-    Retorna:
-    tuple: Imagem mascarada e metadados atualizados.
-    """
-    with rasterio.open(image_file) as src:
-        image = src.read()
-        out_meta = src.meta
-
-        total_mask = np.zeros((src.height, src.width), dtype=bool)
-        
-        for polygon in polygons.geometry:
-            mask_data = geometry_mask([polygon], transform=src.transform, invert=True, out_shape=(src.height, src.width))
-            total_mask |= mask_data
-
-        expanded_mask = np.broadcast_to(total_mask, image.shape)
-        masked_image = np.where(expanded_mask, np.nan, image)
-
-        return masked_image, out_meta
-
-# Uso do exemplo:
-dir_img = 'caminho para o arquivo'
-image_file = glob.glob(f"{dir_img}*.tif")[0]
-shp_file = 'caminho para o arquivo.shp'
-output_file = os.path.join(dir_img, '_output.tif')
-
-polygons = gpd.read_file(shp_file)
-masked_image, out_meta = mask_polygons_in_image(image_file, polygons)
-
-out_meta.update({
-    "driver": "GTiff",
-    "height": masked_image.shape[1],
-    "width": masked_image.shape[2],
-    "count": masked_image.shape[0],
-    "dtype": "float32"
-})
-
-with rasterio.open(output_file, 'w', **out_meta) as dst:
-    for i in range(masked_image.shape[0]):
-        dst.write(masked_image[i], i + 1)
-
-print(f"Imagem final salva com sucesso em {output_file}.")
-
+#crop_slicks_outOf_image
+# _______________________________________________________________________________________
+#Substitui o valor dos pixels dentro de todos os poligonos(não separando eles) referente 
+# à imagem por NaN e deixa o valor dos pixels ao redor deles intacto 
+# _______________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2024-06-20
+#__________________________________________________________________________________________
+
+
+import os
+import glob
+import geopandas as gpd
+import rasterio
+from rasterio.features import rasterize
+from rasterio.windows import bounds as window_bounds
+from shapely import STRtree, box
+import numpy as np
+from raster_access import open_raster, output_tile_shape, iter_block_windows
+
+def _valid_shapes(polygons):
+    """
+    Retorna as geometrias válidas (não nulas e não vazias) e a posição de cada uma no GeoDataFrame.
+    """
+    geometries = polygons.geometry.values
+    valid = ~(geometries.isna() | geometries.is_empty)
+    return geometries[valid], np.flatnonzero(valid)
+
+def rasterize_polygon_labels(polygons, out_shape, transform, id_field='ID_POLY', all_touched=False):
+    """
+    Rasteriza todos os polígonos de uma vez, gravando em cada pixel o identificador do polígono.
+    
+    Parâmetros:
+    polygons (GeoDataFrame): Geodataframe com os polígonos.
+    out_shape (tuple): Dimensões (altura, largura) do raster de saída.
+    transform (Affine): Transformação do raster de saída.
+    id_field (str ou None): Coluna com o identificador inteiro gravado em cada polígono (ex.: ID_POLY).
+        Se for None, ou se a coluna não existir/não for inteira, usa a posição do polígono + 1.
+    all_touched (bool): Marca todos os pixels tocados pelo polígono, como em geometry_mask.
+    
+    Retorna:
+    numpy.ndarray: Raster int32 de rótulos, com 0 fora dos polígonos.
+    """
+    geometries, positions = _valid_shapes(polygons)
+    labels = positions + 1
+    if id_field is not None and id_field in polygons.columns:
+        ids = polygons[id_field].to_numpy()[positions]
+        if np.issubdtype(ids.dtype, np.integer) and (ids > 0).all():
+            labels = ids
+
+    if len(geometries) == 0:
+        return np.zeros(out_shape, dtype='int32')
+
+    # Uma única passada de rasterização para todos os polígonos
+    return rasterize(zip(geometries, labels.astype('int32')), out_shape=out_shape, transform=transform,
+                     fill=0, all_touched=all_touched, dtype='int32')
+
+def rasterize_polygons_mask(polygons, out_shape, transform, all_touched=False):
+    """
+    Rasteriza todos os polígonos de uma vez em uma máscara booleana (True dentro dos polígonos).
+    
+    Parâmetros:
+    polygons (GeoDataFrame): Geodataframe com os polígonos.
+    out_shape (tuple): Dimensões (altura, largura) da máscara.
+    transform (Affine): Transformação da máscara.
+    all_touched (bool): Marca todos os pixels tocados pelo polígono.
+    
+    Retorna:
+    numpy.ndarray: Máscara booleana com a área de todos os polígonos.
+    """
+    geometries, _ = _valid_shapes(polygons)
+    if len(geometries) == 0:
+        return np.zeros(out_shape, dtype=bool)
+
+    burned = rasterize(((geometry, 1) for geometry in geometries), out_shape=out_shape, transform=transform,
+                       fill=0, all_touched=all_touched, dtype='uint8')
+    return burned.view(bool)
+
+def resolve_masked_dtype(src_dtype, dtype=None, nodata=None, src_nodata=None):
+    """
+    Define o tipo de dado e o valor gravado nos pixels mascarados, sem promover a imagem para float64.
+    
+    Parâmetros:
+    src_dtype (str): Tipo de dado da imagem de origem.
+    dtype (str): Tipo de dado desejado na saída (padrão: o mesmo da origem).
+    nodata (float): Valor desejado para os pixels mascarados (padrão: NaN, ou o nodata da origem
+        quando a saída é inteira).
+    src_nodata (float): Valor nodata da imagem de origem.
+    
+    Retorna:
+    tuple: Tipo de dado da saída e valor dos pixels mascarados. Se a saída for inteira e não houver
+    nodata para usar, a saída passa a ser float32 com NaN.
+    """
+    out_dtype = np.dtype(dtype or src_dtype)
+    if nodata is None:
+        if out_dtype.kind == 'f':
+            nodata = np.nan
+        elif src_nodata is not None:
+            nodata = src_nodata
+        else:
+            out_dtype, nodata = np.dtype('float32'), np.nan
+
+    if out_dtype.kind != 'f' and not (float(nodata).is_integer()
+                                      and np.iinfo(out_dtype).min <= nodata <= np.iinfo(out_dtype).max):
+        raise ValueError(f"Valor nodata {nodata} não pode ser representado em {out_dtype}")
+    return out_dtype.name, nodata
+
+def mask_polygons_in_image(image_file, polygons, return_labels=False, dtype=None, nodata=None):
+    """
+    Mascara a área de todos os polígonos em uma imagem, no próprio array lido (sem cópias) e
+    mantendo o tipo de dado da origem (ou o tipo solicitado).
+    
+    Parâmetros:
+    image_file (str): Caminho do arquivo da imagem.
+    polygons (GeoDataFrame): Geodataframe com os polígonos.
+    return_labels (bool): Se True, também retorna o raster de rótulos ID_POLY da imagem.
+    dtype (str): Tipo de dado da saída (ver resolve_masked_dtype).
+    nodata (float): Valor dos pixels mascarados (ver resolve_masked_dtype).
+    
+    Retorna:
+    tuple: Imagem mascarada e metadados atualizados (e o raster de rótulos, se solicitado).
+    """
+    with open_raster(image_file) as src:
+        out_dtype, fill_value = resolve_masked_dtype(src.dtypes[0], dtype, nodata, src.nodata)
+        masked_image = src.read(out_dtype=out_dtype)
+        out_meta = src.meta
+        out_meta.update({
+            "dtype": out_dtype,
+            "nodata": fill_value
+        })
+
+        out_shape = (src.height, src.width)
+        if return_labels:
+            labels = rasterize_polygon_labels(polygons, out_shape, src.transform)
+            total_mask = labels > 0
+        else:
+            total_mask = rasterize_polygons_mask(polygons, out_shape, src.transform)
+
+        masked_image[:, total_mask] = fill_value
+
+        if return_labels:
+            return masked_image, out_meta, labels
+        return masked_image, out_meta
+
+def mask_polygons_in_image_windowed(image_file, polygons, output_file, max_window_bytes=64 * 1024 * 1024,
+                                    compress='deflate', dtype=None, nodata=None):
+    """
+    Mascara a área de todos os polígonos lendo e gravando a imagem por janelas, sem carregá-la inteira.
+    Somente as janelas que tocam algum polígono são rasterizadas; as demais são copiadas diretamente.
+    
+    Parâmetros:
+    image_file (str): Caminho do arquivo da imagem.
+    polygons (GeoDataFrame): Geodataframe com os polígonos.
+    output_file (str): Caminho do GeoTIFF de saída (tiled e comprimido).
+    max_window_bytes (int): Limite de memória (em bytes) de todas as janelas em processamento ao mesmo
+        tempo; cada janela tem no máximo esse limite dividido pelo número de threads (mas ao menos
+        um bloco interno inteiro).
+    compress (str): Compressão do GeoTIFF de saída.
+    dtype (str): Tipo de dado da saída (ver resolve_masked_dtype).
+    nodata (float): Valor dos pixels mascarados (ver resolve_masked_dtype).
+    
+    Retorna:
+    str: Caminho do arquivo de saída.
+    """
+    geometries, _ = _valid_shapes(polygons)
+    tree = STRtree(geometries)
+
+    with open_raster(image_file) as raster:
+        out_dtype, fill_value = resolve_masked_dtype(raster.dtypes[0], dtype, nodata, raster.nodata)
+        tile_h, tile_w = output_tile_shape(raster)
+
+        def mask_chunk(data, window):
+            hits = tree.query(box(*window_bounds(window, raster.transform)), predicate='intersects')
+            if hits.size:
+                window_mask = rasterize_polygons_mask(gpd.GeoSeries(geometries[np.sort(hits)]),
+                                                      (data.shape[1], data.shape[2]),
+                                                      raster.window_transform(window))
+                data[:, window_mask] = fill_value
+            return data
+
+        # Memória por pixel: janela lida já no tipo de saída e máscara
+        bytes_per_pixel = raster.count * np.dtype(out_dtype).itemsize + 1
+        windows = raster.chunks(bytes_per_pixel, (tile_h, tile_w), max(1, max_window_bytes // raster.max_workers))
+
+        # Somente as janelas que tocam algum polígono são rasterizadas; os chunks são lidos e
+        # mascarados em paralelo e gravados em ordem, com no máximo max_window_bytes em processamento
+        raster.write_chunks(mask_chunk, output_file, windows, read_kwargs={'out_dtype': out_dtype},
+                            max_bytes=max_window_bytes, bytes_per_pixel=bytes_per_pixel,
+                            driver="GTiff", dtype=out_dtype, nodata=fill_value, tiled=True,
+                            blockxsize=tile_w, blockysize=tile_h, compress=compress)
+
+    return output_file
+
+def main():
+    # Uso do exemplo:
+    dir_img = 'caminho para o arquivo'
+    image_file = glob.glob(f"{dir_img}*.tif")[0]
+    shp_file = 'caminho para o arquivo.shp'
+    output_file = os.path.join(dir_img, '_output.tif')
+    # Limite de memória por janela; use None para carregar a cena inteira de uma vez
+    max_window_bytes = 256 * 1024 * 1024
+
+    polygons = gpd.read_file(shp_file)
+    if max_window_bytes is not None:
+        mask_polygons_in_image_windowed(image_file, polygons, output_file, max_window_bytes)
+        print(f"Imagem final salva com sucesso em {output_file}.")
+        return
+
+    masked_image, out_meta = mask_polygons_in_image(image_file, polygons)
+
+    out_meta.update({
+        "driver": "GTiff",
+        "height": masked_image.shape[1],
+        "width": masked_image.shape[2],
+        "count": masked_image.shape[0]
+    })
+
+    with rasterio.open(output_file, 'w', **out_meta) as dst:
+        for i in range(masked_image.shape[0]):
+            dst.write(masked_image[i], i + 1)
+
+    print(f"Imagem final salva com sucesso em {output_file}.")
+
+if __name__ == "__main__":
+    main()
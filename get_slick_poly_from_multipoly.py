@@ -1,145 +1,535 @@
-#_________________________________________________________________________________________
-#Corta cada polígono (separando os multipolígonos) e cria um arquivo .shp e um tiff contendo
-#os valores dos pixels dentro de cada um deles e com valor NaN envolta deles
-#_________________________________________________________________________________________
-# MIT License
-# 
-# Permission is hereby granted, free of charge, to any person obtaining a copy
-# of this software and associated documentation files (the "Software"), to deal
-# in the Software without restriction, including without limitation the rights
-# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
-# copies of the Software, and to permit persons to whom the Software is
-# furnished to do so, subject to the following conditions:
-# 
-# The above copyright notice and this permission notice shall be included in all
-# copies or substantial portions of the Software.
-# 
-# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
-# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
-# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
-# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
-# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
-# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
-# SOFTWARE.
-#__________________________________________________________________________________________
-# Author: Maria Paula Graziotto
-# Github: Graziottomp
-# Email: graziotto.mp@outlook.com
-# Created: 2024-06-20
-#__________________________________________________________________________________________
-
-#Bibliotecas
-import rasterio
-from rasterio import mask
-import os
-import geopandas as gpd
-import matplotlib.pyplot as plt
-from shapely.geometry import Polygon, MultiPolygon
-import pandas as pd
-import glob
-import numpy as np
-
-def getSlickPolyFromMultiPolygon(dirImg, dataBase, shpFilePath, tiffFilePath):
-    df = pd.read_csv(dataBase)
-    vectorAll = gpd.read_file(shpFilePath)
-    
-    if isinstance(tiffFilePath, str):
-        tiffFilePaths = [tiffFilePath]
-
-    results = []
-
-    for tiffFilePath in tiffFilePaths:
-        tiffBasename = os.path.basename(tiffFilePath)
-        idxImg = int(tiffBasename.split(' ')[0]) 
-        vectorImg = vectorAll[vectorAll['IMG_NUMBER'] == idxImg]
-
-        if not vectorImg.empty:
-            df_filtered = df[df['IMG_NUMBER'] == idxImg]
-            if 'ID_POLY' in df_filtered.columns and not df_filtered.empty:
-                for idPoly in df_filtered['ID_POLY'].unique():
-                    multipolygonRow = vectorImg[vectorImg['ID_POLY'] == idPoly]
-                    if not multipolygonRow.empty:
-                        geometry = multipolygonRow.geometry.values[0]
-                        if isinstance(geometry, MultiPolygon):
-                            multipolygon = geometry
-                            
-                            outputDir = os.path.join(dirImg, str(idxImg), str(idPoly))
-                            os.makedirs(outputDir, exist_ok=True)
-
-                            geometries = list(multipolygon.geoms)
-                            numPolygons = len(geometries)
-                            
-                            data = {'ID_POLY': [f"{idPoly}_{idx}" for idx in range(1, numPolygons + 1)]}
-                            newGdf = gpd.GeoDataFrame(data, geometry=geometries)
-                            with rasterio.open(tiffFilePath, masked=True, chunks=True) as tiff:
-                                for idx, row in newGdf.iterrows():
-                                    outImage, outTransform = mask.mask(tiff, [row['geometry']], crop=True, nodata=np.nan)
-                                    outMeta = tiff.meta
-
-                                    outMeta.update({
-                                        "driver": "GTiff",
-                                        "height": outImage.shape[1],
-                                        "width": outImage.shape[2],
-                                        "transform": outTransform
-                                    })
-
-                                    outputTiff = os.path.join(outputDir, f"{row['ID_POLY']}.tif")
-                                    outputShp = os.path.join(outputDir, f"{row['ID_POLY']}.shp")
-                                
-                                    with rasterio.open(outputTiff, "w", **outMeta) as dest:
-                                            dest.write(outImage)
-
-                                    row['geometry'] = row['geometry'].buffer(0)
-                                    rowGdf = gpd.GeoDataFrame([row])
-                                    rowGdf.crs = newGdf.crs
-                                    rowGdf.to_file(outputShp)
-
-                                    results.append(f"Created {outputTiff}, shape: {outImage.shape}")
-                                    results.append(f"Created {outputShp}")
-
-                            results.append(f"ID_POLY {idPoly} is a multipolygon, divided into {numPolygons} polygons.")
-                        else:
-                                outputDir = os.path.join(dirImg, str(idxImg), str(idPoly))
-                                os.makedirs(outputDir, exist_ok=True)
-
-                                with rasterio.open(tiffFilePath, masked=True, chunks=True) as tiff:
-                                    outImage, outTransform = mask.mask(tiff, [geometry], crop=True, nodata=np.nan)
-                                    outMeta = tiff.meta
-
-                                    outMeta.update({
-                                        "driver": "GTiff",
-                                        "height": outImage.shape[1],
-                                        "width": outImage.shape[2],
-                                        "transform": outTransform
-                                    })
-                                    
-                                    outputTiff = os.path.join(outputDir, f"{idPoly}.tif")
-                                    outputShp = os.path.join(outputDir, f"{idPoly}.shp")
-
-                                    with rasterio.open(outputTiff, "w", **outMeta) as dest:
-                                        dest.write(outImage)
-
-                                    row = multipolygonRow.iloc[0]
-                                    row['geometry'] = row['geometry'].buffer(0)
-                                    rowGdf = gpd.GeoDataFrame([row])
-                                    rowGdf.crs = vectorImg.crs
-                                    rowGdf.to_file(outputShp)
-
-                                    results.append(f"Created {outputTiff}, shape: {outImage.shape}")
-                                    results.append(f"Created {outputShp}")
-                    else:
-                        results.append(f"No multipolygon found for ID_POLY {idPoly} in image {idxImg}.")
-            else:
-                results.append(f"No ID_POLY found for image number {idxImg}.")
-        else:
-            results.append(f"No polygons found for image number {idxImg}.")
-
-    return results
-
-
-dirImg = 'caminho para o arquivo'
-dataBase = glob.glob(f'{dirImg}\\*.csv')[0]
-shpFilePath = glob.glob(f'{dirImg}\\*.shp')[0]
-tiffFilePath = glob.glob(f"{dirImg}*.tif")[0]
-
-getSlickPolyFromMultiPolygon(dirImg, dataBase, shpFilePath, tiffFilePath)
+#_________________________________________________________________________________________
+#Corta cada polígono (separando os multipolígonos) e cria um arquivo .shp e um tiff contendo
+#os valores dos pixels dentro de cada um deles e com valor NaN envolta deles
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2024-06-20
+#__________________________________________________________________________________________
+
+#Bibliotecas
+import rasterio
+from rasterio import windows
+from rasterio.features import geometry_mask, geometry_window
+from rasterio.errors import WindowError
+import os
+import geopandas as gpd
+import matplotlib.pyplot as plt
+from shapely.geometry import Polygon, MultiPolygon
+import pandas as pd
+import glob
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import chip_store
+from crop_slicks_outOf_image import resolve_masked_dtype
+from scene_matching import read_vector_layers, scene_footprints, match_polygons_to_scenes
+from raster_access import open_raster
+
+# Limites da leitura em grupo: acima deles, as janelas do grupo são lidas uma a uma
+MAX_GROUP_BYTES = 256 * 1024 * 1024
+# Área máxima da janela do grupo em relação à soma das áreas das janelas que o compõem
+MAX_GROUP_AREA_RATIO = 4
+# Entradas do plano por unidade de trabalho da versão paralela, para que um grupo grande de
+# polígonos vizinhos não fique todo com um único processo
+MAX_UNIT_ENTRIES = 16
+
+def groupWindowsByBlock(tiff, polyWindows):
+    """
+    Agrupa as janelas que compartilham algum bloco interno do GeoTIFF, para que cada grupo
+    seja lido (e decodificado) uma única vez.
+
+    :param tiff: imagem aberta com rasterio.
+    :param polyWindows: lista de janelas (Window) de cada polígono.
+    :return: lista de grupos, cada um com os índices das janelas que o compõem.
+    """
+    blockH, blockW = tiff.block_shapes[0]
+    parent = list(range(len(polyWindows)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    blockOwner = {}
+    for idx, window in enumerate(polyWindows):
+        rowStart, colStart = window.row_off // blockH, window.col_off // blockW
+        rowStop = (window.row_off + window.height - 1) // blockH
+        colStop = (window.col_off + window.width - 1) // blockW
+        for blockRow in range(rowStart, rowStop + 1):
+            for blockCol in range(colStart, colStop + 1):
+                owner = blockOwner.setdefault((blockRow, blockCol), idx)
+                rootOwner, rootIdx = find(owner), find(idx)
+                if rootOwner != rootIdx:
+                    parent[rootIdx] = rootOwner
+
+    groups = {}
+    for idx in range(len(polyWindows)):
+        groups.setdefault(find(idx), []).append(idx)
+    return list(groups.values())
+
+def boundedWindowGroups(tiff, polyWindows, bytesPerPixel):
+    """
+    Grupos de groupWindowsByBlock que podem ser lidos em uma única janela. Polígonos esparsos
+    encadeados pelos blocos podem formar uma janela do tamanho da cena: quando a janela do grupo
+    passa de MAX_GROUP_BYTES ou de MAX_GROUP_AREA_RATIO vezes a área das janelas que o compõem,
+    cada janela vira um grupo (os blocos compartilhados continuam sendo decodificados uma única
+    vez, pelo cache de blocos de raster_access).
+
+    :param bytesPerPixel: memória por pixel da janela lida (todas as bandas e a máscara).
+    :return: lista de grupos de índices das janelas.
+    """
+    groups = []
+    for group in groupWindowsByBlock(tiff, polyWindows):
+        groupWindow = windows.union(*[polyWindows[idx] for idx in group])
+        groupArea = groupWindow.width * groupWindow.height
+        membersArea = sum(polyWindows[idx].width * polyWindows[idx].height for idx in group)
+        if len(group) > 1 and (groupArea * bytesPerPixel > MAX_GROUP_BYTES
+                               or groupArea > MAX_GROUP_AREA_RATIO * membersArea):
+            groups.extend([idx] for idx in group)
+        else:
+            groups.append(group)
+    return groups
+
+def polygonWindows(tiff, geometries):
+    """
+    Calcula a janela de recorte de cada geometria, como em mask.mask(..., crop=True).
+    """
+    polyWindows = []
+    for geometry in geometries:
+        try:
+            polyWindows.append(geometry_window(tiff, [geometry]))
+        except WindowError:
+            raise ValueError('Input shapes do not overlap raster.')
+    return polyWindows
+
+def extractPolygonCrops(tiff, geometries, nodata=None, dtype=None):
+    """
+    Recorta a imagem em torno de cada geometria, com o mesmo resultado de
+    mask.mask(tiff, [geometria], crop=True, nodata=nodata), mas lendo uma única vez
+    os blocos compartilhados por geometrias próximas e sem promover a imagem para float64.
+
+    :param tiff: imagem aberta com rasterio.
+    :param geometries: lista de polígonos, no mesmo CRS da imagem.
+    :param nodata: valor atribuído aos pixels fora de cada polígono (padrão: NaN, ou o
+                   nodata da imagem quando ela é inteira; ver resolve_masked_dtype).
+    :param dtype: tipo de dado dos recortes (padrão: o mesmo da imagem).
+    :return: lista de tuplas (outImage, outTransform), na ordem das geometrias.
+    """
+    outDtype, fillValue = resolve_masked_dtype(tiff.dtypes[0], dtype, nodata, tiff.nodata)
+    polyWindows = polygonWindows(tiff, geometries)
+
+    groups = boundedWindowGroups(tiff, polyWindows, tiff.count * (np.dtype(outDtype).itemsize + 1))
+
+    crops = [None] * len(geometries)
+    for group in groups:
+        groupWindow = windows.union(*[polyWindows[idx] for idx in group])
+        groupImage = tiff.read(window=groupWindow, masked=True, out_dtype=outDtype)
+        groupMask = np.ma.getmaskarray(groupImage)
+
+        for idx in group:
+            window = polyWindows[idx]
+            rows = slice(int(window.row_off - groupWindow.row_off), int(window.row_off - groupWindow.row_off + window.height))
+            cols = slice(int(window.col_off - groupWindow.col_off), int(window.col_off - groupWindow.col_off + window.width))
+            outImage = groupImage.data[:, rows, cols].copy()
+
+            outTransform = tiff.window_transform(window)
+            shapeMask = geometry_mask([geometries[idx]], transform=outTransform, out_shape=outImage.shape[1:])
+            outImage[groupMask[:, rows, cols] | shapeMask] = fillValue
+            crops[idx] = (outImage, outTransform)
+
+    return crops
+
+def planImagePolygons(dirImg, idxImg, vectorImg, idPolys):
+    """
+    Monta a lista de polígonos (partes dos multipolígonos) a recortar de uma imagem.
+
+    :return: lista de tuplas (idPoly, outputDir, parts, isMulti); parts é None quando o
+             ID_POLY não existe no shapefile, ou uma lista de (partId, row).
+    """
+    plan = []
+    for idPoly in idPolys:
+        multipolygonRow = vectorImg[vectorImg['ID_POLY'] == idPoly]
+        if multipolygonRow.empty:
+            plan.append((idPoly, None, None, False))
+            continue
+
+        outputDir = os.path.join(dirImg, str(idxImg), str(idPoly))
+        geometry = multipolygonRow.geometry.values[0]
+        isMulti = isinstance(geometry, MultiPolygon)
+        if isMulti:
+            geometries = list(geometry.geoms)
+            data = {'ID_POLY': [f"{idPoly}_{idx}" for idx in range(1, len(geometries) + 1)]}
+            newGdf = gpd.GeoDataFrame(data, geometry=geometries, crs=vectorImg.crs)
+            parts = [(row['ID_POLY'], row) for _, row in newGdf.iterrows()]
+        else:
+            parts = [(idPoly, multipolygonRow.iloc[0])]
+        plan.append((idPoly, outputDir, parts, isMulti))
+    return plan
+
+def writePlannedPolygons(tiff, plan, idxImg, crs):
+    """
+    Recorta em lote todos os polígonos planejados e grava um .tif e um .shp para cada um.
+
+    :return: lista de mensagens, na ordem do plano.
+    """
+    return [message for entryResults in _writePlannedEntries(tiff, plan, idxImg, crs) for message in entryResults]
+
+def _writePlannedEntries(tiff, plan, idxImg, crs):
+    # Como writePlannedPolygons, mas com uma lista de mensagens por entrada do plano
+    entries = []
+    partGeometries = [row['geometry'] for _, _, parts, _ in plan if parts for _, row in parts]
+    crops = iter(extractPolygonCrops(tiff, partGeometries))
+    _, fillValue = resolve_masked_dtype(tiff.dtypes[0], src_nodata=tiff.nodata)
+
+    for idPoly, outputDir, parts, isMulti in plan:
+        results = []
+        entries.append(results)
+        if parts is None:
+            results.append(f"No multipolygon found for ID_POLY {idPoly} in image {idxImg}.")
+            continue
+
+        os.makedirs(outputDir, exist_ok=True)
+        for partId, row in parts:
+            outImage, outTransform = next(crops)
+            outMeta = tiff.meta
+
+            outMeta.update({
+                "driver": "GTiff",
+                "height": outImage.shape[1],
+                "width": outImage.shape[2],
+                "transform": outTransform,
+                "dtype": outImage.dtype.name,
+                "nodata": fillValue
+            })
+
+            outputTiff = os.path.join(outputDir, f"{partId}.tif")
+            outputShp = os.path.join(outputDir, f"{partId}.shp")
+
+            with rasterio.open(outputTiff, "w", **outMeta) as dest:
+                dest.write(outImage)
+
+            row['geometry'] = row['geometry'].buffer(0)
+            rowGdf = gpd.GeoDataFrame([row])
+            rowGdf.crs = crs
+            rowGdf.to_file(outputShp)
+
+            results.append(f"Created {outputTiff}, shape: {outImage.shape}")
+            results.append(f"Created {outputShp}")
+
+        if isMulti:
+            results.append(f"ID_POLY {idPoly} is a multipolygon, divided into {len(parts)} polygons.")
+    return entries
+
+def planWorkUnits(tiff, plan):
+    """
+    Divide o plano de uma imagem em unidades de trabalho independentes: as entradas cujas janelas
+    compartilham blocos internos ficam na mesma unidade, para que esses blocos sejam decodificados
+    por um único processo, com os mesmos limites de leitura de extractPolygonCrops (ver
+    boundedWindowGroups) e no máximo MAX_UNIT_ENTRIES entradas por unidade, vizinhas na ordem dos
+    tiles, para que o trabalho se distribua por todos os processos.
+
+    :return: lista de listas de índices de entradas do plano, cada uma em ordem crescente.
+    """
+    entryIdx = [idx for idx, (_, _, parts, _) in enumerate(plan) if parts]
+    partGeometries = [[row['geometry'] for _, row in plan[idx][2]] for idx in entryIdx]
+    entryWindows = [windows.union(*polygonWindows(tiff, geometries)) for geometries in partGeometries]
+    bytesPerPixel = tiff.count * (np.dtype(tiff.dtypes[0]).itemsize + 1)
+    units = []
+    for group in boundedWindowGroups(tiff, entryWindows, bytesPerPixel):
+        group = sorted(group, key=lambda member: (entryWindows[member].row_off, entryWindows[member].col_off))
+        for start in range(0, len(group), MAX_UNIT_ENTRIES):
+            units.append(sorted(entryIdx[member] for member in group[start:start + MAX_UNIT_ENTRIES]))
+    # Entradas sem polígono só geram a mensagem; vão juntas em uma unidade
+    missing = [idx for idx, (_, _, parts, _) in enumerate(plan) if not parts]
+    if missing:
+        units.append(missing)
+    return units
+
+def sceneNumber(tiffFilePath):
+    """
+    IMG_NUMBER de uma cena: o primeiro termo do nome do arquivo, se numérico, ou o nome do
+    arquivo sem extensão.
+    """
+    stem = os.path.splitext(os.path.basename(tiffFilePath))[0]
+    firstToken = stem.split(' ')[0]
+    return int(firstToken) if firstToken.isdigit() else stem
+
+def checkMatchTimes(vector, footprints, timeColumn, maxTimeDelta, bestOnly):
+    """
+    Verifica se há como associar os polígonos às imagens sem ambiguidade: ou bestOnly, ou a coluna
+    de data dos polígonos com uma tolerância, e nesse caso todos os polígonos e todas as imagens
+    precisam ter data.
+    """
+    if not bestOnly and (timeColumn is None or maxTimeDelta is None):
+        raise ValueError("A associação pelo footprint exige timeColumn e maxTimeDelta, ou bestOnly.")
+    if timeColumn is None:
+        return
+    if timeColumn not in vector.columns:
+        raise ValueError(f"Coluna de data {timeColumn} não encontrada nos polígonos.")
+    polygonTimes = pd.to_datetime(vector[timeColumn], utc=True, errors='coerce')
+    if polygonTimes.isna().any():
+        raise ValueError(f"{int(polygonTimes.isna().sum())} polígonos sem data válida em {timeColumn}.")
+    missing = footprints.loc[footprints['acquisition_time'].isna(), 'scene']
+    if not missing.empty:
+        raise ValueError(f"Imagens sem data de aquisição nos metadados: {', '.join(map(str, missing))}")
+
+def planSlickPolygons(dirImg, dataBase, shpFilePath, tiffFilePath, matchScenes=False, timeColumn=None,
+                      maxTimeDelta=None, bestOnly=False):
+    """
+    Lê a tabela e o shapefile e gera, para cada imagem, ou uma mensagem (imagem sem polígonos)
+    ou a tupla (tiffFilePath, idxImg, plan, crs) com os polígonos a recortar.
+
+    :param matchScenes: se True, os polígonos de cada imagem são os que interceptam o seu
+                        footprint (scene_matching), e não os do IMG_NUMBER tirado do nome do arquivo.
+                        Exige timeColumn e maxTimeDelta, ou bestOnly: só pela geometria, um
+                        polígono iria para todas as passagens que cobrem o mesmo lugar.
+    :param timeColumn: coluna de data dos polígonos, comparada à data de aquisição das imagens.
+    :param maxTimeDelta: diferença máxima entre as datas (Timedelta ou texto, ex.: '1h').
+    :param bestOnly: cada polígono fica só com a imagem de maior sobreposição (e, no empate, a de
+                     data mais próxima).
+    """
+    df = pd.read_csv(dataBase)
+    vectorAll = read_vector_layers(shpFilePath)
+
+    if isinstance(tiffFilePath, str):
+        tiffFilePaths = [tiffFilePath]
+    else:
+        tiffFilePaths = list(tiffFilePath)
+
+    # Posições dos polígonos de cada imagem, calculadas de uma vez para todas as imagens
+    if matchScenes:
+        footprints = scene_footprints(tiffFilePaths, crs=vectorAll.crs)
+        checkMatchTimes(vectorAll, footprints, timeColumn, maxTimeDelta, bestOnly)
+        pairs = match_polygons_to_scenes(vectorAll, footprints, timeColumn, maxTimeDelta, bestOnly)
+        rowsByScene = {tiffFilePaths[scene]: group['polygon'].to_numpy() for scene, group in pairs.groupby('scene')}
+    else:
+        rowsByNumber = vectorAll.groupby('IMG_NUMBER').indices
+
+    for tiffFilePath in tiffFilePaths:
+        if matchScenes:
+            idxImg = sceneNumber(tiffFilePath)
+            vectorImg = vectorAll.iloc[rowsByScene.get(tiffFilePath, [])]
+        else:
+            tiffBasename = os.path.basename(tiffFilePath)
+            idxImg = int(tiffBasename.split(' ')[0])
+            vectorImg = vectorAll.iloc[rowsByNumber.get(idxImg, [])]
+
+        if not vectorImg.empty:
+            if matchScenes:
+                df_filtered = df[df['ID_POLY'].isin(vectorImg['ID_POLY'])] if 'ID_POLY' in df.columns else df.iloc[:0]
+            else:
+                df_filtered = df[df['IMG_NUMBER'] == idxImg]
+            if 'ID_POLY' in df_filtered.columns and not df_filtered.empty:
+                plan = planImagePolygons(dirImg, idxImg, vectorImg, df_filtered['ID_POLY'].unique())
+                yield (tiffFilePath, idxImg, plan, vectorImg.crs)
+            else:
+                yield f"No ID_POLY found for image number {idxImg}."
+        else:
+            yield f"No polygons found for image number {idxImg}."
+
+def writeSlickChipStore(dirImg, items, outputFormat='gpkg', maxWidth=8192):
+    """
+    Grava todos os polígonos em uma única camada (GeoPackage ou GeoParquet) com os atributos
+    ID_POLY e IMG_NUMBER, e todos os recortes em um único GeoTIFF (slicks_chips.tif), cuja
+    posição de cada chip fica no índice (ver chip_store.read_chip).
+
+    :param items: itens gerados por planSlickPolygons.
+    :param outputFormat: 'gpkg' ou 'parquet'.
+    :return: lista de mensagens.
+    """
+    chipFile = os.path.join(dirImg, 'slicks_chips.tif')
+    indexFile = os.path.join(dirImg, 'slicks.parquet' if outputFormat == 'parquet' else 'slicks.gpkg')
+    os.makedirs(dirImg, exist_ok=True)
+
+    # Primeira passada: apenas os cabeçalhos das imagens, para dimensionar o mosaico
+    results = []
+    scenes = []
+    chipShapes = []
+    dtypes = ['float32']
+    maxCount = 1
+    crs = None
+    for item in items:
+        if isinstance(item, str):
+            results.append(item)
+            continue
+
+        tiffFilePath, idxImg, plan, crs = item
+        partGeometries = [row['geometry'] for _, _, parts, _ in plan if parts for _, row in parts]
+        with open_raster(tiffFilePath) as tiff:
+            chipShapes.extend((int(window.height), int(window.width))
+                              for window in polygonWindows(tiff, partGeometries))
+            dtypes.extend(tiff.dtypes)
+            maxCount = max(maxCount, tiff.count)
+        scenes.append(item)
+
+    offsets, (atlasHeight, atlasWidth) = chip_store.pack_chips(chipShapes, maxWidth)
+    offsets = iter(offsets)
+
+    # Segunda passada: recorta em lote cada imagem e grava os chips no mosaico
+    records = []
+    atlasDtype = np.result_type(*dtypes).name
+    with chip_store.create_chip_atlas(chipFile, atlasHeight, atlasWidth, maxCount, atlasDtype) as atlas:
+        for tiffFilePath, idxImg, plan, _ in scenes:
+            with open_raster(tiffFilePath) as tiff:
+                partGeometries = [row['geometry'] for _, _, parts, _ in plan if parts for _, row in parts]
+                crops = iter(extractPolygonCrops(tiff, partGeometries, np.nan, atlasDtype))
+
+                for idPoly, _, parts, isMulti in plan:
+                    if parts is None:
+                        results.append(f"No multipolygon found for ID_POLY {idPoly} in image {idxImg}.")
+                        continue
+
+                    for partId, row in parts:
+                        outImage, outTransform = next(crops)
+                        offset = next(offsets)
+                        atlas.write(outImage, indexes=list(range(1, outImage.shape[0] + 1)),
+                                    window=windows.Window(offset[1], offset[0], outImage.shape[2], outImage.shape[1]))
+
+                        # IMG_NUMBER como texto: com matchScenes ele é o nome da cena (ver sceneNumber)
+                        record = {'ID_POLY': str(partId), 'IMG_NUMBER': str(idxImg)}
+                        record.update(chip_store.chip_record(chipFile, offset, outImage, outTransform))
+                        record['geometry'] = row['geometry'].buffer(0)
+                        records.append(record)
+
+                        results.append(f"Stored {partId} in {chipFile}, shape: {outImage.shape}")
+
+                    if isMulti:
+                        results.append(f"ID_POLY {idPoly} is a multipolygon, divided into {len(parts)} polygons.")
+
+    index = gpd.GeoDataFrame(records, columns=['ID_POLY', 'IMG_NUMBER'] + chip_store.CHIP_COLUMNS + ['geometry'],
+                             geometry='geometry', crs=crs)
+    chip_store.write_chip_index(index, indexFile)
+    results.append(f"Created {chipFile}")
+    results.append(f"Created {indexFile}")
+
+    return results
+
+def getSlickPolyFromMultiPolygon(dirImg, dataBase, shpFilePath, tiffFilePath, outputFormat='files', matchScenes=False,
+                                 timeColumn=None, maxTimeDelta=None, bestOnly=False):
+    """
+    Corta cada polígono (separando os multipolígonos) das imagens.
+
+    :param outputFormat: 'files' grava um .tif e um .shp por polígono em dirImg/IMG_NUMBER/ID_POLY/;
+                         'gpkg' ou 'parquet' grava uma única camada de polígonos e um único
+                         GeoTIFF com todos os recortes (ver writeSlickChipStore).
+    :param matchScenes: associa os polígonos às imagens pelo footprint; timeColumn, maxTimeDelta e
+                        bestOnly dizem como (ver planSlickPolygons).
+    :return: lista de mensagens.
+    """
+    items = planSlickPolygons(dirImg, dataBase, shpFilePath, tiffFilePath, matchScenes, timeColumn,
+                              maxTimeDelta, bestOnly)
+    if outputFormat != 'files':
+        return writeSlickChipStore(dirImg, items, outputFormat)
+
+    results = []
+    for item in items:
+        if isinstance(item, str):
+            results.append(item)
+            continue
+
+        # Abre a imagem uma única vez e recorta todos os polígonos em lote
+        tiffFilePath, idxImg, plan, crs = item
+        with open_raster(tiffFilePath) as tiff:
+            results.extend(writePlannedPolygons(tiff, plan, idxImg, crs))
+
+    return results
+
+def _processWorkUnit(workUnit):
+    """
+    Executa uma unidade de trabalho (entradas do plano de uma imagem que compartilham blocos) em
+    um processo do pool.
+
+    :return: uma lista de mensagens por entrada da unidade.
+    """
+    tiffFilePath, idxImg, plan, crs = workUnit
+    with open_raster(tiffFilePath) as tiff:
+        return _writePlannedEntries(tiff, plan, idxImg, crs)
+
+def getSlickPolyFromMultiPolygonParallel(dirImg, dataBase, shpFilePath, tiffFilePaths, maxWorkers=None, chunksize=4,
+                                         outputFormat='files', matchScenes=False, timeColumn=None,
+                                         maxTimeDelta=None, bestOnly=False):
+    """
+    Versão paralela de getSlickPolyFromMultiPolygon: distribui as unidades de trabalho (grupos de
+    ID_POLY de uma imagem cujos recortes compartilham blocos, ver planWorkUnits) entre um pool de
+    processos. As mensagens são devolvidas na mesma ordem da execução serial e os arquivos
+    gravados são os mesmos.
+
+    :param tiffFilePaths: caminho ou lista de caminhos das imagens.
+    :param maxWorkers: número de processos (padrão: número de núcleos).
+    :param chunksize: unidades de trabalho enviadas de uma vez a cada processo.
+    :param outputFormat: 'files', 'gpkg' ou 'parquet' (ver getSlickPolyFromMultiPolygon). O mosaico
+                         e o índice são um único arquivo cada, gravados por este processo.
+    :param matchScenes: associa os polígonos às imagens pelo footprint; timeColumn, maxTimeDelta e
+                        bestOnly dizem como (ver planSlickPolygons).
+    :return: lista de mensagens.
+    """
+    items = planSlickPolygons(dirImg, dataBase, shpFilePath, tiffFilePaths, matchScenes, timeColumn,
+                              maxTimeDelta, bestOnly)
+    if outputFormat != 'files':
+        return writeSlickChipStore(dirImg, items, outputFormat)
+
+    # Cada imagem vira uma mensagem ou um par (unidades, tamanho do plano)
+    scenes = []
+    workUnits = []
+    for item in items:
+        if isinstance(item, str):
+            scenes.append(item)
+            continue
+
+        tiffFilePath, idxImg, plan, crs = item
+        with open_raster(tiffFilePath) as tiff:
+            units = planWorkUnits(tiff, plan)
+        workUnits.extend((tiffFilePath, idxImg, [plan[idx] for idx in unit], crs) for unit in units)
+        scenes.append((units, len(plan)))
+
+    results = []
+    with ProcessPoolExecutor(max_workers=maxWorkers) as executor:
+        # executor.map devolve os resultados na ordem de submissão
+        outputs = executor.map(_processWorkUnit, workUnits, chunksize=chunksize)
+        for scene in scenes:
+            if isinstance(scene, str):
+                results.append(scene)
+                continue
+            # Mensagens de volta na ordem do plano
+            units, planSize = scene
+            entryResults = [None] * planSize
+            for unit in units:
+                for idx, messages in zip(unit, next(outputs)):
+                    entryResults[idx] = messages
+            results.extend(message for messages in entryResults for message in messages)
+
+    return results
+
+
+def main():
+    dirImg = 'caminho para o arquivo'
+    dataBase = glob.glob(f'{dirImg}\\*.csv')[0]
+    shpFilePath = glob.glob(f'{dirImg}\\*.shp')[0]
+    tiffFilePaths = glob.glob(f"{dirImg}*.tif")
+
+    getSlickPolyFromMultiPolygonParallel(dirImg, dataBase, shpFilePath, tiffFilePaths)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#pipeline
+#_________________________________________________________________________________________
+# Cadeia completa por imagem, em memória: separa os multipolígonos, recorta cada polígono
+# (objeto) e o seu fundo e calcula as estatísticas, passando os arrays e as transformações
+# diretamente de uma etapa para a outra, sem gravar e reler recortes intermediários (que podem
+# ser gravados opcionalmente, para auditoria, com os mesmos nomes da cadeia de scripts)
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import csv
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import geopandas as gpd
+import rasterio
+from get_slick_poly_from_multipoly import planSlickPolygons, polygonWindows, extractPolygonCrops
+from crop_image_around_polygon import extract_backgrounds
+from crop_slicks_outOf_image import resolve_masked_dtype
+from stats_obj_img import FIELDNAMES, load_class_data, stats_from_bands
+from shape_features import shape_features
+from raster_access import open_raster
+from safe_zip import list_scene_sources
+
+def _float_band(image, fill_value):
+    # Primeira banda em ponto flutuante, com NaN nos pixels mascarados (como stats_obj_img.read_band)
+    band = image[0].astype(np.result_type(image.dtype, np.float32))
+    if not np.isnan(fill_value):
+        band[image[0] == fill_value] = np.nan
+    return band
+
+def _write_audit_chips(output_dir, part_id, obj_image, obj_meta, bg_image, bg_meta, part):
+    # Mesmos arquivos da cadeia de scripts: <parte>.tif, <parte>.shp e <parte>_background.tif
+    os.makedirs(output_dir, exist_ok=True)
+    with rasterio.open(os.path.join(output_dir, f"{part_id}.tif"), "w", **obj_meta) as dest:
+        dest.write(obj_image)
+    part.to_file(os.path.join(output_dir, f"{part_id}.shp"))
+    with rasterio.open(os.path.join(output_dir, f"{part_id}_background.tif"), "w", **bg_meta) as dest:
+        dest.write(bg_image)
+
+def process_scene(tiff_file, idx_img, plan, crs, class_data=None, buffer_percent=0.05, mode='exact',
+                  features=None, audit=False, batch_size=64):
+    """
+    Executa recorte, separação, fundo e estatísticas de todos os polígonos de uma imagem, com a
+    imagem aberta uma única vez. Os polígonos são processados em lotes ordenados pela posição
+    na imagem, e o recorte do objeto e o do fundo de cada lote leem os mesmos blocos, que ficam
+    no cache de blocos de raster_access (BLOCK_CACHE, limitado por SISMOM_BLOCK_CACHE_MB) entre
+    uma leitura e outra.
+
+    Parâmetros:
+    tiff_file (str): Caminho da imagem.
+    idx_img: IMG_NUMBER da imagem.
+    plan (list): Plano de polígonos da imagem (ver get_slick_poly_from_multipoly.planImagePolygons).
+    crs: Sistema de referência dos polígonos.
+    class_data (dict): Dados de classe por ID_POLY (ver stats_obj_img.load_class_data).
+    buffer_percent (float): Percentual de buffer do fundo ao redor de cada polígono.
+    mode (str): 'exact' ou 'histogram' (ver stats_obj_img.band_statistics).
+    features (list): Características calculadas (ver stats_obj_img.FEATURES; padrão: todas).
+    audit (bool): Se True, grava também os recortes de cada polígono, como a cadeia de scripts.
+    batch_size (int): Polígonos por lote.
+
+    Retorna:
+    tuple: Lista de resultados (um dicionário com as colunas de FIELDNAMES por polígono, na
+           ordem do plano) e lista de mensagens (polígonos ausentes, fora da imagem ou com erro).
+    """
+    class_data = class_data or {}
+    messages = []
+    parts = []
+    for id_poly, output_dir, poly_parts, _ in plan:
+        if poly_parts is None:
+            messages.append(f"No multipolygon found for ID_POLY {id_poly} in image {idx_img}.")
+            continue
+        parts.extend((output_dir, part_id, row) for part_id, row in poly_parts)
+
+    results = [None] * len(parts)
+    with open_raster(tiff_file) as src:
+        _, fill_value = resolve_masked_dtype(src.dtypes[0], src_nodata=src.nodata)
+        geometries = [row['geometry'] for _, _, row in parts]
+        # Uma parte fora da imagem vira mensagem, sem interromper as demais
+        part_windows = {}
+        for idx, (_, part_id, _) in enumerate(parts):
+            try:
+                part_windows[idx] = polygonWindows(src, [geometries[idx]])[0]
+            except ValueError as e:
+                messages.append(f"Erro ao processar o polígono {part_id} da imagem {idx_img}: {e}")
+        order = sorted(part_windows, key=lambda idx: (part_windows[idx].row_off, part_windows[idx].col_off))
+
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            batch_geometries = [geometries[idx] for idx in batch]
+            crops = extractPolygonCrops(src, batch_geometries)
+            backgrounds = {position: (image, meta) for position, image, meta
+                           in extract_backgrounds(src, gpd.GeoSeries(batch_geometries, crs=crs), buffer_percent)}
+
+            for position, idx in enumerate(batch):
+                output_dir, part_id, row = parts[idx]
+                obj_image, obj_transform = crops[position]
+                bg_image, bg_meta = backgrounds[position]
+
+                part = gpd.GeoDataFrame([row], crs=crs)
+                part['geometry'] = part.geometry.buffer(0)
+                try:
+                    shape = shape_features(part, obj_image.shape[1:], obj_transform).iloc[0].to_dict()
+                    # Objeto e fundo como em stats_obj_img.stats_obj_img (FG do polígono, BG e gradiente do fundo)
+                    result = stats_from_bands(_float_band(obj_image, fill_value), _float_band(bg_image, fill_value),
+                                              f"{part_id}_background.tif", class_data, mode, shape, features)
+                except ValueError as e:
+                    messages.append(f"Erro ao processar o polígono {part_id} da imagem {idx_img}: {e}")
+                    continue
+                result.update({"img_name": os.path.splitext(os.path.basename(tiff_file))[0],
+                               "IMG_NUMBER": idx_img})
+                results[idx] = result
+
+                if audit:
+                    obj_meta = dict(bg_meta, height=obj_image.shape[1], width=obj_image.shape[2],
+                                    transform=obj_transform, dtype=obj_image.dtype.name)
+                    _write_audit_chips(output_dir, part_id, obj_image, obj_meta, bg_image, bg_meta, part)
+
+    return [result for result in results if result is not None], messages
+
+def _process_scene_job(job):
+    item, kwargs = job
+    tiff_file, idx_img, plan, crs = item
+    return process_scene(tiff_file, idx_img, plan, crs, **kwargs)
+
+def run_pipeline(output_dir, data_base, shp_file, tiff_files, class_data=None, output_csv=None,
+                 match_scenes=False, max_workers=None, time_column=None, max_time_delta=None, best_only=False,
+                 **kwargs):
+    """
+    Executa a cadeia completa para várias imagens, uma imagem por processo.
+
+    Parâmetros:
+    output_dir (str): Pasta dos recortes de auditoria (dirImg da cadeia de scripts).
+    data_base (str): Tabela (CSV) com IMG_NUMBER e ID_POLY dos polígonos a processar.
+    shp_file (str): Shapefile com os polígonos de todas as imagens.
+    tiff_files (list): Imagens.
+    class_data (dict): Dados de classe por ID_POLY.
+    output_csv (str): Se dado, grava os resultados neste CSV.
+    match_scenes (bool): Associa os polígonos às imagens pelo footprint (ver planSlickPolygons).
+    max_workers (int): Número de processos (None = todos os núcleos, 1 = no próprio processo).
+    time_column (str): Coluna de data dos polígonos, para match_scenes (ver planSlickPolygons).
+    max_time_delta: Diferença máxima entre a data do polígono e a da imagem (ex.: '1h').
+    best_only (bool): Com match_scenes, cada polígono fica só com a imagem de maior sobreposição.
+    kwargs: Repassados a process_scene (buffer_percent, mode, features, audit...).
+
+    Retorna:
+    tuple: Resultados de todas as imagens (na ordem das imagens) e mensagens.
+    """
+    results = []
+    messages = []
+    jobs = []
+    for item in planSlickPolygons(output_dir, data_base, shp_file, tiff_files, match_scenes, time_column,
+                                  max_time_delta, best_only):
+        if isinstance(item, str):
+            messages.append(item)
+        else:
+            jobs.append((item, dict(kwargs, class_data=class_data)))
+
+    if max_workers == 1:
+        outputs = list(map(_process_scene_job, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            outputs = list(executor.map(_process_scene_job, jobs))
+    for scene_results, scene_messages in outputs:
+        results.extend(scene_results)
+        messages.extend(scene_messages)
+
+    if output_csv:
+        with open(output_csv, mode='w', newline='') as csvfile:
+            csv_writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+            csv_writer.writeheader()
+            csv_writer.writerows(results)
+    return results, messages
+
+def main():
+    parser = argparse.ArgumentParser(description="Recorte, fundo e estatísticas dos polígonos, em memória")
+    parser.add_argument('--dir-img', default='caminho para o arquivo')
+    parser.add_argument('--class-data', default='caminho para o arquivo.csv')
+    parser.add_argument('--csv', default='caminho para o arquivo.csv')
+    parser.add_argument('--buffer-percent', type=float, default=0.05)  # 5% de buffer ao redor do polígono
+    parser.add_argument('--audit', action='store_true', help="grava também os recortes intermediários")
+    parser.add_argument('--match-scenes', action='store_true',
+                        help="associa os polígonos às imagens pelo footprint, e não pelo nome do arquivo")
+    parser.add_argument('--time-column', default=None,
+                        help="coluna de data dos polígonos, comparada à data de aquisição (--match-scenes)")
+    parser.add_argument('--max-time-delta', default=None,
+                        help="diferença máxima entre as datas, ex.: 1h (--match-scenes)")
+    parser.add_argument('--best-only', action='store_true',
+                        help="cada polígono fica só com a imagem de maior sobreposição (--match-scenes)")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    data_base = glob.glob(os.path.join(args.dir_img, '*.csv'))[0]
+    shp_file = glob.glob(os.path.join(args.dir_img, '*.shp'))[0]
+    # Os produtos .zip baixados não têm IMG_NUMBER no nome e só entram associados pelo footprint
+    tiff_files = list_scene_sources(args.dir_img, include_zips=args.match_scenes)
+    class_data = load_class_data(args.class_data)
+
+    results, messages = run_pipeline(args.dir_img, data_base, shp_file, tiff_files, class_data, args.csv,
+                                     args.match_scenes, args.workers, args.time_column, args.max_time_delta,
+                                     args.best_only, buffer_percent=args.buffer_percent,
+                                     audit=args.audit)
+    for message in messages:
+        print(message)
+    print(f"{len(results)} polígonos processados. Resultados em {args.csv}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,521 @@
+#raster_access
+#_________________________________________________________________________________________
+# Acesso às imagens por chunks alinhados aos tiles internos do GeoTIFF: leitura sob demanda
+# (nada é lido ao abrir a imagem), processamento dos chunks em paralelo e gravação chunk a
+# chunk, para imagens maiores que a memória. O tamanho dos chunks é ajustável por máquina
+# (parâmetro chunk_bytes ou variável de ambiente SISMOM_CHUNK_MB). As imagens abertas ficam em
+# um pool por processo, que mantém abertas as últimas usadas (SISMOM_MAX_IDLE_RASTERS), e os
+# blocos já decodificados, em um cache LRU limitado em bytes (SISMOM_BLOCK_CACHE_MB),
+# compartilhado pelos recortes de todos os polígonos
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import math
+import atexit
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+from safe_zip import open_scene, close_scene
+
+# Tamanho padrão dos chunks, em bytes (64 MB, ou SISMOM_CHUNK_MB)
+DEFAULT_CHUNK_BYTES = int(float(os.environ.get('SISMOM_CHUNK_MB', 64)) * 1024 * 1024)
+# Limite do cache de blocos decodificados, em bytes (256 MB, ou SISMOM_BLOCK_CACHE_MB)
+DEFAULT_CACHE_BYTES = int(float(os.environ.get('SISMOM_BLOCK_CACHE_MB', 256)) * 1024 * 1024)
+# Imagens sem uso mantidas abertas no pool, por thread (8, ou SISMOM_MAX_IDLE_RASTERS)
+DEFAULT_MAX_IDLE = int(os.environ.get('SISMOM_MAX_IDLE_RASTERS', 8))
+
+class BlockCache:
+    """
+    Cache LRU dos blocos internos já decodificados (dados e máscara), compartilhado por todas as
+    imagens abertas no processo e limitado em bytes. Recortes de polígonos vizinhos que caem nos
+    mesmos tiles decodificam cada tile uma única vez.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._blocks.move_to_end(key)
+            return block
+
+    def put(self, key, block):
+        size = block.nbytes + np.ma.getmaskarray(block).nbytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._blocks.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous.nbytes + np.ma.getmaskarray(previous).nbytes
+            self._blocks[key] = block
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._blocks.popitem(last=False)
+                self.nbytes -= evicted.nbytes + np.ma.getmaskarray(evicted).nbytes
+                self.evictions += 1
+
+    def stats(self):
+        """
+        Contadores do cache: acertos, faltas, blocos descartados, blocos e bytes em uso.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'blocks': len(self._blocks), 'bytes': self.nbytes, 'max_bytes': self.max_bytes}
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+            self.nbytes = self.hits = self.misses = self.evictions = 0
+
+BLOCK_CACHE = BlockCache()
+
+def block_cache_stats():
+    return BLOCK_CACHE.stats()
+
+def _source_key(path):
+    # Identifica o arquivo no cache e no pool; muda se o arquivo for regravado
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (path,)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+def output_tile_shape(src):
+    """
+    Escolhe o tamanho dos tiles do GeoTIFF de saída: os blocos da imagem de origem, quando já são
+    tiles válidos (múltiplos de 16), ou 256x256 quando a origem é gravada em faixas.
+    """
+    block_h, block_w = src.block_shapes[0]
+    if block_w < src.width and block_h % 16 == 0 and block_w % 16 == 0:
+        return block_h, block_w
+    return 256, 256
+
+def iter_block_windows(src, max_window_bytes, bytes_per_pixel=None, tile_shape=None):
+    """
+    Percorre a imagem em janelas formadas por blocos internos inteiros, respeitando um limite de memória.
+    
+    Parâmetros:
+    src (DatasetReader): Imagem aberta com rasterio.
+    max_window_bytes (int): Limite de memória (em bytes) de cada janela.
+    bytes_per_pixel (int): Memória usada por pixel da janela (todas as bandas). Padrão: bandas de origem.
+    tile_shape (tuple): Tiles da imagem de saída, para alinhar as janelas também a eles.
+    
+    Retorna:
+    generator: Janelas (Window) em ordem de linhas, cobrindo toda a imagem.
+    """
+    if bytes_per_pixel is None:
+        bytes_per_pixel = sum(np.dtype(dtype).itemsize for dtype in src.dtypes)
+    block_h, block_w = src.block_shapes[0]
+    tile_h, tile_w = tile_shape or (block_h, block_w)
+
+    # Unidade mínima de leitura: múltiplo comum dos blocos de origem e dos tiles de saída
+    unit_h = math.lcm(block_h, tile_h)
+    unit_w = src.width if block_w >= src.width else math.lcm(block_w, tile_w)
+    unit_h, unit_w = min(unit_h, src.height), min(unit_w, src.width)
+
+    max_pixels = max(max_window_bytes // bytes_per_pixel, unit_h * unit_w)
+    if max_pixels >= unit_h * src.width:
+        # Faixas com a largura inteira da imagem e quantas unidades de altura couberem
+        win_w = src.width
+        win_h = unit_h * max(1, max_pixels // (unit_h * src.width))
+    else:
+        win_h = unit_h
+        win_w = unit_w * max(1, max_pixels // (unit_h * unit_w))
+
+    for row_off in range(0, src.height, win_h):
+        for col_off in range(0, src.width, win_w):
+            yield Window(col_off, row_off, min(win_w, src.width - col_off), min(win_h, src.height - row_off))
+
+class ChunkedRaster:
+    """
+    Imagem dividida em chunks alinhados aos seus tiles internos, lidos apenas quando usados.
+
+    Os atributos e métodos do dataset do rasterio (transform, crs, dtypes, read, window_transform...)
+    continuam disponíveis diretamente, para leituras pontuais. As operações por chunk (map_chunks,
+    write_chunks) rodam em um pool de threads, cada uma com a sua própria conexão com o arquivo
+    (os datasets do GDAL não podem ser compartilhados entre threads); a leitura e a descompressão
+    no GDAL liberam o GIL.
+
+    Uso:
+        with open_raster('cena.tif', chunk_bytes=128 * 1024 * 1024) as raster:
+            for window, result in raster.map_chunks(func):
+                ...
+    """
+
+    def __init__(self, path, chunk_bytes=None, max_workers=None):
+        self.path = path
+        self.chunk_bytes = chunk_bytes or DEFAULT_CHUNK_BYTES
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.dataset = open_scene(path)
+        self.source_key = _source_key(path)
+        self.pooled = False
+        self.pool_key = None
+        self._local = threading.local()
+        self._handles = []
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __getattr__(self, name):
+        # Metadados e leituras pontuais vêm do dataset aberto
+        if name == 'dataset':
+            raise AttributeError(name)
+        return getattr(self.dataset, name)
+
+    @property
+    def shape(self):
+        return self.dataset.count, self.dataset.height, self.dataset.width
+
+    def configure(self, chunk_bytes=None, max_workers=None):
+        """
+        Troca o tamanho dos chunks e o número de threads (None mantém o valor atual).
+        """
+        if chunk_bytes:
+            self.chunk_bytes = chunk_bytes
+        if max_workers and max_workers != self.max_workers:
+            self.max_workers = max_workers
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def conflicts(self, chunk_bytes=None, max_workers=None):
+        """
+        True se chunk_bytes ou max_workers foram dados e diferem dos da imagem.
+        """
+        return bool((chunk_bytes and chunk_bytes != self.chunk_bytes)
+                    or (max_workers and max_workers != self.max_workers))
+
+    def chunks(self, bytes_per_pixel=None, tile_shape=None, chunk_bytes=None):
+        """
+        Janelas dos chunks, alinhadas aos blocos internos (e a tile_shape, se dado), com no máximo
+        chunk_bytes cada (padrão: o chunk_bytes da imagem), em ordem de linhas.
+        """
+        return list(iter_block_windows(self.dataset, chunk_bytes or self.chunk_bytes, bytes_per_pixel, tile_shape))
+
+    def _thread_dataset(self):
+        # Conexão com o arquivo exclusiva da thread atual
+        dataset = getattr(self._local, 'dataset', None)
+        if dataset is None:
+            dataset = self._local.dataset = open_scene(self.path)
+            with self._lock:
+                self._handles.append(dataset)
+        return dataset
+
+    def read(self, indexes=None, window=None, masked=False, out_dtype=None, out_shape=None, **kwargs):
+        """
+        Leitura como DatasetReader.read. Leituras de janelas inteiras dentro da imagem são montadas
+        a partir dos blocos internos guardados em BLOCK_CACHE (cada bloco é lido e decodificado
+        uma única vez); as demais (imagem inteira, reamostragem, boundless...) vão direto ao arquivo.
+        """
+        if isinstance(window, tuple):
+            window = Window.from_slices(*window)
+        bands = list(range(1, self.dataset.count + 1)) if indexes is None else indexes
+        band_list = [bands] if isinstance(bands, int) else list(bands)
+        natural_shape = None
+        if window is not None:
+            natural_shape = (int(window.height), int(window.width))
+            if not isinstance(bands, int):
+                natural_shape = (len(band_list),) + natural_shape
+        cacheable = (window is not None and not kwargs and out_shape in (None, natural_shape)
+                     and all(float(value).is_integer() for value in window.flatten())
+                     and window.col_off >= 0 and window.row_off >= 0
+                     and window.col_off + window.width <= self.dataset.width
+                     and window.row_off + window.height <= self.dataset.height)
+        if not cacheable:
+            return self.dataset.read(indexes, window=window, masked=masked, out_dtype=out_dtype,
+                                     out_shape=out_shape, **kwargs)
+
+        row_off, col_off = int(window.row_off), int(window.col_off)
+        height, width = int(window.height), int(window.width)
+        dtype = out_dtype or self.dataset.dtypes[band_list[0] - 1]
+        data = np.empty((len(band_list), height, width), dtype=dtype)
+        mask = np.empty(data.shape, dtype=bool) if masked else None
+
+        for position, band in enumerate(band_list):
+            block_h, block_w = self.dataset.block_shapes[band - 1]
+            for block_row in range(row_off // block_h, (row_off + height - 1) // block_h + 1):
+                for block_col in range(col_off // block_w, (col_off + width - 1) // block_w + 1):
+                    block = self._cached_block(band, block_row, block_col, block_h, block_w)
+                    # Interseção do bloco com a janela pedida
+                    top, left = block_row * block_h, block_col * block_w
+                    r0, r1 = max(row_off, top), min(row_off + height, top + block.shape[0])
+                    c0, c1 = max(col_off, left), min(col_off + width, left + block.shape[1])
+                    target = (position, slice(r0 - row_off, r1 - row_off), slice(c0 - col_off, c1 - col_off))
+                    source = (slice(r0 - top, r1 - top), slice(c0 - left, c1 - left))
+                    data[target] = block.data[source]
+                    if masked:
+                        mask[target] = np.ma.getmaskarray(block)[source]
+
+        if masked:
+            data = np.ma.MaskedArray(data, mask=mask)
+            if self.dataset.nodata is not None:
+                data.fill_value = self.dataset.nodata
+        return data[0] if isinstance(bands, int) else data
+
+    def _cached_block(self, band, block_row, block_col, block_h, block_w):
+        key = self.source_key + (band, block_row, block_col)
+        block = BLOCK_CACHE.get(key)
+        if block is None:
+            block_window = Window(block_col * block_w, block_row * block_h,
+                                  min(block_w, self.dataset.width - block_col * block_w),
+                                  min(block_h, self.dataset.height - block_row * block_h))
+            block = self.dataset.read(band, window=block_window, masked=True)
+            BLOCK_CACHE.put(key, block)
+        return block
+
+    def read_chunk(self, window, **read_kwargs):
+        """
+        Lê uma janela com a conexão da thread atual (seguro dentro de map_chunks).
+        """
+        return self._thread_dataset().read(window=window, **read_kwargs)
+
+    def map_chunks(self, func, windows=None, read_kwargs=None, max_in_flight=None, max_bytes=None,
+                   bytes_per_pixel=None):
+        """
+        Aplica func(dados, janela) a cada chunk, em paralelo, com no máximo max_in_flight chunks
+        lidos ao mesmo tempo (padrão: o dobro de threads) e, se max_bytes for dado, no máximo
+        max_bytes em chunks lidos e ainda não consumidos (o chunk entregue conta até o pedido do
+        próximo), para que a memória fique limitada. Um chunk maior que max_bytes é processado
+        sozinho.
+
+        :param func: função que recebe o array do chunk e a sua janela.
+        :param windows: janelas a processar (padrão: chunks()).
+        :param read_kwargs: argumentos de leitura (indexes, masked, out_dtype...).
+        :param max_bytes: memória total dos chunks em processamento, em bytes.
+        :param bytes_per_pixel: memória usada por pixel de cada chunk, incluindo o que func aloca
+                                (padrão: bandas de origem).
+        :return: gerador de (janela, resultado), na ordem das janelas.
+        """
+        read_kwargs = read_kwargs or {}
+        windows = iter(self.chunks() if windows is None else windows)
+        max_in_flight = max_in_flight or 2 * self.max_workers
+        if bytes_per_pixel is None:
+            bytes_per_pixel = sum(np.dtype(dtype).itemsize for dtype in self.dataset.dtypes)
+
+        def task(window):
+            return window, func(self.read_chunk(window, **read_kwargs), window)
+
+        # O pool (e a conexão de cada thread) é reaproveitado entre chamadas
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        executor = self._executor
+
+        in_flight = deque()
+        in_flight_bytes = 0
+        next_window = next(windows, None)
+
+        def submit():
+            nonlocal in_flight_bytes, next_window
+            while next_window is not None and len(in_flight) < max_in_flight:
+                size = int(next_window.width) * int(next_window.height) * bytes_per_pixel
+                if max_bytes is not None and in_flight and in_flight_bytes + size > max_bytes:
+                    break
+                in_flight.append((executor.submit(task, next_window), size))
+                in_flight_bytes += size
+                next_window = next(windows, None)
+
+        try:
+            submit()
+            while in_flight:
+                future, size = in_flight.popleft()
+                yield future.result()
+                in_flight_bytes -= size
+                submit()
+        finally:
+            for future, _ in in_flight:
+                future.cancel()
+
+    def write_chunks(self, func, output_file, windows=None, read_kwargs=None, max_bytes=None,
+                     bytes_per_pixel=None, **profile):
+        """
+        Grava em output_file o resultado de func(dados, janela) de cada chunk, sem carregar a
+        imagem inteira. As janelas devem cobrir a imagem de saída; a gravação é feita na thread
+        principal, na ordem das janelas.
+
+        :param max_bytes: memória total dos chunks em processamento (ver map_chunks).
+        :param bytes_per_pixel: memória usada por pixel de cada chunk (ver map_chunks).
+        :param profile: alterações do perfil de saída (dtype, nodata, compress...), aplicadas
+                        sobre os metadados da imagem.
+        :return: output_file.
+        """
+        # GeoTIFF por padrão, mesmo quando a origem é um VRT (produtos .zip com GCPs)
+        out_profile = dict(self.dataset.meta, driver='GTiff')
+        out_profile.update(profile)
+        with rasterio.open(output_file, 'w', **out_profile) as dst:
+            for window, data in self.map_chunks(func, windows, read_kwargs, max_bytes=max_bytes,
+                                                bytes_per_pixel=bytes_per_pixel):
+                dst.write(data, window=window)
+        return output_file
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        with self._lock:
+            for dataset in self._handles:
+                close_scene(dataset)
+            self._handles = []
+        close_scene(self.dataset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Imagens do pool são devolvidas a ele (ver RasterPool)
+        if self.pooled:
+            RASTER_POOL.release(self)
+        else:
+            self.close()
+
+class RasterPool:
+    """
+    Imagens abertas (ChunkedRaster) compartilhadas, por processo e por thread (os datasets do
+    GDAL não podem ser usados por duas threads ao mesmo tempo). Cada open_raster é um
+    empréstimo: a imagem é aberta no primeiro e, quando o último termina, continua aberta entre
+    as max_idle imagens sem uso mais recentes da thread (LRU), para que a próxima abertura do
+    mesmo arquivo não o reabra. As imagens descartadas do LRU são fechadas pela própria thread.
+    """
+
+    def __init__(self, max_idle=DEFAULT_MAX_IDLE):
+        self.max_idle = max_idle
+        self._rasters = {}
+        self._leases = {}
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, path, chunk_bytes=None, max_workers=None):
+        """
+        Empresta a imagem já aberta pela thread atual, ou a abre. chunk_bytes e max_workers são
+        aplicados a uma imagem sem uso; se a imagem estiver em uso com outros valores, ValueError.
+        """
+        thread = (os.getpid(), threading.get_ident())
+        key = thread + _source_key(path)
+        with self._lock:
+            raster = self._rasters.get(key)
+            if raster is not None and raster.dataset.closed:
+                # Fechada explicitamente por quem a usava
+                self._forget_key(key)
+                raster = None
+            if raster is not None:
+                if self._leases[key] == 0:
+                    del self._idle[thread][key]
+                    raster.configure(chunk_bytes, max_workers)
+                elif raster.conflicts(chunk_bytes, max_workers):
+                    raise ValueError(f"{path} já está aberta com chunk_bytes={raster.chunk_bytes} e "
+                                     f"max_workers={raster.max_workers}")
+                self._leases[key] += 1
+                return raster
+        raster = ChunkedRaster(path, chunk_bytes, max_workers)
+        raster.pooled = True
+        raster.pool_key = key
+        with self._lock:
+            self._rasters[key] = raster
+            self._leases[key] = 1
+        return raster
+
+    def release(self, raster):
+        """
+        Devolve um empréstimo; sem nenhum, a imagem entra no LRU das imagens sem uso da thread,
+        e as mais antigas além de max_idle são fechadas.
+        """
+        evicted = []
+        with self._lock:
+            key = raster.pool_key
+            if self._rasters.get(key) is not raster:
+                return
+            self._leases[key] -= 1
+            if self._leases[key] > 0:
+                return
+            idle = self._idle.setdefault(key[:2], OrderedDict())
+            idle[key] = raster
+            while len(idle) > self.max_idle:
+                old_key, old_raster = idle.popitem(last=False)
+                del self._rasters[old_key], self._leases[old_key]
+                evicted.append(old_raster)
+        for old_raster in evicted:
+            old_raster.close()
+
+    def _forget_key(self, key):
+        del self._rasters[key], self._leases[key]
+        self._idle.get(key[:2], {}).pop(key, None)
+
+    def close(self):
+        with self._lock:
+            rasters = list(self._rasters.values())
+            self._rasters, self._leases, self._idle = {}, {}, {}
+        for raster in rasters:
+            raster.close()
+
+    def _forget(self):
+        # Após um fork, as conexões herdadas compartilham a posição dos arquivos com o processo
+        # pai e não podem ser usadas nem fechadas pelo filho
+        self._rasters = {}
+        self._leases = {}
+        self._idle = {}
+        self._lock = threading.Lock()
+
+RASTER_POOL = RasterPool()
+atexit.register(RASTER_POOL.close)
+
+def _after_fork():
+    RASTER_POOL._forget()
+    BLOCK_CACHE._lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+def open_raster(path, chunk_bytes=None, max_workers=None, pooled=True):
+    """
+    Abre uma imagem como ChunkedRaster (apenas o cabeçalho é lido).
+
+    Parâmetros:
+    path (str): Caminho da imagem (.tif, ou produto SAFE .zip, lido sem descompactar; ver safe_zip).
+    chunk_bytes (int): Tamanho máximo de cada chunk, em bytes (padrão: DEFAULT_CHUNK_BYTES).
+    max_workers (int): Threads das operações por chunk (padrão: núcleos, até 8).
+    pooled (bool): Reaproveita a imagem já aberta pela mesma thread (RASTER_POOL), que continua
+        aberta depois do último bloco with que a usa, entre as imagens sem uso mais recentes. Se
+        False, abre uma conexão própria, fechada ao sair do bloco.
+    """
+    if pooled:
+        return RASTER_POOL.acquire(path, chunk_bytes, max_workers)
+    return ChunkedRaster(path, chunk_bytes, max_workers)
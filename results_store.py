@@ -0,0 +1,232 @@
+#results_store
+#_________________________________________________________________________________________
+# Armazena os resultados das estatísticas por recorte (chip) em um banco SQLite, com a
+# impressão digital (tamanho, data de modificação e, opcionalmente, hash) dos arquivos de
+# entrada, para retomar o processamento e recalcular apenas os chips novos ou alterados
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import csv
+import hashlib
+import sqlite3
+import numpy as np
+
+def file_fingerprint(path, use_hash=False):
+    """
+    Calcula a impressão digital de um arquivo: tamanho e data de modificação (em ns) e,
+    se pedido, o SHA-256 do conteúdo.
+
+    Parâmetros:
+    path (str): Caminho do arquivo.
+    use_hash (bool): Se True, inclui o SHA-256 (lê o arquivo inteiro).
+
+    Retorna:
+    str: Impressão digital no formato "tamanho:mtime[:sha256]".
+    """
+    stat = os.stat(path)
+    fingerprint = f"{stat.st_size}:{stat.st_mtime_ns}"
+    if use_hash:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        fingerprint += f":{digest.hexdigest()}"
+    return fingerprint
+
+def chip_fingerprint(paths, use_hash=False):
+    """
+    Combina as impressões digitais de todos os arquivos de entrada de um chip (objeto, fundo,
+    shapefile...). Arquivos inexistentes entram como "-", para que o aparecimento de um deles
+    também conte como alteração.
+    """
+    return "|".join(file_fingerprint(path, use_hash) if os.path.isfile(path) else "-"
+                    for path in paths)
+
+def _sql_value(value):
+    # Converte escalares numpy para tipos nativos do sqlite3
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+class ResultsStore:
+    """
+    Banco SQLite com uma linha de resultados por chip, identificada pelo caminho do chip e
+    acompanhada da sua impressão digital. As gravações são acumuladas e confirmadas em lotes
+    (uma transação a cada batch_size linhas), e não a cada chip.
+
+    Uso:
+        with ResultsStore('resultados.sqlite', FIELDNAMES) as store:
+            known = store.fingerprints()
+            ...
+            if known.get(chip) != fingerprint:
+                store.put(chip, fingerprint, results)
+            ...
+            store.export_csv('resultados.csv')
+    """
+
+    def __init__(self, db_file, fieldnames, batch_size=500):
+        self.fieldnames = list(fieldnames)
+        self.batch_size = batch_size
+        self._pending = []
+        self._pending_errors = []
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+        columns = ", ".join(f'"{name}"' for name in self.fieldnames)
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS results '
+                          f'(chip TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, {columns})')
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(results)")}
+        for name in self.fieldnames:
+            if name not in existing:
+                self.conn.execute(f'ALTER TABLE results ADD COLUMN "{name}"')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS errors '
+                          '(chip TEXT PRIMARY KEY, fingerprint TEXT, error TEXT)')
+        # CSVs já exportados por este banco (os únicos que export_csv sobrescreve sem overwrite)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS exports (csv_file TEXT PRIMARY KEY)')
+        self.conn.commit()
+
+        placeholders = ", ".join("?" * (len(self.fieldnames) + 2))
+        self._insert = (f'INSERT OR REPLACE INTO results (chip, fingerprint, {columns}) '
+                        f'VALUES ({placeholders})')
+
+    def fingerprints(self):
+        """
+        Retorna um dicionário {chip: impressão digital} de todos os chips já gravados.
+        """
+        return dict(self.conn.execute("SELECT chip, fingerprint FROM results"))
+
+    def put(self, chip, fingerprint, results):
+        """
+        Acumula os resultados de um chip; o lote é gravado quando atinge batch_size linhas.
+        """
+        self._pending.append((chip, fingerprint) +
+                             tuple(_sql_value(results.get(name, '')) for name in self.fieldnames))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def put_error(self, chip, fingerprint, error):
+        """
+        Registra a falha de um chip (o chip continua pendente e é refeito na próxima execução).
+        """
+        self._pending_errors.append((chip, fingerprint, error))
+        if len(self._pending_errors) >= self.batch_size:
+            self.flush()
+
+    def clear_errors(self):
+        """
+        Apaga as falhas registradas (ex.: no início de uma execução, para que errors() só traga as
+        dela). Os chips com falha continuam sem resultados e são refeitos.
+        """
+        self._pending_errors = []
+        with self.conn:
+            self.conn.execute("DELETE FROM errors")
+
+    def errors(self):
+        """
+        Retorna a lista de (chip, erro) das falhas registradas.
+        """
+        self.flush()
+        return self.conn.execute("SELECT chip, error FROM errors ORDER BY chip").fetchall()
+
+    def flush(self):
+        """
+        Grava as linhas pendentes em uma única transação. Chips gravados com sucesso saem da
+        tabela de erros.
+        """
+        if self._pending or self._pending_errors:
+            with self.conn:
+                self.conn.executemany(self._insert, self._pending)
+                self.conn.executemany("DELETE FROM errors WHERE chip = ?",
+                                      [(row[0],) for row in self._pending])
+                self.conn.executemany("INSERT OR REPLACE INTO errors VALUES (?, ?, ?)",
+                                      self._pending_errors)
+            self._pending = []
+            self._pending_errors = []
+
+    def owns_csv(self, csv_file):
+        """
+        Verifica se export_csv pode gravar o CSV sem perder linhas: o arquivo não existe ou foi
+        exportado por este banco (e então todas as suas linhas estão aqui).
+        """
+        if not os.path.exists(csv_file):
+            return True
+        row = self.conn.execute("SELECT 1 FROM exports WHERE csv_file = ?",
+                                (os.path.realpath(csv_file),)).fetchone()
+        return row is not None
+
+    def prune(self, chips):
+        """
+        Remove os resultados e as falhas dos chips que não estão em chips (ex.: chips apagados da
+        pasta desde a última execução).
+
+        Retorna:
+        int: Número de chips removidos dos resultados.
+        """
+        self.flush()
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS current_chips (chip TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM current_chips")
+            self.conn.executemany("INSERT OR IGNORE INTO current_chips VALUES (?)", ((chip,) for chip in chips))
+            removed = self.conn.execute("DELETE FROM results WHERE chip NOT IN "
+                                        "(SELECT chip FROM current_chips)").rowcount
+            self.conn.execute("DELETE FROM errors WHERE chip NOT IN (SELECT chip FROM current_chips)")
+            self.conn.execute("DELETE FROM current_chips")
+        return removed
+
+    def export_csv(self, csv_file, overwrite=False, chips=None):
+        """
+        Exporta todos os resultados para um CSV, com as colunas fieldnames, ordenados pelo chip.
+        Um CSV que já existe e não foi exportado por este banco (ex.: o de uma execução anterior
+        ao banco) só é sobrescrito com overwrite=True, pois as suas linhas não estão no banco.
+        Se chips for dado (os chips atuais), os resultados dos demais são removidos antes (ver prune).
+        """
+        if not overwrite and not self.owns_csv(csv_file):
+            raise FileExistsError(f"{csv_file} já existe e não foi gerado por este banco de resultados; "
+                                  f"as suas linhas seriam perdidas")
+        if chips is not None:
+            self.prune(chips)
+        self.flush()
+        columns = ", ".join(f'"{name}"' for name in self.fieldnames)
+        with open(csv_file, mode='w', newline='') as csvfile:
+            csv_writer = csv.writer(csvfile)
+            csv_writer.writerow(self.fieldnames)
+            csv_writer.writerows(self.conn.execute(f"SELECT {columns} FROM results ORDER BY chip"))
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO exports VALUES (?)", (os.path.realpath(csv_file),))
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
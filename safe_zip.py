@@ -0,0 +1,210 @@
+#safe_zip
+#_________________________________________________________________________________________
+# Abre as imagens de medição (measurement/*.tiff) dos produtos SAFE baixados em .zip
+# diretamente pelo sistema de arquivos virtual do GDAL (/vsizip/, /vsisubfile/), sem
+# descompactar a cena inteira. Um índice dos membros de cada .zip (posição e tamanho) é
+# gravado ao lado do arquivo para que reabrir o produto seja rápido
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import re
+import json
+import glob
+import struct
+import zipfile
+import rasterio
+from rasterio.vrt import WarpedVRT
+
+# Imagens de medição dentro do produto SAFE (ex.: S1A_..._.SAFE/measurement/s1a-iw-grd-vv-....tiff)
+MEASUREMENT_PATTERN = re.compile(r'\.SAFE/measurement/[^/]+\.tiff?$', re.IGNORECASE)
+# Polarização preferida quando o produto tem mais de uma
+POLARIZATION_ORDER = ('vv', 'hh', 'vh', 'hv')
+# Cabeçalho local de cada membro do zip (30 bytes; os dois últimos campos são os tamanhos
+# do nome e do campo extra)
+LOCAL_HEADER = struct.Struct('<4s5H3I2H')
+INDEX_VERSION = 1
+# Início da aquisição no nome do produto (ex.: S1A_IW_GRDH_1SDV_20240101T083015_...)
+PRODUCT_TIME_PATTERN = re.compile(r'_(\d{8}T\d{6})_')
+
+# Opções do GDAL na abertura: cache dos blocos lidos do arquivo virtual e sem listar o
+# diretório do zip a cada abertura
+VSI_OPTIONS = {
+    'VSI_CACHE': True,
+    'VSI_CACHE_SIZE': 64 * 1024 * 1024,
+    'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR',
+}
+
+def index_file(zip_path):
+    return zip_path + '.index.json'
+
+def _zip_stamp(zip_path):
+    stat = os.stat(zip_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def zip_member_index(zip_path, rebuild=False):
+    """
+    Índice dos membros de um .zip: para cada arquivo, a posição dos dados no zip, o tamanho e
+    o tipo de compressão. O índice é gravado em <zip>.index.json e reaproveitado enquanto o
+    tamanho e a data de modificação do zip não mudarem.
+
+    :param zip_path: caminho do produto .zip.
+    :param rebuild: se True, ignora o índice gravado.
+    :return: dicionário {membro: {'offset', 'size', 'compress_size', 'compress_type'}}.
+    """
+    stamp = _zip_stamp(zip_path)
+    sidecar = index_file(zip_path)
+    if not rebuild and os.path.exists(sidecar):
+        try:
+            with open(sidecar) as f:
+                index = json.load(f)
+            if index.get('version') == INDEX_VERSION and index.get('zip') == stamp:
+                return index['members']
+        except (OSError, ValueError):
+            pass
+
+    members = {}
+    with zipfile.ZipFile(zip_path) as archive, open(zip_path, 'rb') as f:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            # Os dados começam depois do cabeçalho local, cujo campo extra pode diferir do
+            # diretório central
+            f.seek(info.header_offset)
+            header = LOCAL_HEADER.unpack(f.read(LOCAL_HEADER.size))
+            name_length, extra_length = header[-2:]
+            members[info.filename] = {
+                'offset': info.header_offset + LOCAL_HEADER.size + name_length + extra_length,
+                'size': info.file_size,
+                'compress_size': info.compress_size,
+                'compress_type': info.compress_type,
+            }
+
+    # O índice é só um atalho: se o diretório não aceitar gravação, segue sem ele
+    try:
+        temp_file = sidecar + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'zip': stamp, 'members': members}, f)
+        os.replace(temp_file, sidecar)
+    except OSError:
+        pass
+    return members
+
+def measurement_members(zip_path, polarization=None):
+    """
+    Imagens de medição de um produto SAFE em .zip, na ordem de POLARIZATION_ORDER.
+
+    :param polarization: se dado (ex.: 'vv'), somente as imagens dessa polarização.
+    """
+    members = [name for name in zip_member_index(zip_path) if MEASUREMENT_PATTERN.search(name)]
+
+    def polarization_of(name):
+        parts = os.path.basename(name).lower().split('-')
+        return next((part for part in parts if part in POLARIZATION_ORDER), '')
+
+    if polarization is not None:
+        members = [name for name in members if polarization_of(name) == polarization.lower()]
+    order = {pol: rank for rank, pol in enumerate(POLARIZATION_ORDER)}
+    return sorted(members, key=lambda name: (order.get(polarization_of(name), len(order)), name))
+
+def member_vsi_path(zip_path, member):
+    """
+    Caminho virtual do GDAL para um membro do zip. Membros gravados sem compressão são abertos
+    por /vsisubfile/ na posição do índice (sem passar pelo diretório do zip); os comprimidos,
+    por /vsizip/ (o GDAL guarda pontos de descompressão para as leituras por janela).
+    """
+    zip_path = os.path.abspath(zip_path)
+    entry = zip_member_index(zip_path)[member]
+    if entry['compress_type'] == zipfile.ZIP_STORED:
+        return f"/vsisubfile/{entry['offset']}_{entry['size']},{zip_path}"
+    return f"/vsizip/{zip_path}/{member}"
+
+def resolve_raster_source(path, polarization=None):
+    """
+    Caminho que o GDAL abre para uma imagem: o próprio caminho, ou, para um produto .zip, a
+    imagem de medição dentro dele (a primeira de POLARIZATION_ORDER, ou a da polarização dada).
+    Um membro específico pode ser indicado como 'produto.zip/caminho/do/membro.tiff'.
+    """
+    if path.startswith('/vsi'):
+        return path
+    if path.lower().endswith('.zip'):
+        members = measurement_members(path, polarization)
+        if not members:
+            raise ValueError(f"Nenhuma imagem de medição encontrada em {path}")
+        return member_vsi_path(path, members[0])
+
+    marker = path.lower().find('.zip/')
+    if marker >= 0:
+        zip_path, member = path[:marker + 4], path[marker + 5:]
+        if member in zip_member_index(zip_path):
+            return member_vsi_path(zip_path, member)
+    return path
+
+def open_scene(path, polarization=None):
+    """
+    Abre uma imagem (.tif ou produto .zip) com rasterio. Imagens sem georreferenciamento, só
+    com pontos de controle (GCPs), como as de medição dos produtos GRD, são abertas através de
+    um WarpedVRT na projeção dos GCPs, para que janelas e recortes por polígono funcionem como
+    em um GeoTIFF comum.
+
+    :return: dataset do rasterio (feche com close_scene).
+    """
+    with rasterio.Env(**VSI_OPTIONS):
+        src = rasterio.open(resolve_raster_source(path, polarization))
+    gcps, gcps_crs = src.gcps
+    if not (src.transform.is_identity and gcps):
+        return src
+    # O valor 0 é o nodata das imagens de medição e preenche a área fora da cena
+    nodata = src.nodata if src.nodata is not None else 0
+    return WarpedVRT(src, src_crs=gcps_crs or src.crs, nodata=nodata)
+
+def close_scene(dataset):
+    """
+    Fecha um dataset aberto com open_scene (e a imagem de origem, no caso de um WarpedVRT).
+    """
+    source = getattr(dataset, 'src_dataset', None)
+    dataset.close()
+    if source is not None:
+        source.close()
+
+def product_start_time(path):
+    """
+    Início da aquisição tirado do nome do produto SAFE, ou None se o nome não o contiver.
+    """
+    match = PRODUCT_TIME_PATTERN.search(os.path.basename(path))
+    return match.group(1) if match else None
+
+def list_scene_sources(directory, include_zips=True):
+    """
+    Imagens de um diretório: os arquivos .tif e, se include_zips, os produtos .zip baixados
+    (lidos sem descompactar).
+    """
+    sources = glob.glob(os.path.join(directory, '*.tif'))
+    if include_zips:
+        sources += glob.glob(os.path.join(directory, '*.zip'))
+    return sorted(sources)
@@ -0,0 +1,187 @@
+#scene_matching
+#_________________________________________________________________________________________
+# Leitura em bloco (Arrow) das camadas vetoriais e associação dos polígonos às cenas pela
+# interseção com o footprint de cada cena e pela data de aquisição, com índice espacial
+# (STRtree), sem depender do nome dos arquivos
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+import shapely.geometry
+from rasterio.features import shapes
+from rasterio.warp import transform_geom
+from raster_access import open_raster
+from safe_zip import product_start_time
+
+# Tags de metadados com a data de aquisição, na ordem de preferência (SNAP, GDAL)
+ACQUISITION_TAGS = ['ACQUISITION_START_TIME', 'first_line_time', 'PRODUCT_FIRST_LINE_UTC_TIME',
+                    'TIFFTAG_DATETIME']
+
+def read_vector_layers(paths, columns=None, crs=None):
+    """
+    Lê uma ou mais camadas vetoriais em bloco pelo caminho colunar (pyogrio com Arrow), sem
+    percorrer as feições em Python, e as junta em um único GeoDataFrame.
+
+    Parâmetros:
+    paths (str ou list): Arquivo(s) vetorial(is) (.shp, .gpkg...).
+    columns (list): Colunas de atributos a ler (None = todas).
+    crs: Sistema de referência de saída (None = o da primeira camada).
+
+    Retorna:
+    GeoDataFrame: Feições de todas as camadas.
+    """
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    layers = [gpd.read_file(path, engine='pyogrio', use_arrow=True, columns=columns) for path in paths]
+    if not layers:
+        return gpd.GeoDataFrame(geometry=[], crs=crs)
+    crs = crs or layers[0].crs
+    layers = [layer.to_crs(crs) if crs is not None and layer.crs is not None and layer.crs != crs else layer
+              for layer in layers]
+    return gpd.GeoDataFrame(pd.concat(layers, ignore_index=True), crs=crs)
+
+def raster_acquisition_time(src):
+    """
+    Data de aquisição de um raster aberto, lida dos metadados (ACQUISITION_TAGS), ou NaT.
+    """
+    tags = src.tags()
+    for tag in ACQUISITION_TAGS:
+        if tags.get(tag):
+            value = tags[tag]
+            if tag == 'TIFFTAG_DATETIME':
+                value = value.replace(':', '-', 2)  # "AAAA:MM:DD HH:MM:SS"
+            time = pd.to_datetime(value, utc=True, errors='coerce')
+            if not pd.isna(time):
+                return time
+    return pd.NaT
+
+def _valid_data_footprint(src, decimation):
+    # Contorno dos pixels válidos, a partir da máscara lida em resolução reduzida
+    height = max(1, src.height // decimation)
+    width = max(1, src.width // decimation)
+    mask = src.dataset_mask(out_shape=(height, width))
+    transform = src.transform * src.transform.scale(src.width / width, src.height / height)
+    parts = [shapely.geometry.shape(geom) for geom, value in shapes(mask, mask=mask > 0, transform=transform)]
+    return shapely.union_all(parts) if parts else shapely.Polygon()
+
+def scene_footprints(tiff_paths, crs='EPSG:4326', acquisition_times=None, valid_data=False, decimation=16):
+    """
+    Footprints das cenas a partir do cabeçalho dos rasters (sem ler os pixels, exceto com
+    valid_data).
+
+    Parâmetros:
+    tiff_paths (list): Caminhos das cenas (.tif, ou produtos .zip, datados pelo nome do produto).
+    crs: Sistema de referência dos footprints.
+    acquisition_times (dict): Datas de aquisição por caminho (substituem as dos metadados).
+    valid_data (bool): Se True, o footprint é o contorno dos pixels válidos (máscara do raster
+                       em resolução reduzida por decimation); senão, o retângulo da cena.
+    decimation (int): Fator de redução da máscara com valid_data.
+
+    Retorna:
+    GeoDataFrame: Colunas scene (caminho), acquisition_time e a geometria de cada cena.
+    """
+    acquisition_times = acquisition_times or {}
+    records = []
+    geometries = []
+    for path in tiff_paths:
+        with open_raster(path) as src:
+            if valid_data:
+                footprint = _valid_data_footprint(src, decimation)
+            else:
+                footprint = shapely.box(*src.bounds)
+            if src.crs is not None and crs is not None:
+                footprint = shapely.geometry.shape(transform_geom(src.crs, crs, shapely.geometry.mapping(footprint)))
+            time = acquisition_times.get(path)
+            if time is None and path.lower().endswith('.zip'):
+                time = product_start_time(path)
+            records.append({'scene': path,
+                            'acquisition_time': pd.to_datetime(time, utc=True) if time is not None
+                                                else raster_acquisition_time(src)})
+        geometries.append(footprint)
+    return gpd.GeoDataFrame(records, geometry=geometries, crs=crs)
+
+def catalog_footprints(catalog_file):
+    """
+    Footprints das cenas a partir do catálogo de busca (CSV de asf_aoi_search.export_catalog),
+    em EPSG:4326, com a coluna acquisition_time (startTime).
+    """
+    catalog = pd.read_csv(catalog_file)
+    geometry = shapely.from_wkt(catalog.pop('geometry').fillna('').to_numpy(), on_invalid='ignore')
+    catalog['acquisition_time'] = pd.to_datetime(catalog['startTime'], utc=True, errors='coerce')
+    return gpd.GeoDataFrame(catalog, geometry=geometry, crs='EPSG:4326')
+
+def match_polygons_to_scenes(polygons, scenes, time_column=None, max_time_delta=None, best_only=False):
+    """
+    Associa os polígonos às cenas cujo footprint os intercepta, com uma única consulta
+    vetorizada a uma STRtree dos polígonos.
+
+    Parâmetros:
+    polygons (GeoDataFrame): Polígonos.
+    scenes (GeoDataFrame): Footprints das cenas (ver scene_footprints / catalog_footprints),
+                           com a coluna acquisition_time.
+    time_column (str): Coluna de data dos polígonos; se dada, só ficam os pares em que a
+                       diferença para a aquisição da cena é de no máximo max_time_delta.
+    max_time_delta: Diferença máxima de tempo (Timedelta ou texto, ex.: '1h').
+    best_only (bool): Se True, fica só a cena de maior sobreposição (e, no empate, a de
+                      aquisição mais próxima) de cada polígono.
+
+    Retorna:
+    DataFrame: Pares polygon (posição em polygons) e scene (posição em scenes), com a fração
+               da área do polígono coberta pela cena (overlap) e a diferença de tempo (time_delta).
+    """
+    if polygons.crs is not None and scenes.crs is not None and polygons.crs != scenes.crs:
+        scenes = scenes.to_crs(polygons.crs)
+    polygon_geoms = polygons.geometry.values
+    scene_geoms = scenes.geometry.values
+
+    tree = shapely.STRtree(polygon_geoms)
+    scene_idx, polygon_idx = tree.query(scene_geoms, predicate='intersects')
+    pairs = pd.DataFrame({'polygon': polygon_idx, 'scene': scene_idx})
+
+    if time_column is not None and 'acquisition_time' in scenes.columns:
+        polygon_time = pd.to_datetime(polygons[time_column].to_numpy()[polygon_idx], utc=True)
+        scene_time = pd.to_datetime(scenes['acquisition_time'].to_numpy()[scene_idx], utc=True)
+        pairs['time_delta'] = np.abs(scene_time - polygon_time)
+        if max_time_delta is not None:
+            pairs = pairs[pairs['time_delta'] <= pd.Timedelta(max_time_delta)]
+    else:
+        pairs['time_delta'] = pd.NaT
+
+    polygon_sel = polygon_geoms[pairs['polygon'].to_numpy()]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pairs['overlap'] = (shapely.area(shapely.intersection(polygon_sel, scene_geoms[pairs['scene'].to_numpy()]))
+                            / shapely.area(polygon_sel))
+
+    if best_only and not pairs.empty:
+        pairs = (pairs.sort_values(['polygon', 'overlap', 'time_delta'], ascending=[True, False, True])
+                      .drop_duplicates('polygon'))
+    return pairs.sort_values(['scene', 'polygon']).reset_index(drop=True)
@@ -0,0 +1,131 @@
+#shape_features
+#_________________________________________________________________________________________
+# Calcula as características geométricas dos polígonos (área, perímetro, complexidade,
+# espalhamento, fator de forma, momento de Hu e circularidade) de uma camada inteira de uma
+# só vez, com operações vetorizadas do shapely 2 e momentos de imagem do raster de rótulos
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import numpy as np
+import pandas as pd
+import shapely
+from crop_slicks_outOf_image import rasterize_polygon_labels
+
+# Colunas de forma de stats_obj_img.FIELDNAMES
+SHAPE_COLUMNS = ["area", "perim", "complexity_measure", "spreading", "shape_factor", "hu_moment", "circularity"]
+
+def geometry_shape_features(geometries):
+    """
+    Calcula as características que dependem apenas da geometria, para todos os polígonos de uma vez.
+    
+    Parâmetros:
+    geometries (array): Polígonos (GeoSeries ou array de geometrias shapely).
+    
+    Retorna:
+    dict: Arrays area, perim, complexity_measure (P / 2√(πA)), circularity (4πA / P²) e
+    shape_factor (A / área do fecho convexo).
+    """
+    geometries = np.asarray(geometries)
+    area = shapely.area(geometries)
+    perim = shapely.length(geometries)
+    hull_area = shapely.area(shapely.convex_hull(geometries))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        complexity_measure = perim / (2 * np.sqrt(np.pi * area))
+        circularity = 4 * np.pi * area / perim ** 2
+        shape_factor = area / hull_area
+
+    return {
+        "area": area,
+        "perim": perim,
+        "complexity_measure": complexity_measure,
+        "circularity": circularity,
+        "shape_factor": shape_factor,
+    }
+
+def label_moment_features(labels, n_labels):
+    """
+    Calcula os momentos de imagem de todos os rótulos de uma vez (bincount sobre as coordenadas
+    dos pixels de cada rótulo).
+    
+    Parâmetros:
+    labels (numpy.ndarray): Raster de rótulos, de 0 (fundo) a n_labels.
+    n_labels (int): Maior rótulo.
+    
+    Retorna:
+    dict: Arrays, indexados por rótulo - 1, com spreading (100·λ2 / (λ1 + λ2), pelos autovalores da
+    matriz de momentos centrais de segunda ordem) e hu_moment (primeiro invariante de Hu, η20 + η02).
+    """
+    rows, cols = np.nonzero(labels)
+    label = labels[rows, cols]
+    rows = rows.astype(np.float64)
+    cols = cols.astype(np.float64)
+
+    m00 = np.bincount(label, minlength=n_labels + 1)[1:].astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        row_mean = np.bincount(label, rows, minlength=n_labels + 1)[1:] / m00
+        col_mean = np.bincount(label, cols, minlength=n_labels + 1)[1:] / m00
+        drow = rows - row_mean[label - 1]
+        dcol = cols - col_mean[label - 1]
+        mu20 = np.bincount(label, dcol * dcol, minlength=n_labels + 1)[1:]
+        mu02 = np.bincount(label, drow * drow, minlength=n_labels + 1)[1:]
+        mu11 = np.bincount(label, dcol * drow, minlength=n_labels + 1)[1:]
+
+        # Autovalores da matriz de covariância [[mu20, mu11], [mu11, mu02]]
+        half_trace = (mu20 + mu02) / 2
+        delta = np.sqrt(((mu20 - mu02) / 2) ** 2 + mu11 ** 2)
+        lambda1, lambda2 = half_trace + delta, half_trace - delta
+        spreading = 100 * lambda2 / (lambda1 + lambda2)
+
+        hu_moment = (mu20 + mu02) / m00 ** 2
+
+    return {
+        "spreading": spreading,
+        "hu_moment": hu_moment,
+    }
+
+def shape_features(polygons, out_shape=None, transform=None, labels=None):
+    """
+    Calcula todas as características de forma de uma camada de polígonos.
+    
+    Parâmetros:
+    polygons (GeoDataFrame): Polígonos (um por linha).
+    out_shape (tuple): Dimensões do raster de rótulos, quando labels não é informado.
+    transform (Affine): Transformação do raster de rótulos, quando labels não é informado.
+    labels (numpy.ndarray): Raster de rótulos já calculado (posição do polígono + 1), por exemplo
+        o de zonal_stats, para não rasterizar de novo.
+    
+    Retorna:
+    DataFrame: Colunas SHAPE_COLUMNS, na ordem e com o índice de polygons.
+    """
+    if labels is None:
+        labels = rasterize_polygon_labels(polygons, out_shape, transform, id_field=None)
+
+    features = geometry_shape_features(polygons.geometry.values)
+    features.update(label_moment_features(labels, len(polygons)))
+    return pd.DataFrame(features, index=polygons.index)[SHAPE_COLUMNS]
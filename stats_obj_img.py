@@ -1,240 +1,590 @@
-#Stats_obj_img
-#_________________________________________________________________________________________
-# Rotina que recebe uma imagem de um objeto (mancha de óleo) e do fundo (mar) e realiza 
-# as estatísticas entre os dois para melhor análise se é ou não óleo no oceano
-#_________________________________________________________________________________________
-# MIT License
-# 
-# Permission is hereby granted, free of charge, to any person obtaining a copy
-# of this software and associated documentation files (the "Software"), to deal
-# in the Software without restriction, including without limitation the rights
-# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
-# copies of the Software, and to permit persons to whom the Software is
-# furnished to do so, subject to the following conditions:
-# 
-# The above copyright notice and this permission notice shall be included in all
-# copies or substantial portions of the Software.
-# 
-# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
-# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
-# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
-# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
-# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
-# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
-# SOFTWARE.
-#__________________________________________________________________________________________
-# Author: Maria Paula Graziotto
-# Github: Graziottomp
-# Email: graziotto.mp@outlook.com
-# Created: 2024-06-20
-#__________________________________________________________________________________________
-
-import os
-import csv
-import rasterio
-import numpy as np
-import scipy.ndimage as ndi
-import skimage.filters as filters
-from skimage.filters import threshold_mean, threshold_otsu
-
-def load_class_data(class_data_csv):
-    """
-    Carrega dados de classe de um arquivo CSV e retorna um dicionário com ID_POLY como chave.
-    """
-    class_data = {}
-    with open(class_data_csv, mode='r') as csvfile:
-        csv_reader = csv.DictReader(csvfile)
-        for row in csv_reader:
-            class_data[row['ID_POLY']] = {
-                'CLASSE': row['CLASSE'],
-                'SUBCLASSE': row['SUBCLASSE']
-            }
-    return class_data
-
-
-def stats_obj_img(fname_img_pol, fname_img, img_name, class_data):
-    """
-    Calcula estatísticas de uma imagem de objeto e de fundo, bem como métricas relacionadas ao gradiente.
-
-    :param fname_img_pol: caminho para o arquivo raster do objeto (polígono).
-    :param fname_img: caminho para o arquivo raster da imagem de fundo.
-    :param img_name: nome da imagem.
-    :param class_data: dicionário com dados de classe.
-    :return: Um dicionário contendo estatísticas e métricas calculadas.
-    """
-    # Extrair ID_POLY removendo tudo após o primeiro "_"
-    id_poly = img_name.split('_background')[0]
-    id_poly_base = id_poly.split('_')[0]
-
-    # Estatísticas do Objeto
-    with rasterio.open(fname_img_pol) as object_img:
-        band_object = object_img.read(1)
-        if band_object.size == 0 or np.all(np.isnan(band_object)):
-            raise ValueError("Objeto de imagem vazio ou sem valores válidos")
-        object_mean = np.nanmean(band_object)  # Média, ignorando NaNs
-        object_std_dev = np.nanstd(band_object)  # Desvio padrão, ignorando NaNs
-        object_max = np.nanmax(band_object)
-        object_min = np.nanmin(band_object)
-        object_median = np.nanmedian(band_object)
-        object_coefficient_of_variation = object_std_dev / object_mean  # Coeficiente de variação
-
-    # Estatísticas do Fundo
-    with rasterio.open(fname_img) as background_img:
-        band_background = background_img.read(1)
-        if band_background.size == 0 or np.all(np.isnan(band_background)):
-            raise ValueError("Imagem de fundo vazia ou sem valores válidos")
-        
-        finite_background = band_background[np.isfinite(band_background)]
-        if finite_background.size == 0:
-            raise ValueError("Imagem de fundo sem valores finitos")
-        
-        # Threshold para identificar fundo
-        try:
-            background_threshold = threshold_mean(finite_background)
-        except ValueError as e:
-            print(f"Erro ao calcular o threshold médio para {img_name}: {e}")
-            print("Usando threshold Otsu como fallback.")
-            try:
-                background_threshold = threshold_otsu(finite_background)
-            except ValueError as e:
-                raise ValueError(f"Erro ao calcular threshold Otsu para {img_name}: {e}")
-
-        background_mean = np.nanmean(band_background)  # Média, ignorando NaNs
-        background_std_dev = np.nanstd(band_background)  # Desvio padrão, ignorando NaNs
-        background_max = np.nanmax(band_background)
-        background_min = np.nanmin(band_background)
-        background_median = np.nanmedian(band_background)
-        background_coefficient_of_variation = background_std_dev / background_mean
-
-        # Gradientes e Bordas
-        gradient_x = ndi.sobel(band_background, axis=1)  # Gradiente ao longo do eixo X
-        gradient_y = ndi.sobel(band_background, axis=0)  # Gradiente ao longo do eixo Y
-        gradient_magnitude = np.hypot(gradient_x, gradient_y)
-
-        edges = filters.sobel(band_background)  # Detecção de bordas
-
-        border_gradients = gradient_magnitude[edges > 0]
-        if border_gradients.size == 0:
-            mean_border_gradient = np.nan
-            gradient_std_dev = np.nan
-            max_border_gradient = np.nan
-        else:
-            mean_border_gradient = np.nanmean(border_gradients)
-            gradient_std_dev = np.nanstd(border_gradients)
-            max_border_gradient = np.nanmax(border_gradients)
-
-        # Contraste entre objeto e fundo
-        finite_object = band_object[np.isfinite(band_object)]
-        if finite_object.size == 0:
-            raise ValueError("Objeto sem valores finitos")
-
-        try:
-            object_threshold = threshold_mean(finite_object)  # Valor do threshold
-        except ValueError as e:
-            print(f"Erro ao calcular o threshold médio para objeto em {img_name}: {e}")
-            print("Usando threshold Otsu como fallback.")
-            try:
-                object_threshold = threshold_otsu(finite_object)
-            except ValueError as e:
-                raise ValueError(f"Erro ao calcular threshold Otsu para objeto em {img_name}: {e}")
-
-        lowest_backscatter_object = np.nanmin(band_object)
-
-        max_contrast = abs(background_mean - lowest_backscatter_object)
-        mean_contrast = abs(background_mean - object_mean)
-
-        # Object Power to Mean Ratio
-        object_power_to_mean_ratio = object_mean / background_mean
-
-    # Adicionar informações de classe
-    classe_info = class_data.get(id_poly_base, {'CLASSE': 'Desconhecido', 'SUBCLASSE': 'Desconhecido'})
-
-    # Resultados como um dicionário
-    results = {
-        "img_name": '21 S1B_IW_GRDH_1SDV_20200802T001516_NR_Orb_Cal_TC',
-        "IMG_NUMBER": '21',
-        "ID_POLY": id_poly,
-        "CLASSE": classe_info['CLASSE'],
-        "SUBCLASSE": classe_info['SUBCLASSE'],
-        "area": '',
-        "perim": '',
-        "complexity_measure": '',
-        "spreading": '',
-        "shape_factor": '',
-        "hu_moment": '',
-        "circularity": '',
-        "FG_MEAN": object_mean,
-        "FG_STD": object_std_dev,
-        "FG_MIN": object_min,
-        "FG_MAX": object_max,
-        "FG_MEDIAN": object_median,
-        "FG_VAR_COEF": object_coefficient_of_variation,
-        "FG_THRES": object_threshold,
-        "BG_MEAN": background_mean,
-        "BG_STD": background_std_dev,
-        "BG_MIN": background_min,
-        "BG_MAX": background_max,
-        "BG_MEDIAN": background_median,
-        "BG_VAR_COEF": background_coefficient_of_variation,
-        "BG_THRES": background_threshold,
-        "FG_BG_MAX_CONTRAST": max_contrast,
-        "FG_BG_MEAN_CONTRAST_RATIO": mean_contrast,
-        "POWER_MEAN_RATIO": object_power_to_mean_ratio,
-        "BORDER_GRAD_MEAN": mean_border_gradient,
-        "BORDER_GRAD_STD": gradient_std_dev,
-        "BORDER_GRAD_MAX": max_border_gradient,
-    }
-
-    return results
-
-
-def main():
-    # Diretório contendo as imagens
-    img_dir = 'caminho para o arquivo'
-    class_data_csv = 'caminho para o arquivo.csv'
-
-    # Carregar dados de classe
-    class_data = load_class_data(class_data_csv)
-
-    # Nome do arquivo CSV para salvar resultados
-    csv_filename = "caminho para o arquivo.csv"
-
-    # Verifica se o arquivo CSV existe, se não, cria e escreve o cabeçalho
-    if not os.path.isfile(csv_filename):
-        with open(csv_filename, mode='w', newline='') as csvfile:
-            fieldnames = [
-                "img_name", "IMG_NUMBER", "ID_POLY", "CLASSE", "SUBCLASSE", "area",
-                "perim", "complexity_measure", "spreading", "shape_factor", "hu_moment",
-                "circularity", "FG_MEAN", "FG_STD", "FG_MIN", "FG_MAX", "FG_MEDIAN",
-                "FG_VAR_COEF", "FG_THRES", "BG_MEAN", "BG_STD", "BG_MIN", "BG_MAX",
-                "BG_MEDIAN", "BG_VAR_COEF", "BG_THRES", "FG_BG_MAX_CONTRAST",
-                "FG_BG_MEAN_CONTRAST_RATIO", "POWER_MEAN_RATIO", "BORDER_GRAD_MEAN",
-                "BORDER_GRAD_STD", "BORDER_GRAD_MAX",
-            ]
-            csv_writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            csv_writer.writeheader()
-
-        # Processa cada imagem na pasta
-    for img_name in os.listdir(img_dir):
-        if img_name.endswith('_background.tif'):  # Verifica se é um arquivo TIFF de background
-            try:
-                # Caminhos para os arquivos do objeto e do fundo
-                fname_img_pol = os.path.join(img_dir, img_name)
-                fname_img = os.path.join(img_dir, img_name.split('_background')[0] + '.tif')
-
-                # Obter estatísticas usando a função stats_obj_img
-                results = stats_obj_img(fname_img_pol, fname_img, img_name, class_data)
-
-                # Escrever resultados em arquivo CSV
-                with open(csv_filename, mode='a', newline='') as csvfile:  # Modo 'a' para append
-                    csv_writer = csv.DictWriter(csvfile, fieldnames=results.keys())
-                    csv_writer.writerow(results)
-
-            except Exception as e:
-                print(f"Erro ao processar a imagem {img_name}: {e}")
-                continue
-
-    print(f"Resultados adicionados a {csv_filename}")
-
-if __name__ == "__main__":
-    main()
+#Stats_obj_img
+#_________________________________________________________________________________________
+# Rotina que recebe uma imagem de um objeto (mancha de óleo) e do fundo (mar) e realiza 
+# as estatísticas entre os dois para melhor análise se é ou não óleo no oceano
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2024-06-20
+#__________________________________________________________________________________________
+
+import os
+import csv
+import argparse
+from collections import deque
+from itertools import islice
+from functools import cached_property
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import geopandas as gpd
+import numpy as np
+import scipy.ndimage as ndi
+from skimage.filters import threshold_otsu
+from shape_features import shape_features
+from results_store import ResultsStore, chip_fingerprint
+from raster_access import open_raster
+
+def load_class_data(class_data_csv):
+    """
+    Carrega dados de classe de um arquivo CSV e retorna um dicionário com ID_POLY como chave.
+    """
+    class_data = {}
+    with open(class_data_csv, mode='r') as csvfile:
+        csv_reader = csv.DictReader(csvfile)
+        for row in csv_reader:
+            class_data[row['ID_POLY']] = {
+                'CLASSE': row['CLASSE'],
+                'SUBCLASSE': row['SUBCLASSE']
+            }
+    return class_data
+
+
+# Colunas do arquivo CSV de resultados
+FIELDNAMES = [
+    "img_name", "IMG_NUMBER", "ID_POLY", "CLASSE", "SUBCLASSE", "area",
+    "perim", "complexity_measure", "spreading", "shape_factor", "hu_moment",
+    "circularity", "FG_MEAN", "FG_STD", "FG_MIN", "FG_MAX", "FG_MEDIAN",
+    "FG_VAR_COEF", "FG_THRES", "BG_MEAN", "BG_STD", "BG_MIN", "BG_MAX",
+    "BG_MEDIAN", "BG_VAR_COEF", "BG_THRES", "FG_BG_MAX_CONTRAST",
+    "FG_BG_MEAN_CONTRAST_RATIO", "POWER_MEAN_RATIO", "BORDER_GRAD_MEAN",
+    "BORDER_GRAD_STD", "BORDER_GRAD_MAX",
+]
+
+# Versão do cálculo, parte da impressão digital dos chips: ao mudar, os resultados gravados por
+# execuções anteriores deixam de valer no modo incremental (2: objeto e fundo não mais trocados)
+STATS_VERSION = 2
+
+# Quantidade de pixels acumulada por vez no kernel de estatísticas (cabe na cache do processador)
+STATS_CHUNK_SIZE = 65536
+
+def _finite_chunks(values):
+    # Pixels finitos de cada bloco de STATS_CHUNK_SIZE pixels (cópias do tamanho de um bloco)
+    for start in range(0, values.size, STATS_CHUNK_SIZE):
+        chunk = values[start:start + STATS_CHUNK_SIZE]
+        finite = chunk[np.isfinite(chunk)]
+        if finite.size:
+            yield finite
+
+def band_statistics(band, mode='exact', nbins=256):
+    """
+    Calcula as estatísticas dos pixels finitos de uma banda, bloco a bloco, sem copiar a banda.
+    Na primeira passada, contagem, média, variância, mínimo e máximo são acumulados juntos; na
+    segunda, o histograma (que precisa da faixa mínimo-máximo da primeira), que dá o threshold
+    de Otsu. No modo 'histogram' a mediana é interpolada no histograma; no modo 'exact', uma
+    terceira passada separa apenas os pixels da classe do histograma que contém a mediana, que é
+    selecionada entre eles.
+
+    :param band: array da banda (NaN e infinitos são ignorados).
+    :param mode: 'exact' (mediana exata) ou 'histogram' (mediana aproximada pelo histograma).
+    :param nbins: número de classes do histograma (256, o mesmo de threshold_otsu).
+    :return: dicionário com count, mean, std, var, min, max, median, threshold_mean,
+             threshold_otsu e o histograma (hist, bin_edges), ou None se não houver pixels finitos.
+    """
+    if mode not in ('exact', 'histogram'):
+        raise ValueError(f"Modo de estatísticas inválido: {mode}")
+
+    values = band.reshape(-1)
+    # Soma e soma dos quadrados deslocadas pelo primeiro valor, para estabilidade numérica
+    count = 0
+    shift = band_min = band_max = None
+    total = total_sq = 0.0
+    for finite in _finite_chunks(values):
+        if shift is None:
+            shift = float(finite[0])
+            band_min = band_max = finite[0]
+        count += finite.size
+        band_min = min(band_min, finite.min())
+        band_max = max(band_max, finite.max())
+        centered = finite.astype(np.float64) - shift
+        total += centered.sum()
+        total_sq += np.dot(centered, centered)
+    if count == 0:
+        return None
+
+    mean = shift + total / count
+    var = max(total_sq / count - (total / count) ** 2, 0.0)
+
+    # O histograma de cada bloco usa as mesmas classes; a soma é o histograma da banda
+    hist = np.zeros(nbins, dtype=np.int64)
+    bin_edges = None
+    for finite in _finite_chunks(values):
+        chunk_hist, bin_edges = np.histogram(finite, bins=nbins, range=(band_min, band_max))
+        hist += chunk_hist
+
+    median = None
+    if mode == 'exact' and band_min != band_max:
+        median = _histogram_median(values, hist, bin_edges, count)
+
+    bin_centers = (bin_edges[:-1] + bin_edges[1:]) / 2
+    if band_min == band_max:
+        otsu = median = band_min
+    else:
+        otsu = threshold_otsu(hist=(hist, bin_centers))
+
+    if median is None:
+        # Interpolação linear dentro da classe do histograma que contém a mediana
+        cumulative = np.cumsum(hist)
+        half = count / 2
+        idx = int(np.searchsorted(cumulative, half))
+        below = cumulative[idx - 1] if idx > 0 else 0
+        fraction = (half - below) / hist[idx] if hist[idx] else 0.0
+        median = bin_edges[idx] + fraction * (bin_edges[idx + 1] - bin_edges[idx])
+
+    return {
+        "count": count,
+        "mean": mean,
+        "std": np.sqrt(var),
+        "var": var,
+        "min": band_min,
+        "max": band_max,
+        "median": median,
+        "threshold_mean": mean,  # threshold_mean é a média dos pixels
+        "threshold_otsu": otsu,
+        "hist": hist,
+        "bin_edges": bin_edges,
+    }
+
+def _histogram_median(values, hist, bin_edges, count):
+    # Mediana exata: as posições centrais (uma ou duas) caem em poucas classes do histograma;
+    # só os pixels dessas classes são separados e ordenados parcialmente
+    cumulative = np.cumsum(hist)
+    ranks = ((count - 1) // 2, count // 2)
+    first_bin, last_bin = (int(np.searchsorted(cumulative, rank, side='right')) for rank in ranks)
+    before = int(cumulative[first_bin - 1]) if first_bin > 0 else 0
+    low, high = bin_edges[first_bin], bin_edges[last_bin + 1]
+    # Mesmos limites das classes de np.histogram: [início, fim), com a última fechada
+    last_closed = last_bin == len(hist) - 1
+    selected = np.concatenate([finite[(finite >= low) & ((finite <= high) if last_closed else (finite < high))]
+                               for finite in _finite_chunks(values)])
+    positions = [rank - before for rank in ranks]
+    selected = np.partition(selected, positions)
+    return (float(selected[positions[0]]) + float(selected[positions[1]])) / 2
+
+def read_band(fname):
+    """
+    Lê a primeira banda de um raster em ponto flutuante, com NaN nos pixels nodata.
+
+    :return: a banda e a transformação do raster.
+    """
+    with open_raster(fname) as img:
+        band = img.read(1, masked=True)
+        transform = img.transform
+    data = band.data.astype(np.result_type(band.dtype, np.float32), copy=False)
+    if band.mask is not np.ma.nomask:
+        data[band.mask] = np.nan
+    return data, transform
+
+
+def chip_shape_features(shp_file, out_shape, transform):
+    """
+    Calcula as características de forma do polígono de um recorte, a partir do seu shapefile,
+    na grade de pixels do recorte.
+
+    :return: dicionário com as colunas de shape_features.SHAPE_COLUMNS.
+    """
+    polygon = gpd.read_file(shp_file)
+    return shape_features(polygon.iloc[[0]], out_shape, transform).iloc[0].to_dict()
+
+
+def sobel_gradient(band, finite=None):
+    """
+    Magnitude do gradiente de Sobel de uma banda, em float32. Os pixels não finitos (NaN) são
+    preenchidos com o valor do pixel válido mais próximo antes da convolução, para que não
+    contaminem os vizinhos: junto a eles o gradiente é o da própria região válida.
+
+    :param band: array da banda.
+    :param finite: máscara dos pixels finitos, se já calculada.
+    :return: magnitude do gradiente, com NaN nos pixels não finitos.
+    """
+    if finite is None:
+        finite = np.isfinite(band)
+    filled = band.astype(np.float32)
+    if not finite.all():
+        if not finite.any():
+            return np.full(band.shape, np.nan, dtype=np.float32)
+        nearest = ndi.distance_transform_edt(~finite, return_distances=False, return_indices=True)
+        filled = filled[tuple(nearest)]
+    gradient = ndi.sobel(filled, axis=1, output=np.float32)  # Gradiente ao longo do eixo X
+    np.hypot(gradient, ndi.sobel(filled, axis=0, output=np.float32), out=gradient)
+    gradient[~finite] = np.nan
+    return gradient
+
+
+class FeatureContext:
+    """
+    Intermediários de um par de bandas (objeto e fundo), calculados uma única vez, na primeira
+    vez em que alguma característica precisa deles, e compartilhados por todas as outras.
+    """
+
+    def __init__(self, band_object, band_background, mode='exact'):
+        self.band_object = band_object
+        self.band_background = band_background
+        self.mode = mode
+
+    @cached_property
+    def object_stats(self):
+        stats = band_statistics(self.band_object, self.mode)
+        if stats is None:
+            raise ValueError("Objeto de imagem vazio ou sem valores válidos")
+        return stats
+
+    @cached_property
+    def background_stats(self):
+        stats = band_statistics(self.band_background, self.mode)
+        if stats is None:
+            raise ValueError("Imagem de fundo vazia ou sem valores válidos")
+        return stats
+
+    @cached_property
+    def finite(self):
+        # Pixels válidos do fundo
+        return np.isfinite(self.band_background)
+
+    @cached_property
+    def gradient(self):
+        return sobel_gradient(self.band_background, self.finite)
+
+    @cached_property
+    def edges(self):
+        # Bordas: pixels válidos com gradiente positivo (derivadas do mesmo gradiente)
+        return self.finite & (self.gradient > 0)
+
+
+# Características registradas: nome -> (função, colunas). Cada função recebe o FeatureContext e
+# devolve um dicionário com as suas colunas.
+FEATURES = {}
+
+def register_feature(name, columns):
+    """
+    Registra uma função de característica com o nome e as colunas que ela preenche.
+    """
+    def decorator(func):
+        FEATURES[name] = (func, tuple(columns))
+        return func
+    return decorator
+
+@register_feature('object', ["FG_MEAN", "FG_STD", "FG_MIN", "FG_MAX", "FG_MEDIAN", "FG_VAR_COEF", "FG_THRES"])
+def object_features(ctx):
+    # Estatísticas do Objeto
+    stats = ctx.object_stats
+    return {
+        "FG_MEAN": stats['mean'],
+        "FG_STD": stats['std'],
+        "FG_MIN": stats['min'],
+        "FG_MAX": stats['max'],
+        "FG_MEDIAN": stats['median'],
+        "FG_VAR_COEF": stats['std'] / stats['mean'],  # Coeficiente de variação
+        "FG_THRES": stats['threshold_mean'],
+    }
+
+@register_feature('background', ["BG_MEAN", "BG_STD", "BG_MIN", "BG_MAX", "BG_MEDIAN", "BG_VAR_COEF", "BG_THRES"])
+def background_features(ctx):
+    # Estatísticas do Fundo
+    stats = ctx.background_stats
+    return {
+        "BG_MEAN": stats['mean'],
+        "BG_STD": stats['std'],
+        "BG_MIN": stats['min'],
+        "BG_MAX": stats['max'],
+        "BG_MEDIAN": stats['median'],
+        "BG_VAR_COEF": stats['std'] / stats['mean'],
+        "BG_THRES": stats['threshold_mean'],
+    }
+
+@register_feature('contrast', ["FG_BG_MAX_CONTRAST", "FG_BG_MEAN_CONTRAST_RATIO", "POWER_MEAN_RATIO"])
+def contrast_features(ctx):
+    # Contraste entre objeto e fundo
+    object_mean = ctx.object_stats['mean']
+    background_mean = ctx.background_stats['mean']
+    return {
+        "FG_BG_MAX_CONTRAST": abs(background_mean - ctx.object_stats['min']),
+        "FG_BG_MEAN_CONTRAST_RATIO": abs(background_mean - object_mean),
+        # Object Power to Mean Ratio
+        "POWER_MEAN_RATIO": object_mean / background_mean,
+    }
+
+@register_feature('border_gradient', ["BORDER_GRAD_MEAN", "BORDER_GRAD_STD", "BORDER_GRAD_MAX"])
+def border_gradient_features(ctx):
+    # Gradientes e Bordas
+    border_gradients = ctx.gradient[ctx.edges]
+    if border_gradients.size == 0:
+        return {"BORDER_GRAD_MEAN": np.nan, "BORDER_GRAD_STD": np.nan, "BORDER_GRAD_MAX": np.nan}
+    border_gradients = border_gradients.astype(np.float64)
+    return {
+        "BORDER_GRAD_MEAN": border_gradients.mean(),
+        "BORDER_GRAD_STD": border_gradients.std(),
+        "BORDER_GRAD_MAX": border_gradients.max(),
+    }
+
+def compute_features(ctx, features=None):
+    """
+    Calcula as características registradas sobre um FeatureContext.
+
+    :param features: nomes das características ativas (padrão: todas as registradas). As colunas
+                     das características desligadas ficam vazias ('').
+    :return: dicionário coluna -> valor.
+    """
+    if features is None:
+        features = list(FEATURES)
+    unknown = set(features) - set(FEATURES)
+    if unknown:
+        raise ValueError(f"Características desconhecidas: {', '.join(sorted(unknown))}")
+
+    values = {}
+    for name, (func, columns) in FEATURES.items():
+        if name in features:
+            values.update(func(ctx))
+        else:
+            values.update(dict.fromkeys(columns, ''))
+    return values
+
+def stats_from_bands(band_object, band_background, img_name, class_data, mode='exact', shape=None,
+                     features=None):
+    """
+    Calcula estatísticas das bandas de objeto e de fundo, bem como métricas relacionadas ao gradiente.
+    Cada banda passa uma única vez por band_statistics, e o gradiente é calculado
+    uma única vez e compartilhado pelas características que dependem dele.
+
+    :param band_object: array da banda do objeto (polígono), com NaN fora dele.
+    :param band_background: array da banda de fundo, com NaN dentro do polígono.
+    :param img_name: nome da imagem.
+    :param class_data: dicionário com dados de classe.
+    :param mode: 'exact' ou 'histogram' (ver band_statistics).
+    :param shape: características de forma do polígono (ver shape_features), se disponíveis.
+    :param features: nomes das características calculadas (ver FEATURES; padrão: todas).
+    :return: Um dicionário contendo estatísticas e métricas calculadas.
+    """
+    shape = shape or {}
+
+    # Extrair ID_POLY removendo tudo após o primeiro "_"
+    id_poly = img_name.split('_background')[0]
+    id_poly_base = id_poly.split('_')[0]
+
+    # Adicionar informações de classe
+    classe_info = class_data.get(id_poly_base, {'CLASSE': 'Desconhecido', 'SUBCLASSE': 'Desconhecido'})
+
+    # Resultados como um dicionário
+    results = {
+        "img_name": '21 S1B_IW_GRDH_1SDV_20200802T001516_NR_Orb_Cal_TC',
+        "IMG_NUMBER": '21',
+        "ID_POLY": id_poly,
+        "CLASSE": classe_info['CLASSE'],
+        "SUBCLASSE": classe_info['SUBCLASSE'],
+        "area": shape.get("area", ''),
+        "perim": shape.get("perim", ''),
+        "complexity_measure": shape.get("complexity_measure", ''),
+        "spreading": shape.get("spreading", ''),
+        "shape_factor": shape.get("shape_factor", ''),
+        "hu_moment": shape.get("hu_moment", ''),
+        "circularity": shape.get("circularity", ''),
+    }
+    results.update(compute_features(FeatureContext(band_object, band_background, mode), features))
+
+    return results
+
+
+def stats_obj_img(fname_img_pol, fname_img, img_name, class_data, mode='exact', features=None):
+    """
+    Calcula estatísticas de uma imagem de objeto e de fundo, bem como métricas relacionadas ao gradiente.
+    Cada arquivo é lido uma única vez.
+
+    Convenção (a mesma de pipeline.process_scene e zonal_stats.zonal_features): FG_* vêm dos
+    pixels do polígono (<ID_POLY>.tif), BG_* dos pixels do retângulo expandido fora do polígono
+    (<ID_POLY>_background.tif) e BORDER_GRAD_* do gradiente do recorte de fundo.
+
+    :param fname_img_pol: caminho para o arquivo raster do objeto (polígono, <ID_POLY>.tif).
+    :param fname_img: caminho para o arquivo raster da imagem de fundo (<ID_POLY>_background.tif).
+    :param img_name: nome da imagem.
+    :param class_data: dicionário com dados de classe.
+    :param mode: 'exact' ou 'histogram' (ver band_statistics).
+    :param features: nomes das características calculadas (ver FEATURES; padrão: todas).
+    :return: Um dicionário contendo estatísticas e métricas calculadas. As características de forma
+             são preenchidas quando o shapefile do polígono (<ID_POLY>.shp) está na mesma pasta.
+    """
+    band_object, transform = read_band(fname_img_pol)
+    band_background, _ = read_band(fname_img)
+
+    shape = None
+    shp_file = os.path.join(os.path.dirname(fname_img_pol), img_name.split('_background')[0] + '.shp')
+    if os.path.isfile(shp_file):
+        shape = chip_shape_features(shp_file, band_object.shape, transform)
+
+    return stats_from_bands(band_object, band_background, img_name, class_data, mode, shape, features)
+
+
+# Dados de classe e características ativas de cada processo do pool (enviados uma vez, pelo initializer)
+_worker_class_data = {}
+_worker_features = None
+
+def _init_stats_worker(class_data, features=None):
+    global _worker_class_data, _worker_features
+    _worker_class_data = class_data
+    _worker_features = features
+
+def _stats_chunk(tasks):
+    """
+    Processa um lote de chips em um processo do pool. Cada tarefa é
+    (img_name, fname_img_pol, fname_img, fname_shp, impressão digital conhecida, use_hash) e
+    devolve (chip, impressão digital, resultados, erro), com o chip identificado pelo recorte
+    de fundo (fname_img); resultados é None se o chip não mudou desde a última execução ou se
+    falhou (erro com a mensagem).
+    """
+    outputs = []
+    for img_name, fname_img_pol, fname_img, fname_shp, known, use_hash in tasks:
+        fingerprint = None
+        try:
+            fingerprint = f"v{STATS_VERSION}|" + chip_fingerprint([fname_img_pol, fname_img, fname_shp], use_hash)
+            if fingerprint == known:
+                outputs.append((fname_img, fingerprint, None, None))
+                continue
+            results = stats_obj_img(fname_img_pol, fname_img, img_name, _worker_class_data,
+                                    features=_worker_features)
+            outputs.append((fname_img, fingerprint, results, None))
+        except Exception as e:
+            outputs.append((fname_img, fingerprint, None, f"{type(e).__name__}: {e}"))
+    return outputs
+
+def list_chip_tasks(img_dir, known=None, use_hash=False):
+    """
+    Lista as tarefas de estatística dos chips de um diretório (um por *_background.tif).
+
+    :param known: dicionário {chip: impressão digital} da execução anterior (modo incremental).
+    """
+    known = known or {}
+    names = sorted(entry.name for entry in os.scandir(img_dir)
+                   if entry.name.endswith('_background.tif'))
+    tasks = []
+    for img_name in names:
+        id_poly = img_name.split('_background')[0]
+        fname_img = os.path.join(img_dir, img_name)
+        tasks.append((img_name, os.path.join(img_dir, id_poly + '.tif'), fname_img,
+                      os.path.join(img_dir, id_poly + '.shp'), known.get(fname_img), use_hash))
+    return tasks
+
+def stats_batch(tasks, class_data, max_workers=None, chunksize=64, ordered=False, max_in_flight=None,
+                features=None):
+    """
+    Calcula as estatísticas de muitos chips em um pool de processos, submetendo as tarefas em
+    lotes de chunksize e mantendo no máximo max_in_flight lotes em andamento (padrão: o dobro
+    de processos), para que a memória não cresça com o tamanho do diretório.
+
+    :param tasks: tarefas de list_chip_tasks.
+    :param max_workers: número de processos (None = todos os núcleos, 1 = no próprio processo).
+    :param ordered: se True, os resultados saem na ordem das tarefas; senão, à medida que
+                    os lotes terminam.
+    :param features: nomes das características calculadas (ver FEATURES; padrão: todas).
+    :return: gerador de (chip, impressão digital, resultados, erro), um por tarefa.
+    """
+    chunks = (tasks[i:i + chunksize] for i in range(0, len(tasks), chunksize))
+
+    if max_workers == 1:
+        _init_stats_worker(class_data, features)
+        for chunk in chunks:
+            yield from _stats_chunk(chunk)
+        return
+
+    max_workers = max_workers or os.cpu_count()
+    max_in_flight = max_in_flight or 2 * max_workers
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_stats_worker,
+                             initargs=(class_data, features)) as executor:
+        in_flight = deque(executor.submit(_stats_chunk, chunk)
+                          for chunk in islice(chunks, max_in_flight))
+        while in_flight:
+            if ordered:
+                done = [in_flight.popleft()]
+            else:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_flight.remove(future)
+            for future in done:
+                for chunk in islice(chunks, 1):
+                    in_flight.append(executor.submit(_stats_chunk, chunk))
+                yield from future.result()
+
+def main():
+    parser = argparse.ArgumentParser(description="Estatísticas objeto/fundo dos recortes de manchas")
+    # Diretório contendo as imagens
+    parser.add_argument('--img-dir', default='caminho para o arquivo')
+    parser.add_argument('--class-data', default='caminho para o arquivo.csv')
+    # Nome do arquivo CSV para salvar resultados
+    parser.add_argument('--csv', default="caminho para o arquivo.csv")
+    # Banco de resultados (padrão: o nome do CSV com extensão .sqlite)
+    parser.add_argument('--db', default=None)
+    parser.add_argument('--incremental', action='store_true',
+                        help="processa apenas os chips novos ou alterados desde a última execução")
+    parser.add_argument('--overwrite-csv', action='store_true',
+                        help="no modo incremental, sobrescreve um --csv que não foi gerado pelo banco")
+    parser.add_argument('--hash', action='store_true',
+                        help="inclui o SHA-256 dos arquivos na impressão digital dos chips")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="número de processos (padrão: todos os núcleos)")
+    parser.add_argument('--chunksize', type=int, default=64, help="chips por tarefa do pool")
+    parser.add_argument('--features', default=None,
+                        help=f"características calculadas, separadas por vírgula "
+                             f"(padrão: todas; disponíveis: {', '.join(FEATURES)})")
+    args = parser.parse_args()
+    features = args.features.split(',') if args.features else None
+
+    db_file = args.db or os.path.splitext(args.csv)[0] + '.sqlite'
+
+    # Carregar dados de classe
+    class_data = load_class_data(args.class_data)
+
+    processed = skipped = failed = 0
+    with ResultsStore(db_file, FIELDNAMES) as store:
+        # Sem --incremental todos os chips são refeitos e o CSV pode ser regravado; com ele, as linhas
+        # de um CSV anterior ao banco seriam perdidas (ver ResultsStore.export_csv)
+        overwrite_csv = args.overwrite_csv or not args.incremental
+        if not overwrite_csv and not store.owns_csv(args.csv):
+            parser.error(f"{args.csv} já existe e não foi gerado por {db_file}: rode sem --incremental "
+                         f"uma vez, use outro --csv ou --overwrite-csv")
+        # Os erros listados ao final são só os desta execução
+        store.clear_errors()
+        known = store.fingerprints() if args.incremental else {}
+        tasks = list_chip_tasks(args.img_dir, known, args.hash)
+
+        # Processa os chips da pasta no pool, gravando os resultados à medida que chegam
+        for chip, fingerprint, results, error in stats_batch(tasks, class_data, args.workers,
+                                                             args.chunksize, features=features):
+            if error is not None:
+                store.put_error(chip, fingerprint, error)
+                failed += 1
+            elif results is None:
+                skipped += 1
+            else:
+                store.put(chip, fingerprint, results)
+                processed += 1
+
+        # Chips apagados da pasta saem do banco e do CSV
+        store.export_csv(args.csv, overwrite=overwrite_csv, chips=[task[2] for task in tasks])
+
+        if failed:
+            print(f"Erro ao processar {failed} imagens:")
+            for chip, error in store.errors()[:20]:
+                print(f"  {os.path.basename(chip)}: {error}")
+
+    print(f"{processed} imagens processadas, {skipped} sem alteração, {failed} com erro. "
+          f"Resultados em {args.csv}")
+
+if __name__ == "__main__":
+    main()
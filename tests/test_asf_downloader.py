@@ -0,0 +1,187 @@
+#test_asf_downloader
+#_________________________________________________________________________________________
+# Testa a retomada (Range/206), a resposta 416, o servidor que ignora o Range (200) e a
+# verificação de tamanho e MD5 de asf_downloader.download_file, e os downloads simultâneos de
+# asf_downloader.download_granules, contra um servidor HTTP local
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import re
+import sys
+import asyncio
+import hashlib
+import threading
+import http.server
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asf_downloader import download_file, download_granules, DownloadError
+
+DATA = os.urandom(3 * 1024 * 1024 + 123)
+MD5 = hashlib.md5(DATA).hexdigest()
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    # Comportamento configurado pelo teste em self.server: cut (respostas a interromper no meio),
+    # ignore_range (responde 200 com o arquivo inteiro) e requests (Range de cada pedido); active
+    # e peak contam os pedidos em andamento e o máximo simultâneo
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.active += 1
+            self.server.peak = max(self.server.peak, self.server.active)
+        try:
+            self._send()
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def _send(self):
+        header = self.headers.get('Range')
+        self.server.requests.append(header)
+        start = int(re.match(r'bytes=(\d+)-', header).group(1)) if header else 0
+        if self.server.ignore_range:
+            start = 0
+        if start >= len(DATA):
+            self.send_response(416)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = DATA[start:]
+        self.send_response(206 if start else 200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.server.cut > 0:
+            # Queda de conexão no meio da resposta
+            self.server.cut -= 1
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    httpd.cut = 0
+    httpd.ignore_range = False
+    httpd.requests = []
+    httpd.active = httpd.peak = 0
+    httpd.lock = threading.Lock()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def url_of(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/granule.zip"
+
+def test_resumes_after_dropped_connection(server, tmp_path):
+    server.cut = 1
+    path = str(tmp_path / 'granule.zip')
+    with requests.Session() as session:
+        status = download_file(session, url_of(server), path, len(DATA), MD5, retries=3, backoff=0)
+
+    assert status == 'downloaded'
+    assert open(path, 'rb').read() == DATA
+    assert not os.path.exists(path + '.part')
+    # O segundo pedido continua de onde o primeiro parou
+    assert server.requests[0] is None
+    offset = int(re.match(r'bytes=(\d+)-', server.requests[1]).group(1))
+    assert 0 < offset < len(DATA)
+
+def test_complete_partial_gets_416(server, tmp_path):
+    path = str(tmp_path / 'granule.zip')
+    with open(path + '.part', 'wb') as f:
+        f.write(DATA)
+    with requests.Session() as session:
+        # Sem o tamanho esperado, só o servidor sabe que o parcial já está completo
+        status = download_file(session, url_of(server), path, None, MD5, retries=1)
+
+    assert status == 'downloaded'
+    assert server.requests == [f'bytes={len(DATA)}-']
+    assert open(path, 'rb').read() == DATA
+
+def test_server_ignoring_range_restarts(server, tmp_path):
+    server.ignore_range = True
+    path = str(tmp_path / 'granule.zip')
+    with open(path + '.part', 'wb') as f:
+        f.write(b'x' * 1000)
+    with requests.Session() as session:
+        status = download_file(session, url_of(server), path, len(DATA), MD5, retries=1)
+
+    assert status == 'downloaded'
+    assert open(path, 'rb').read() == DATA
+
+def test_md5_mismatch_fails_and_discards_partial(server, tmp_path):
+    path = str(tmp_path / 'granule.zip')
+    with requests.Session() as session:
+        with pytest.raises(DownloadError, match='MD5'):
+            download_file(session, url_of(server), path, len(DATA), '0' * 32, retries=2, backoff=0)
+
+    assert not os.path.exists(path)
+    assert not os.path.exists(path + '.part')
+    assert len(server.requests) == 2
+
+def test_existing_file_is_skipped(server, tmp_path):
+    path = str(tmp_path / 'granule.zip')
+    with open(path, 'wb') as f:
+        f.write(DATA)
+    with requests.Session() as session:
+        status = download_file(session, url_of(server), path, len(DATA), MD5, check_md5_existing=True)
+
+    assert status == 'skipped'
+    assert server.requests == []
+
+def test_download_granules_concurrent(server, tmp_path):
+    server.cut = 1
+    targets = [{'url': url_of(server), 'fileName': f'granule_{idx}.zip', 'bytes': len(DATA), 'md5sum': MD5}
+               for idx in range(5)]
+    targets[3]['md5sum'] = '0' * 32
+    with open(tmp_path / 'granule_1.zip', 'wb') as f:
+        f.write(DATA)
+    with requests.Session() as session:
+        statuses = asyncio.run(download_granules(targets, str(tmp_path), session, max_concurrent=2,
+                                                 retries=2, backoff=0))
+
+    # Resultados na ordem dos alvos; um erro não interrompe os demais downloads
+    assert [name for name, _ in statuses] == [target['fileName'] for target in targets]
+    assert [status for _, status in statuses] == ['downloaded', 'skipped', 'downloaded', statuses[3][1],
+                                                  'downloaded']
+    assert 'MD5' in statuses[3][1]
+    for name in ('granule_0.zip', 'granule_2.zip', 'granule_4.zip'):
+        assert open(tmp_path / name, 'rb').read() == DATA
+    assert not os.path.exists(tmp_path / 'granule_3.zip')
+    assert 1 <= server.peak <= 2
@@ -0,0 +1,110 @@
+#test_engines
+#_________________________________________________________________________________________
+# Compara as estatísticas de objeto (FG), fundo (BG) e gradiente de borda dos três
+# caminhos de cálculo (cadeia de recortes com stats_obj_img, pipeline e zonal_stats) sobre
+# uma mesma cena sintética, para que a convenção objeto/fundo não volte a divergir
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import rasterio
+from rasterio.transform import from_origin
+from shapely.geometry import Point
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats_obj_img import list_chip_tasks, stats_batch
+from pipeline import run_pipeline
+from zonal_stats import zonal_features
+
+FG_BG_COLUMNS = ["FG_MEAN", "FG_STD", "FG_MIN", "FG_MAX", "FG_MEDIAN",
+                 "BG_MEAN", "BG_STD", "BG_MIN", "BG_MAX", "BG_MEDIAN", "POWER_MEAN_RATIO"]
+GRADIENT_COLUMNS = ["BORDER_GRAD_MEAN", "BORDER_GRAD_MAX"]
+
+def make_scene(directory):
+    # Mar com speckle (gamma) e manchas escuras bem separadas, sem sobreposição dos retângulos de fundo
+    rng = np.random.default_rng(0)
+    transform = from_origin(500000, 7400000, 10, 10)
+    centers = [(60, 60), (60, 180), (180, 60), (180, 180)]
+    polygons = [Point(500000 + 10 * col, 7400000 - 10 * row).buffer(radius)
+                for (row, col), radius in zip(centers, [150, 200, 120, 180])]
+    data = rng.gamma(4.0, 0.05, size=(240, 240)).astype('float32')
+    rows, cols = np.mgrid[:240, :240]
+    for (row, col), radius in zip(centers, [15, 20, 12, 18]):
+        data[(rows - row) ** 2 + (cols - col) ** 2 <= radius ** 2] *= 0.3
+
+    scene = os.path.join(directory, '21 scene.tif')
+    with rasterio.open(scene, 'w', driver='GTiff', height=240, width=240, count=1, dtype='float32',
+                       crs='EPSG:32723', transform=transform) as dst:
+        dst.write(data, 1)
+
+    ids = np.arange(1, len(polygons) + 1)
+    shp_file = os.path.join(directory, 'slicks.shp')
+    gpd.GeoDataFrame({'ID_POLY': ids, 'IMG_NUMBER': 21}, geometry=polygons, crs='EPSG:32723').to_file(shp_file)
+    data_base = os.path.join(directory, 'slicks.csv')
+    pd.DataFrame({'IMG_NUMBER': 21, 'ID_POLY': ids}).to_csv(data_base, index=False)
+    return scene, shp_file, data_base
+
+def by_id(results):
+    return {str(result['ID_POLY']): result for result in results}
+
+def test_engines_agree(tmp_path):
+    scene, shp_file, data_base = make_scene(str(tmp_path))
+    chips_dir = str(tmp_path / 'chips')
+
+    # Pipeline em memória, gravando os recortes da cadeia de scripts para a comparação
+    pipeline_results, messages = run_pipeline(chips_dir, data_base, shp_file, [scene], max_workers=1,
+                                              audit=True)
+    assert not messages
+
+    tasks = []
+    for root, _, files in os.walk(chips_dir):
+        if any(name.endswith('_background.tif') for name in files):
+            tasks.extend(list_chip_tasks(root))
+    chip_results = [results for _, _, results, error in stats_batch(tasks, {}, max_workers=1)
+                    if error is None]
+
+    zonal_results = zonal_features(scene, gpd.read_file(shp_file))
+
+    pipeline_results, chip_results, zonal_results = map(by_id, (pipeline_results, chip_results, zonal_results))
+    assert set(pipeline_results) == set(chip_results) == set(zonal_results) == {'1', '2', '3', '4'}
+
+    for id_poly, zonal in zonal_results.items():
+        for other in (pipeline_results[id_poly], chip_results[id_poly]):
+            for column in FG_BG_COLUMNS:
+                assert np.isclose(other[column], zonal[column], rtol=1e-6), (id_poly, column)
+            # As manchas são mais escuras que o mar
+            assert other["FG_MEAN"] < other["BG_MEAN"]
+            # Nas bordas do retângulo, os recortes refletem a borda e zonal_stats usa os vizinhos
+            # reais da imagem: o gradiente de borda concorda apenas aproximadamente
+            for column in GRADIENT_COLUMNS:
+                assert np.isclose(other[column], zonal[column], rtol=0.15), (id_poly, column)
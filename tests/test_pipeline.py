@@ -0,0 +1,69 @@
+#test_pipeline
+#_________________________________________________________________________________________
+# Testa que um polígono fora da imagem vira mensagem do pipeline, sem interromper a imagem
+# nem as demais imagens do pool de processos
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import rasterio
+from rasterio.transform import from_origin
+from shapely.geometry import Point
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import run_pipeline
+
+def write_scene(path, seed):
+    rng = np.random.default_rng(seed)
+    with rasterio.open(path, 'w', driver='GTiff', height=200, width=200, count=1, dtype='float32',
+                       crs='EPSG:32723', transform=from_origin(500000, 7400000, 10, 10)) as dst:
+        dst.write(rng.gamma(4.0, 0.05, size=(200, 200)).astype('float32'), 1)
+    return path
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_polygon_outside_scene_is_reported(tmp_path, max_workers):
+    scenes = [write_scene(str(tmp_path / '21 scene.tif'), 0), write_scene(str(tmp_path / '22 scene.tif'), 1)]
+    # O polígono 2 da imagem 21 fica a 10 km da cena
+    polygons = [Point(500500, 7399500).buffer(150), Point(510000, 7380000).buffer(150),
+                Point(501200, 7398800).buffer(200), Point(500700, 7399300).buffer(120)]
+    shp_file = str(tmp_path / 'slicks.shp')
+    gpd.GeoDataFrame({'ID_POLY': [1, 2, 3, 4], 'IMG_NUMBER': [21, 21, 21, 22]}, geometry=polygons,
+                     crs='EPSG:32723').to_file(shp_file)
+    data_base = str(tmp_path / 'slicks.csv')
+    pd.DataFrame({'IMG_NUMBER': [21, 21, 21, 22], 'ID_POLY': [1, 2, 3, 4]}).to_csv(data_base, index=False)
+
+    results, messages = run_pipeline(str(tmp_path / 'chips'), data_base, shp_file, scenes, max_workers=max_workers)
+
+    assert [result['ID_POLY'] for result in results] == ['1', '3', '4']
+    assert len(messages) == 1 and 'polígono 2 ' in messages[0] and 'do not overlap' in messages[0]
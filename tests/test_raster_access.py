@@ -0,0 +1,101 @@
+#test_raster_access
+#_________________________________________________________________________________________
+# Testa o pool de imagens abertas: reaproveitamento entre aberturas seguidas, limite das
+# imagens sem uso e os parâmetros pedidos para uma imagem já aberta
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import sys
+import threading
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from raster_access import RasterPool, open_raster
+import raster_access
+
+@pytest.fixture
+def pool(monkeypatch):
+    # Pool próprio do teste, com no máximo duas imagens sem uso por thread
+    pool = RasterPool(max_idle=2)
+    monkeypatch.setattr(raster_access, 'RASTER_POOL', pool)
+    yield pool
+    pool.close()
+
+@pytest.fixture
+def scenes(tmp_path):
+    paths = []
+    for idx in range(3):
+        path = str(tmp_path / f'{idx} scene.tif')
+        with rasterio.open(path, 'w', driver='GTiff', height=32, width=32, count=1, dtype='float32',
+                           crs='EPSG:32723', transform=from_origin(500000, 7400000, 10, 10)) as dst:
+            dst.write(np.full((32, 32), idx, dtype='float32'), 1)
+        paths.append(path)
+    return paths
+
+def test_reopen_reuses_idle_handle(pool, scenes):
+    with open_raster(scenes[0]) as first:
+        pass
+    assert not first.dataset.closed
+    with open_raster(scenes[0]) as second:
+        assert second is first
+        assert second.read(1)[0, 0] == 0
+
+def test_idle_handles_are_bounded(pool, scenes):
+    rasters = []
+    for path in scenes:
+        with open_raster(path) as raster:
+            rasters.append(raster)
+    # A mais antiga sai do LRU e é fechada; as duas mais recentes continuam abertas
+    assert [raster.dataset.closed for raster in rasters] == [True, False, False]
+    with open_raster(scenes[0]) as raster:
+        assert raster is not rasters[0] and raster.read(1)[0, 0] == 0
+
+def test_other_threads_get_their_own_handle(pool, scenes):
+    with open_raster(scenes[0]) as raster:
+        result = []
+        thread = threading.Thread(target=lambda: result.append(open_raster(scenes[0]).__enter__()))
+        thread.start()
+        thread.join()
+        assert result[0] is not raster
+
+def test_requested_options(pool, scenes):
+    with open_raster(scenes[0], chunk_bytes=1024) as raster:
+        assert raster.chunk_bytes == 1024
+        # Em uso com outros valores: erro, em vez de ignorar o pedido
+        with pytest.raises(ValueError):
+            open_raster(scenes[0], chunk_bytes=2048)
+        with open_raster(scenes[0]) as same:
+            assert same is raster and same.chunk_bytes == 1024
+    # Sem uso, os novos valores são aplicados
+    with open_raster(scenes[0], chunk_bytes=2048, max_workers=2) as raster:
+        assert raster.chunk_bytes == 2048 and raster.max_workers == 2
@@ -0,0 +1,145 @@
+#test_results_store
+#_________________________________________________________________________________________
+# Testa o banco de resultados das estatísticas: retomada incremental (só os chips novos ou
+# alterados são refeitos), gravação em lotes, a proteção de um CSV que não foi gerado pelo banco
+# e a remoção dos chips apagados na exportação
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import sys
+import glob
+import shutil
+import sqlite3
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import Point
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from results_store import ResultsStore
+from stats_obj_img import FIELDNAMES, list_chip_tasks, stats_batch
+from pipeline import run_pipeline
+from test_pipeline import write_scene
+
+FIELDS = ['ID_POLY', 'value']
+
+def stored_rows(db_file):
+    # Linhas já confirmadas, vistas por outra conexão
+    with sqlite3.connect(db_file) as conn:
+        return conn.execute("SELECT chip, value FROM results ORDER BY chip").fetchall()
+
+def test_rows_are_written_in_batches(tmp_path):
+    db_file = str(tmp_path / 'results.sqlite')
+    store = ResultsStore(db_file, FIELDS, batch_size=3)
+    store.put('a', 'f1', {'ID_POLY': '1', 'value': 1.5})
+    store.put('b', 'f1', {'ID_POLY': '2', 'value': 2.5})
+    assert stored_rows(db_file) == []
+    store.put('c', 'f1', {'ID_POLY': '3', 'value': 3.5})
+    assert stored_rows(db_file) == [('a', 1.5), ('b', 2.5), ('c', 3.5)]
+
+    # Uma falha sai da tabela de erros quando o chip é gravado com sucesso
+    store.put_error('d', 'f1', 'ValueError: vazio')
+    assert store.errors() == [('d', 'ValueError: vazio')]
+    store.put('d', 'f2', {'ID_POLY': '4', 'value': 4.5})
+    store.close()
+    assert stored_rows(db_file)[-1] == ('d', 4.5)
+    with ResultsStore(db_file, FIELDS) as store:
+        assert store.errors() == []
+        assert store.fingerprints() == {'a': 'f1', 'b': 'f1', 'c': 'f1', 'd': 'f2'}
+
+def test_foreign_csv_is_not_overwritten(tmp_path):
+    csv_file = str(tmp_path / 'results.csv')
+    with open(csv_file, 'w') as f:
+        f.write('ID_POLY,value\n99,0.1\n')
+
+    with ResultsStore(str(tmp_path / 'results.sqlite'), FIELDS) as store:
+        store.put('a', 'f1', {'ID_POLY': '1', 'value': 1.5})
+        assert not store.owns_csv(csv_file)
+        with pytest.raises(FileExistsError):
+            store.export_csv(csv_file)
+        assert open(csv_file).read() == 'ID_POLY,value\n99,0.1\n'
+
+        store.export_csv(csv_file, overwrite=True)
+        # Depois de exportado pelo banco, o CSV pode ser regravado sem overwrite
+        assert store.owns_csv(csv_file)
+        store.export_csv(csv_file)
+    assert pd.read_csv(csv_file)['ID_POLY'].tolist() == [1]
+
+def run_stats(img_dir, db_file, csv_file):
+    # Como stats_obj_img.main no modo incremental
+    counts = {'processed': 0, 'skipped': 0, 'failed': 0}
+    with ResultsStore(db_file, FIELDNAMES) as store:
+        store.clear_errors()
+        tasks = list_chip_tasks(img_dir, store.fingerprints())
+        for chip, fingerprint, results, error in stats_batch(tasks, {}, max_workers=1):
+            if error is not None:
+                store.put_error(chip, fingerprint, error)
+                counts['failed'] += 1
+            elif results is None:
+                counts['skipped'] += 1
+            else:
+                store.put(chip, fingerprint, results)
+                counts['processed'] += 1
+        store.export_csv(csv_file, chips=[task[2] for task in tasks])
+    return counts
+
+def test_incremental_resume_and_deleted_chips(tmp_path):
+    scene = write_scene(str(tmp_path / '21 scene.tif'), 0)
+    polygons = [Point(500400 + 300 * idx, 7399400 - 250 * idx).buffer(120) for idx in range(4)]
+    shp_file = str(tmp_path / 'slicks.shp')
+    gpd.GeoDataFrame({'ID_POLY': [1, 2, 3, 4], 'IMG_NUMBER': 21}, geometry=polygons,
+                     crs='EPSG:32723').to_file(shp_file)
+    data_base = str(tmp_path / 'slicks.csv')
+    pd.DataFrame({'IMG_NUMBER': [21] * 4, 'ID_POLY': [1, 2, 3, 4]}).to_csv(data_base, index=False)
+    # Recortes de objeto e fundo gravados como pela cadeia de scripts (uma pasta por polígono),
+    # reunidos em uma só pasta, como a lida por stats_obj_img
+    run_pipeline(str(tmp_path / 'chips'), data_base, shp_file, [scene], max_workers=1, audit=True)
+    img_dir = str(tmp_path / 'stats')
+    os.makedirs(img_dir)
+    for path in glob.glob(str(tmp_path / 'chips' / '*' / '*' / '*')):
+        shutil.move(path, img_dir)
+    backgrounds = sorted(glob.glob(os.path.join(img_dir, '*_background.tif')))
+    assert len(backgrounds) == 4
+
+    db_file = str(tmp_path / 'results.sqlite')
+    csv_file = str(tmp_path / 'results.csv')
+    assert run_stats(img_dir, db_file, csv_file) == {'processed': 4, 'skipped': 0, 'failed': 0}
+    first = pd.read_csv(csv_file)
+    assert run_stats(img_dir, db_file, csv_file) == {'processed': 0, 'skipped': 4, 'failed': 0}
+    pd.testing.assert_frame_equal(pd.read_csv(csv_file), first)
+
+    # Um chip alterado é refeito; um chip apagado sai do banco e do CSV
+    stat = os.stat(backgrounds[1])
+    os.utime(backgrounds[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    os.remove(backgrounds[3])
+    assert run_stats(img_dir, db_file, csv_file) == {'processed': 1, 'skipped': 2, 'failed': 0}
+    assert pd.read_csv(csv_file)['ID_POLY'].tolist() == first['ID_POLY'].tolist()[:3]
+    with ResultsStore(db_file, FIELDNAMES) as store:
+        assert sorted(store.fingerprints()) == backgrounds[:3]
@@ -0,0 +1,135 @@
+#test_safe_zip
+#_________________________________________________________________________________________
+# Testa a leitura dos produtos .zip sem descompactar: o índice dos membros em <zip>.index.json,
+# as posições de /vsisubfile/ dos membros gravados sem compressão e o /vsizip/ dos comprimidos,
+# comparando os pixels com os da imagem extraída
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import sys
+import json
+import zipfile
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from safe_zip import (zip_member_index, index_file, member_vsi_path, measurement_members,
+                      resolve_raster_source, open_scene, close_scene, product_start_time)
+
+PRODUCT = 'S1A_IW_GRDH_1SDV_20240101T083015_20240101T083040_051000_062A00_ABCD'
+MEMBERS = {pol: f'{PRODUCT}.SAFE/measurement/s1a-iw-grd-{pol}-20240101t083015-20240101t083040-001.tiff'
+           for pol in ('vh', 'vv')}
+
+@pytest.fixture
+def measurements(tmp_path):
+    # Uma imagem por polarização, tiled e sem compressão, como as de medição dos produtos GRD
+    images = {}
+    for seed, pol in enumerate(MEMBERS):
+        path = str(tmp_path / f'{pol}.tiff')
+        data = np.random.default_rng(seed).integers(1, 1000, size=(1, 300, 200)).astype('uint16')
+        with rasterio.open(path, 'w', driver='GTiff', height=300, width=200, count=1, dtype='uint16',
+                           crs='EPSG:32723', transform=from_origin(500000, 7400000, 10, 10),
+                           tiled=True, blockxsize=64, blockysize=64) as dst:
+            dst.write(data)
+        images[pol] = path
+    return images
+
+def make_product(directory, measurements, compression):
+    zip_path = os.path.join(directory, f'{PRODUCT}.zip')
+    with zipfile.ZipFile(zip_path, 'w', compression=compression) as archive:
+        archive.writestr(f'{PRODUCT}.SAFE/manifest.safe', '<xfdu/>')
+        for pol, member in MEMBERS.items():
+            archive.write(measurements[pol], member)
+    return zip_path
+
+@pytest.mark.parametrize('compression, prefix', [(zipfile.ZIP_STORED, '/vsisubfile/'),
+                                                 (zipfile.ZIP_DEFLATED, '/vsizip/')])
+def test_members_read_like_extracted_image(tmp_path, measurements, compression, prefix):
+    zip_path = make_product(str(tmp_path), measurements, compression)
+
+    # Polarização preferida primeiro, e a imagem de medição é a aberta pelo caminho do zip
+    assert measurement_members(zip_path) == [MEMBERS['vv'], MEMBERS['vh']]
+    assert resolve_raster_source(zip_path) == member_vsi_path(zip_path, MEMBERS['vv'])
+    assert resolve_raster_source(zip_path, 'vh') == member_vsi_path(zip_path, MEMBERS['vh'])
+    assert product_start_time(zip_path) == '20240101T083015'
+
+    for pol, member in MEMBERS.items():
+        assert member_vsi_path(zip_path, member).startswith(prefix)
+        with rasterio.open(measurements[pol]) as extracted:
+            expected = extracted.read()
+            expected_window = extracted.read(window=Window(37, 101, 90, 70))
+        # Também pelo caminho explícito produto.zip/membro
+        scene = open_scene(f'{zip_path}/{member}')
+        try:
+            assert scene.crs == 'EPSG:32723'
+            np.testing.assert_array_equal(scene.read(), expected)
+            np.testing.assert_array_equal(scene.read(window=Window(37, 101, 90, 70)), expected_window)
+        finally:
+            close_scene(scene)
+
+def test_stored_offsets_point_at_member_bytes(tmp_path, measurements):
+    zip_path = make_product(str(tmp_path), measurements, zipfile.ZIP_STORED)
+    index = zip_member_index(zip_path)
+
+    with open(zip_path, 'rb') as f:
+        for pol, member in MEMBERS.items():
+            entry = index[member]
+            assert entry['compress_type'] == zipfile.ZIP_STORED
+            assert entry['size'] == entry['compress_size'] == os.path.getsize(measurements[pol])
+            f.seek(entry['offset'])
+            assert f.read(entry['size']) == open(measurements[pol], 'rb').read()
+            assert member_vsi_path(zip_path, member) == \
+                f"/vsisubfile/{entry['offset']}_{entry['size']},{os.path.abspath(zip_path)}"
+
+def test_index_sidecar_is_reused_until_zip_changes(tmp_path, measurements):
+    zip_path = make_product(str(tmp_path), measurements, zipfile.ZIP_STORED)
+    index = zip_member_index(zip_path)
+    assert os.path.exists(index_file(zip_path))
+
+    # Enquanto tamanho e data do zip não mudam, o índice vem do arquivo
+    with open(index_file(zip_path)) as f:
+        sidecar = json.load(f)
+    assert sidecar['members'] == index
+    sidecar['members'] = {'marker.tiff': dict(index[MEMBERS['vv']])}
+    with open(index_file(zip_path), 'w') as f:
+        json.dump(sidecar, f)
+    assert list(zip_member_index(zip_path)) == ['marker.tiff']
+    assert zip_member_index(zip_path, rebuild=True) == index
+
+    # Um zip regravado (outro tamanho) invalida o índice
+    os.remove(zip_path)
+    make_product(str(tmp_path), {'vh': measurements['vh'], 'vv': measurements['vh']}, zipfile.ZIP_DEFLATED)
+    rebuilt = zip_member_index(zip_path)
+    assert rebuilt[MEMBERS['vv']]['compress_type'] == zipfile.ZIP_DEFLATED
+    with open(index_file(zip_path)) as f:
+        assert json.load(f)['members'] == rebuilt
@@ -0,0 +1,105 @@
+#test_slick_chips
+#_________________________________________________________________________________________
+# Verifica que a versão paralela do recorte das manchas grava os mesmos arquivos e devolve
+# as mesmas mensagens que a versão serial, e que cada chip lido do mosaico (GeoPackage ou
+# GeoParquet) é igual ao recorte gravado um a um
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import sys
+import shutil
+import numpy as np
+import rasterio
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+import get_slick_poly_from_multipoly as slicks
+from chip_store import read_chip, read_chip_index
+from raster_access import open_raster
+from synthetic_data import make_dataset
+
+def tiff_files(directory):
+    return sorted(os.path.relpath(os.path.join(root, name), directory)
+                  for root, _, files in os.walk(directory) for name in files if name.endswith('.tif'))
+
+def test_parallel_matches_serial(tmp_path, monkeypatch):
+    paths = make_dataset(str(tmp_path / 'data'), 1024, 1024, 60)
+    # Unidades pequenas, para que a cena fique espalhada por vários processos
+    monkeypatch.setattr(slicks, 'MAX_UNIT_ENTRIES', 4)
+    for item in slicks.planSlickPolygons(str(tmp_path), paths['database'], paths['shp'], paths['scene']):
+        with open_raster(item[0]) as tiff:
+            units = slicks.planWorkUnits(tiff, item[2])
+        assert len(units) > 4 and max(map(len, units)) <= 4
+        assert sorted(idx for unit in units for idx in unit) == list(range(len(item[2])))
+
+    serial_dir, parallel_dir = str(tmp_path / 'serial'), str(tmp_path / 'parallel')
+    serial = slicks.getSlickPolyFromMultiPolygon(serial_dir, paths['database'], paths['shp'], [paths['scene']])
+    parallel = slicks.getSlickPolyFromMultiPolygonParallel(parallel_dir, paths['database'], paths['shp'],
+                                                           [paths['scene']], maxWorkers=3)
+    assert [message.replace(serial_dir, parallel_dir) for message in serial] == parallel
+
+    files = tiff_files(serial_dir)
+    assert files and files == tiff_files(parallel_dir)
+    for name in files:
+        with rasterio.open(os.path.join(serial_dir, name)) as a, rasterio.open(os.path.join(parallel_dir, name)) as b:
+            assert a.transform == b.transform
+            assert np.array_equal(a.read(), b.read(), equal_nan=True)
+
+@pytest.mark.parametrize('output_format', ['gpkg', 'parquet'])
+@pytest.mark.parametrize('match_scenes', [False, True])
+def test_chip_store_round_trip(tmp_path, output_format, match_scenes):
+    paths = make_dataset(str(tmp_path / 'data'), 512, 512, 20)
+    scene = paths['scene']
+    if match_scenes:
+        # Sem número no nome: o IMG_NUMBER é o nome da cena
+        scene = str(tmp_path / 'data' / 'S1A_synthetic.tif')
+        shutil.copy(paths['scene'], scene)
+    options = dict(matchScenes=True, bestOnly=True) if match_scenes else {}
+    files_dir, store_dir = str(tmp_path / 'files'), str(tmp_path / 'store')
+    slicks.getSlickPolyFromMultiPolygon(files_dir, paths['database'], paths['shp'], [scene], **options)
+    slicks.getSlickPolyFromMultiPolygon(store_dir, paths['database'], paths['shp'], [scene],
+                                        outputFormat=output_format, **options)
+
+    index_file = os.path.join(store_dir, f'slicks.{output_format}')
+    img_number = 'S1A_synthetic' if match_scenes else '1'
+    index = read_chip_index(index_file)
+    assert index['IMG_NUMBER'].map(type).eq(str).all() and set(index['IMG_NUMBER']) == {img_number}
+    assert len(read_chip_index(index_file, img_number=img_number)) == len(index)
+
+    files = tiff_files(files_dir)
+    assert len(files) == len(index) > 0
+    for name in files:
+        part_id = os.path.splitext(os.path.basename(name))[0]
+        image, transform, crs = read_chip(index_file, part_id, img_number)
+        with rasterio.open(os.path.join(files_dir, name)) as chip:
+            assert transform == chip.transform
+            assert crs == chip.crs and type(crs) is type(chip.crs)
+            assert np.array_equal(image, chip.read(), equal_nan=True)
@@ -0,0 +1,106 @@
+#test_time_series
+#_________________________________________________________________________________________
+# Verifica que a série temporal junta em uma única data os frames de uma mesma passagem e
+# dá o mesmo resultado com um único cubo ou com cubos pequenos por lote de polígonos
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import sys
+import numpy as np
+import geopandas as gpd
+import rasterio
+from rasterio.transform import from_origin
+from shapely.geometry import Point
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from time_series import polygon_time_series
+
+STATS_COLUMNS = ["FG_COUNT", "FG_MEAN", "FG_STD", "FG_MIN", "FG_MAX", "FG_MEDIAN",
+                 "BG_COUNT", "BG_MEAN", "BG_STD", "BG_MIN", "BG_MAX", "BG_MEDIAN"]
+
+def write_scene(path, data, transform, time):
+    with rasterio.open(path, 'w', driver='GTiff', height=data.shape[0], width=data.shape[1], count=1,
+                       dtype='float32', crs='EPSG:32723', transform=transform, nodata=np.nan) as dst:
+        dst.write(data, 1)
+        dst.update_tags(ACQUISITION_START_TIME=time)
+    return path
+
+@pytest.fixture
+def scenes(tmp_path):
+    # Duas passagens: a primeira em uma cena só, a segunda em dois frames vizinhos (metades da cena)
+    rng = np.random.default_rng(2)
+    transform = from_origin(500000, 7400000, 10, 10)
+    first = write_scene(str(tmp_path / 'pass1.tif'), rng.gamma(4.0, 0.05, (300, 300)).astype('float32'),
+                        transform, '2024-01-01T08:30:00')
+    second = rng.gamma(4.0, 0.05, (300, 300)).astype('float32')
+    whole = write_scene(str(tmp_path / 'pass2.tif'), second, transform, '2024-01-13T08:30:00')
+    top = write_scene(str(tmp_path / 'pass2_top.tif'), second[:160], transform, '2024-01-13T08:30:00')
+    bottom = write_scene(str(tmp_path / 'pass2_bottom.tif'), second[160:],
+                         transform * transform.translation(0, 160), '2024-01-13T08:30:25')
+
+    centers = rng.uniform(30, 270, size=(25, 2))
+    polygons = gpd.GeoDataFrame({'ID_POLY': np.arange(1, 26)},
+                                geometry=[Point(500000 + 10 * col, 7400000 - 10 * row).buffer(radius)
+                                          for (row, col), radius in zip(centers, rng.uniform(40, 150, 25))],
+                                crs='EPSG:32723')
+    return [first, top, bottom], [first, whole], polygons
+
+@pytest.mark.parametrize('options', [{}, {'background': 'ring', 'ring_width': 4}])
+def test_frames_of_one_pass_form_one_date(scenes, options):
+    frames, whole, polygons = scenes
+    by_frames = polygon_time_series(frames, polygons, **options)
+    by_scene = polygon_time_series(whole, polygons, **options)
+
+    # Uma linha por polígono e data, e os frames somam o mesmo que a cena inteira
+    assert not by_frames.duplicated(['ID_POLY', 'acquisition_date']).any()
+    assert by_frames['acquisition_date'].nunique() == 2
+    assert len(by_frames) == len(by_scene)
+    assert (by_frames['ID_POLY'].to_numpy() == by_scene['ID_POLY'].to_numpy()).all()
+    np.testing.assert_allclose(by_frames[STATS_COLUMNS].to_numpy(float), by_scene[STATS_COLUMNS].to_numpy(float),
+                               rtol=1e-12)
+
+@pytest.mark.parametrize('options', [{}, {'background': 'ring', 'ring_width': 4}])
+def test_batched_cubes_match_single_cube(scenes, tmp_path, options):
+    frames, _, polygons = scenes
+    single = polygon_time_series(frames, polygons, cube_file=str(tmp_path / 'single.tif'), **options)
+    batched = polygon_time_series(frames, polygons, cube_file=str(tmp_path / 'batched.tif'),
+                                  max_cube_pixels=2 * 60 * 60, **options)
+
+    assert len(single) == len(batched) > 0
+    np.testing.assert_allclose(batched[STATS_COLUMNS].to_numpy(float), single[STATS_COLUMNS].to_numpy(float),
+                               rtol=1e-12)
+    # O cubo gravado por lotes tem os mesmos pixels nas áreas dos lotes e NaN fora delas
+    with rasterio.open(tmp_path / 'single.tif') as a, rasterio.open(tmp_path / 'batched.tif') as b:
+        assert a.count == b.count == 2 and a.transform == b.transform
+        cube_a, cube_b = a.read(), b.read()
+    written = np.isfinite(cube_b)
+    assert written.any()
+    assert np.array_equal(cube_a[written], cube_b[written])
@@ -0,0 +1,106 @@
+#test_zonal_stats
+#_________________________________________________________________________________________
+# Verifica que zonal_stats dá o mesmo resultado lendo a imagem em uma única janela ou
+# em lotes pequenos de polígonos vizinhos, com fundo em retângulo e em anel
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import sys
+import numpy as np
+import geopandas as gpd
+import rasterio
+from rasterio.transform import from_origin
+from shapely.geometry import Point, box
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zonal_stats import zonal_features, window_batches
+
+STATS_COLUMNS = ["FG_MEAN", "FG_STD", "FG_MIN", "FG_MAX", "FG_MEDIAN",
+                 "BG_MEAN", "BG_STD", "BG_MIN", "BG_MAX", "BG_MEDIAN", "area", "perim"]
+
+@pytest.fixture
+def scene(tmp_path):
+    # Manchas próximas o bastante para que retângulos e anéis se sobreponham
+    rng = np.random.default_rng(1)
+    centers = rng.uniform(20, 380, size=(40, 2))
+    radii = rng.uniform(30, 120, size=40)
+    polygons = [Point(500000 + 10 * col, 7400000 - 10 * row).buffer(radius)
+                for (row, col), radius in zip(centers, radii)]
+
+    image_file = str(tmp_path / '21 scene.tif')
+    with rasterio.open(image_file, 'w', driver='GTiff', height=400, width=400, count=1, dtype='float32',
+                       crs='EPSG:32723', transform=from_origin(500000, 7400000, 10, 10)) as dst:
+        dst.write(rng.gamma(4.0, 0.05, size=(400, 400)).astype('float32'), 1)
+    return image_file, gpd.GeoDataFrame({'ID_POLY': np.arange(1, 41)}, geometry=polygons, crs='EPSG:32723')
+
+@pytest.mark.parametrize('background', ['bbox', 'ring'])
+def test_batches_match_single_window(scene, background):
+    image_file, polygons = scene
+    single = zonal_features(image_file, polygons, background=background, ring_width=8,
+                            max_window_pixels=400 * 400)
+    batched = zonal_features(image_file, polygons, background=background, ring_width=8,
+                             max_window_pixels=60 * 60)
+
+    assert [row['ID_POLY'] for row in single] == [row['ID_POLY'] for row in batched]
+    for expected, actual in zip(single, batched):
+        for column in STATS_COLUMNS:
+            assert np.isclose(actual[column], expected[column], rtol=1e-9), (expected['ID_POLY'], column)
+        # Só o preenchimento dos pixels NaN junto à borda da janela pode mudar o gradiente
+        assert np.isclose(actual["BORDER_GRAD_MEAN"], expected["BORDER_GRAD_MEAN"], rtol=1e-3)
+
+def test_window_batches_respect_limit(scene):
+    image_file, polygons = scene
+    with rasterio.open(image_file) as src:
+        polygon_windows = [src.window(*polygon.bounds).round_offsets().round_lengths()
+                           for polygon in polygons.geometry]
+    batches = window_batches(polygon_windows + [None], 60 * 60)
+
+    assert sorted(idx for members, _ in batches for idx in members) == list(range(len(polygons)))
+    for members, window in batches:
+        assert len(members) == 1 or window.width * window.height <= 60 * 60
+
+def test_ring_neighbour_outside_own_margin(tmp_path):
+    # Os pixels do anel de A mais próximos de B ficam com B, mesmo quando B está além de uma
+    # largura de anel da janela de A
+    image_file = str(tmp_path / '21 scene.tif')
+    transform = from_origin(500000, 7400000, 10, 10)
+    with rasterio.open(image_file, 'w', driver='GTiff', height=60, width=80, count=1, dtype='float32',
+                       crs='EPSG:32723', transform=transform) as dst:
+        dst.write(np.random.default_rng(2).gamma(4.0, 0.05, size=(60, 80)).astype('float32'), 1)
+    squares = [box(*(transform * (10, 30)), *(transform * (20, 20))),
+               box(*(transform * (35, 30)), *(transform * (45, 20)))]
+    polygons = gpd.GeoDataFrame({'ID_POLY': [1, 2]}, geometry=squares, crs='EPSG:32723')
+
+    single = zonal_features(image_file, polygons, background='ring', ring_width=10, max_window_pixels=80 * 60)
+    batched = zonal_features(image_file, polygons, background='ring', ring_width=10, max_window_pixels=1)
+    for expected, actual in zip(single, batched):
+        for column in STATS_COLUMNS:
+            assert np.isclose(actual[column], expected[column], rtol=1e-9), (expected['ID_POLY'], column)
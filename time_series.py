@@ -0,0 +1,325 @@
+#time_series
+#_________________________________________________________________________________________
+# Empilha todas as cenas baixadas da mesma área em cubos co-registrados (data, linha,
+# coluna) recortados aos polígonos, com os frames de uma mesma data em mosaico, e calcula as
+# estatísticas de objeto (FG), fundo (BG) e contraste de cada polígono em todas as datas de
+# uma só vez, em uma tabela longa com uma linha por (ID_POLY, data de aquisição), para a
+# análise de persistência das manchas
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import argparse
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import rasterio
+from rasterio import windows
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.errors import WindowError
+from rasterio.transform import array_bounds, from_origin
+from rasterio.warp import reproject, transform_bounds
+from rasterio.windows import Window
+from shapely import STRtree
+from shapely.geometry import box
+from crop_slicks_outOf_image import rasterize_polygon_labels
+from crop_image_around_polygon import buffered_bbox
+from scene_matching import read_vector_layers, scene_footprints
+from zonal_stats import (labeled_statistics, bbox_background_labels, ring_background_labels, pixel_size_meters,
+                         window_batches, MAX_WINDOW_PIXELS)
+from raster_access import open_raster
+from safe_zip import list_scene_sources
+
+# Colunas da tabela longa de resultados
+TIME_SERIES_FIELDS = [
+    "ID_POLY", "acquisition_date", "acquisition_time", "scene", "FG_COUNT", "FG_MEAN", "FG_STD", "FG_MIN",
+    "FG_MAX", "FG_MEDIAN", "FG_VAR_COEF", "BG_COUNT", "BG_MEAN", "BG_STD", "BG_MIN", "BG_MAX", "BG_MEDIAN",
+    "BG_VAR_COEF", "FG_BG_MAX_CONTRAST", "FG_BG_MEAN_CONTRAST_RATIO", "POWER_MEAN_RATIO",
+]
+
+def common_grid(bounds, crs, resolution):
+    """
+    Grade comum do cubo: retângulo bounds alinhado a múltiplos da resolução, no sistema crs.
+
+    :return: transformação e dimensões (altura, largura).
+    """
+    res_x, res_y = resolution
+    left = np.floor(bounds[0] / res_x) * res_x
+    top = np.ceil(bounds[3] / res_y) * res_y
+    width = max(1, int(np.ceil((bounds[2] - left) / res_x)))
+    height = max(1, int(np.ceil((top - bounds[1]) / res_y)))
+    return from_origin(left, top, res_x, res_y), (height, width)
+
+def grid_window(bounds, transform, shape):
+    """
+    Janela da grade comum que cobre bounds (arredondada para fora), ou None fora da grade.
+    """
+    window = windows.from_bounds(*bounds, transform=transform)
+    col_off, row_off = int(np.floor(window.col_off)), int(np.floor(window.row_off))
+    window = Window(col_off, row_off, int(np.ceil(window.col_off + window.width)) - col_off,
+                    int(np.ceil(window.row_off + window.height)) - row_off)
+    try:
+        return window.intersection(Window(0, 0, shape[1], shape[0]))
+    except WindowError:
+        return None
+
+def acquisition_dates(footprints):
+    """
+    Agrupa as cenas por data de aquisição (dia UTC): os frames vizinhos de uma mesma passagem
+    formam uma única data. Cenas sem data de aquisição ficam cada uma na sua.
+
+    :return: lista de (data, hora do primeiro frame, cenas), em ordem de aquisição.
+    """
+    footprints = footprints.sort_values('acquisition_time', kind='stable')
+    dates = {}
+    for scene, time in zip(footprints['scene'], footprints['acquisition_time']):
+        key = scene if pd.isna(time) else time.floor('D')
+        if key not in dates:
+            dates[key] = (pd.NaT if pd.isna(time) else key, time, [])
+        dates[key][2].append(scene)
+    return list(dates.values())
+
+def time_series_cube(date_scenes, transform, shape, crs, band_index=1, resampling=Resampling.nearest):
+    """
+    Lê a mesma área de todas as datas, reprojetada na grade comum, em um cubo float32 (data,
+    linha, coluna), com NaN fora das cenas e nos pixels sem dados. Os frames de uma mesma data
+    formam um mosaico na fatia da data (onde se sobrepõem, fica o último frame com dados). De
+    cada cena é lida só a janela que cobre a grade (pela leitura com cache de blocos de
+    raster_access), reprojetada direto na fatia do cubo.
+
+    :param date_scenes: cenas de cada data (caminho, ou lista de caminhos dos frames).
+    """
+    height, width = shape
+    cube = np.full((len(date_scenes), height, width), np.nan, dtype='float32')
+    grid_bounds = array_bounds(height, width, transform)
+    for position, scene_files in enumerate(date_scenes):
+        if isinstance(scene_files, str):
+            scene_files = [scene_files]
+        for scene_file in scene_files:
+            with open_raster(scene_file) as src:
+                left, bottom, right, top = transform_bounds(crs, src.crs, *grid_bounds)
+                try:
+                    # Um pixel de margem, para a reamostragem nas bordas da grade
+                    window = src.window(left, bottom, right, top)
+                    col_off, row_off = int(np.floor(window.col_off)) - 1, int(np.floor(window.row_off)) - 1
+                    window = Window(col_off, row_off, int(np.ceil(window.col_off + window.width)) + 1 - col_off,
+                                    int(np.ceil(window.row_off + window.height)) + 1 - row_off)
+                    window = window.intersection(Window(0, 0, src.width, src.height))
+                except WindowError:
+                    continue  # A cena não cobre a grade
+                band = src.read(band_index, window=window, masked=True)
+                # Sem reiniciar a fatia, os pixels sem dados do frame não apagam os dos anteriores
+                reproject(band.astype('float32').filled(np.nan), cube[position],
+                          src_transform=src.window_transform(window), src_crs=src.crs, src_nodata=np.nan,
+                          dst_transform=transform, dst_crs=crs, dst_nodata=np.nan, init_dest_nodata=False,
+                          resampling=resampling)
+    return cube
+
+def create_cube_file(output_file, times, transform, shape, crs):
+    """
+    Cria o GeoTIFF do cubo, com uma banda por data (a data fica na descrição da banda) e NaN
+    fora das janelas gravadas depois (dst.write(cubo, window=janela)).
+
+    :return: dataset aberto para gravação.
+    """
+    dst = rasterio.open(output_file, 'w', driver='GTiff', height=shape[0], width=shape[1], count=len(times),
+                        dtype='float32', crs=crs, transform=transform, nodata=np.nan, tiled=True,
+                        compress='deflate')
+    for band, time in enumerate(times, start=1):
+        dst.set_band_description(band, str(time))
+    return dst
+
+def stacked_statistics(cube, labels, n_labels):
+    """
+    Estatísticas de todos os rótulos em todas as datas em uma única passada (labeled_statistics
+    sobre o cubo inteiro, com o rótulo de cada pixel deslocado por data: um único bincount e uma
+    única ordenação para todas as datas).
+
+    :return: dicionário de arrays (data, rótulo - 1), como em labeled_statistics.
+    """
+    n_dates = cube.shape[0]
+    dtype = 'int32' if n_dates * (n_labels + 1) < np.iinfo('int32').max else 'int64'
+    offsets = (np.arange(n_dates, dtype=dtype) * n_labels).reshape(-1, 1, 1)
+    stacked_labels = np.where(labels > 0, labels.astype(dtype) + offsets, 0)
+    statistics = labeled_statistics(cube, stacked_labels, n_dates * n_labels)
+    return {key: values.reshape(n_dates, n_labels) for key, values in statistics.items()}
+
+def polygon_time_series(scene_files, polygons, id_field='ID_POLY', background='bbox', buffer_percent=0.05,
+                        ring_width=10, ring_units='pixels', crs=None, resolution=None, band_index=1,
+                        acquisition_times=None, cube_file=None, max_cube_pixels=MAX_WINDOW_PIXELS):
+    """
+    Estatísticas FG/BG de cada polígono em cada data de aquisição, a partir de cubos
+    co-registrados das cenas que cobrem os polígonos. Os frames de uma mesma data formam um
+    mosaico (ver acquisition_dates). Os polígonos são processados em lotes de vizinhos (ver
+    zonal_stats.window_batches), cada um com o seu cubo recortado de no máximo max_cube_pixels
+    (datas x linhas x colunas, mais as margens), e os vizinhos de fora do lote entram nos rótulos
+    como em zonal_stats.zonal_features.
+
+    Parâmetros:
+    scene_files (list): Cenas (.tif ou produtos .zip) da mesma área.
+    polygons (GeoDataFrame): Polígonos (um por linha), com a coluna id_field.
+    background (str): 'bbox' ou 'ring' (ver zonal_stats.zonal_features).
+    crs: Sistema da grade comum (padrão: o da primeira cena).
+    resolution (tuple): Resolução (x, y) da grade comum (padrão: a da primeira cena).
+    acquisition_times (dict): Datas de aquisição por cena (substituem as dos metadados).
+    cube_file (str): Se dado, grava também o cubo na grade comum, com NaN fora dos lotes.
+    max_cube_pixels (int): Tamanho máximo do cubo de cada lote; a memória de trabalho fica em
+        torno de 50 bytes por pixel do cubo.
+
+    Retorna:
+    DataFrame: Colunas TIME_SERIES_FIELDS, uma linha por (ID_POLY, data), ordenada por polígono
+    e data; acquisition_time é a hora do primeiro frame da data e scene, os frames separados
+    por ';'. Pares sem pixels válidos de objeto ou de fundo ficam de fora.
+    """
+    polygons = polygons[~(polygons.geometry.isna() | polygons.geometry.is_empty)].reset_index(drop=True)
+    footprints = scene_footprints(scene_files, crs=polygons.crs, acquisition_times=acquisition_times)
+    if footprints.empty or polygons.empty:
+        return pd.DataFrame(columns=TIME_SERIES_FIELDS)
+
+    with open_raster(footprints['scene'].iat[0]) as first:
+        crs = crs or first.crs
+        resolution = resolution or first.res
+    polygons = polygons.to_crs(crs)
+    n_labels = len(polygons)
+
+    # Extensão de cada polígono: o retângulo de fundo, ou o polígono com a margem do anel
+    pad_x = pad_y = 0
+    if background == 'bbox':
+        extents = [buffered_bbox(polygon, buffer_percent) for polygon in polygons.geometry]
+        bounds = gpd.GeoSeries(extents).total_bounds
+    else:
+        extents = [box(*polygon.bounds) for polygon in polygons.geometry]
+        bounds = polygons.total_bounds
+        pixel_size = (1.0, 1.0)
+        if ring_units == 'meters':
+            pixel_size = pixel_size_meters(from_origin(0, 0, *resolution), CRS.from_user_input(crs),
+                                           (bounds[1] + bounds[3]) / 2)
+        # Margem: a largura do anel (mais um pixel) em cada eixo
+        pad_y, pad_x = (int(np.ceil(ring_width / size)) + 1 for size in pixel_size)
+        margin_y, margin_x = (2 * pad_y + 1) * resolution[1], (2 * pad_x + 1) * resolution[0]
+        bounds = (bounds[0] - margin_x, bounds[1] - margin_y, bounds[2] + margin_x, bounds[3] + margin_y)
+    transform, shape = common_grid(bounds, crs, resolution)
+
+    # Somente as cenas que cobrem a área, agrupadas por data de aquisição
+    area = gpd.GeoSeries([box(*bounds)], crs=crs).to_crs(footprints.crs).iat[0]
+    dates = acquisition_dates(footprints[footprints.intersects(area)])
+    if not dates:
+        return pd.DataFrame(columns=TIME_SERIES_FIELDS)
+    n_dates = len(dates)
+
+    fg = {key: np.full((n_dates, n_labels), np.nan) for key in ("mean", "std", "min", "max", "median")}
+    fg["count"] = np.zeros((n_dates, n_labels), dtype=np.int64)
+    bg = {key: values.copy() for key, values in fg.items()}
+    extents_tree = STRtree(extents)
+    grid = Window(0, 0, shape[1], shape[0])
+    polygon_windows = [grid_window(extent.bounds, transform, shape) for extent in extents]
+    cube_dst = create_cube_file(cube_file, [date for date, _, _ in dates], transform, shape, crs) if cube_file else None
+
+    try:
+        for members, window in window_batches(polygon_windows, max(1, max_cube_pixels // n_dates)):
+            # No anel, margem de duas larguras: a do próprio anel e a dos vizinhos que disputam os seus pixels
+            margin_x, margin_y = (2 * pad_x + 1, 2 * pad_y + 1) if background == 'ring' else (0, 0)
+            window = Window(window.col_off - margin_x, window.row_off - margin_y, window.width + 2 * margin_x,
+                            window.height + 2 * margin_y).intersection(grid)
+            batch_transform = windows.transform(window, transform)
+            batch_shape = (int(window.height), int(window.width))
+            cube = time_series_cube([scenes for _, _, scenes in dates], batch_transform, batch_shape, crs,
+                                    band_index)
+            if cube_dst is not None:
+                cube_dst.write(cube, window=window)
+
+            # Rótulos calculados uma vez na janela do lote e usados em todas as datas
+            nearby = np.sort(extents_tree.query(box(*windows.bounds(window, transform))))
+            nearby_polygons = polygons.iloc[nearby]
+            object_labels = rasterize_polygon_labels(nearby_polygons, batch_shape, batch_transform, id_field=None)
+            if background == 'bbox':
+                background_labels = bbox_background_labels(nearby_polygons, object_labels, batch_transform,
+                                                            buffer_percent)
+            else:
+                background_labels = ring_background_labels(object_labels, ring_width, pixel_size)
+
+            # Rótulos dos vizinhos -> rótulos do lote (0 para os polígonos de fora do lote)
+            members = np.sort(members)
+            member_labels = np.zeros(len(nearby) + 1, dtype='int32')
+            member_labels[np.searchsorted(nearby, members) + 1] = np.arange(1, len(members) + 1)
+            for statistics, labels in ((fg, object_labels), (bg, background_labels)):
+                for key, values in stacked_statistics(cube, member_labels[labels], len(members)).items():
+                    statistics[key][:, members] = values
+    finally:
+        if cube_dst is not None:
+            cube_dst.close()
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        columns = {
+            "FG_COUNT": fg['count'], "FG_MEAN": fg['mean'], "FG_STD": fg['std'], "FG_MIN": fg['min'],
+            "FG_MAX": fg['max'], "FG_MEDIAN": fg['median'], "FG_VAR_COEF": fg['std'] / fg['mean'],
+            "BG_COUNT": bg['count'], "BG_MEAN": bg['mean'], "BG_STD": bg['std'], "BG_MIN": bg['min'],
+            "BG_MAX": bg['max'], "BG_MEDIAN": bg['median'], "BG_VAR_COEF": bg['std'] / bg['mean'],
+            "FG_BG_MAX_CONTRAST": np.abs(bg['mean'] - fg['min']),
+            "FG_BG_MEAN_CONTRAST_RATIO": np.abs(bg['mean'] - fg['mean']),
+            "POWER_MEAN_RATIO": fg['mean'] / bg['mean'],
+        }
+
+    if id_field in polygons.columns:
+        id_polys = polygons[id_field].astype(str).to_numpy()
+    else:
+        id_polys = np.arange(1, n_labels + 1).astype(str)
+
+    # Tabela longa: uma linha por (data, polígono), sem os pares sem pixels válidos
+    table = pd.DataFrame({
+        "ID_POLY": np.tile(id_polys, n_dates),
+        "acquisition_date": np.repeat(np.asarray([date for date, _, _ in dates], dtype=object), n_labels),
+        "acquisition_time": np.repeat(np.asarray([time for _, time, _ in dates], dtype=object), n_labels),
+        "scene": np.repeat(np.asarray([';'.join(scenes) for _, _, scenes in dates], dtype=object), n_labels),
+    })
+    for name, values in columns.items():
+        table[name] = values.ravel()
+    table = table[(table['FG_COUNT'] > 0) & (table['BG_COUNT'] > 0)]
+    return table.sort_values(['ID_POLY', 'acquisition_time'], kind='stable').reset_index(drop=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Série temporal das estatísticas de cada polígono em todas as cenas")
+    parser.add_argument('--img-dir', default='caminho para o arquivo')
+    parser.add_argument('--shp', default='caminho para o arquivo.shp')
+    parser.add_argument('--csv', default='caminho para o arquivo.csv')
+    parser.add_argument('--cube', default=None, help="grava também o cubo (uma banda por data) neste GeoTIFF")
+    parser.add_argument('--background', choices=['bbox', 'ring'], default='bbox')
+    parser.add_argument('--buffer-percent', type=float, default=0.05)
+    parser.add_argument('--ring-width', type=float, default=10)
+    parser.add_argument('--ring-units', choices=['pixels', 'meters'], default='pixels')
+    args = parser.parse_args()
+
+    polygons = read_vector_layers(args.shp)
+    table = polygon_time_series(list_scene_sources(args.img_dir), polygons, background=args.background,
+                                buffer_percent=args.buffer_percent, ring_width=args.ring_width,
+                                ring_units=args.ring_units, cube_file=args.cube)
+    table.to_csv(args.csv, index=False, columns=TIME_SERIES_FIELDS)
+    print(f"{table['ID_POLY'].nunique()} polígonos em {table['acquisition_date'].nunique()} datas. Resultados em {args.csv}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+#zonal_stats
+#_________________________________________________________________________________________
+# Calcula as estatísticas de objeto (FG), fundo (BG) e contraste de todos os polígonos
+# de uma imagem de uma só vez, a partir de rasters de rótulos, sem gravar recortes
+# intermediários. Gera as mesmas colunas de stats_obj_img. O fundo pode ser o retângulo
+# expandido de cada polígono ou um anel de largura fixa (transformada de distância)
+#_________________________________________________________________________________________
+# MIT License
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#__________________________________________________________________________________________
+# Author: Maria Paula Graziotto
+# Github: Graziottomp
+# Email: graziotto.mp@outlook.com
+# Created: 2026-10-17
+#__________________________________________________________________________________________
+
+
+import os
+import csv
+import pandas as pd
+import geopandas as gpd
+from rasterio import windows
+from rasterio.errors import WindowError
+from rasterio.features import rasterize, geometry_window
+from rasterio.windows import Window
+from shapely import STRtree
+from shapely.geometry import box
+import numpy as np
+from scipy import ndimage as ndi
+from crop_slicks_outOf_image import rasterize_polygon_labels
+from crop_image_around_polygon import buffered_bbox
+from stats_obj_img import FIELDNAMES, load_class_data, sobel_gradient
+from shape_features import SHAPE_COLUMNS, shape_features
+from raster_access import open_raster
+
+# Metros por grau de latitude (aproximação esférica), para anéis em metros em imagens geográficas
+METERS_PER_DEGREE = 111320.0
+
+# Pixels da maior janela lida e processada de uma vez (rótulos, gradiente e transformadas de distância)
+MAX_WINDOW_PIXELS = 2048 * 2048
+
+def labeled_statistics(values, labels, n_labels):
+    """
+    Calcula as estatísticas de todos os rótulos de uma vez (reduções com bincount e uma única
+    ordenação dos pixels), ignorando pixels não finitos e o rótulo 0.
+    
+    Parâmetros:
+    values (numpy.ndarray): Valores dos pixels.
+    labels (numpy.ndarray): Rótulos dos pixels (mesmo formato de values), de 0 a n_labels.
+    n_labels (int): Maior rótulo.
+    
+    Retorna:
+    dict: Arrays count, mean, std, min, max e median, indexados por rótulo - 1 (NaN para rótulos sem pixels).
+    """
+    valid = (labels > 0) & np.isfinite(values)
+    label = labels[valid]
+    value = values[valid].astype(np.float64)
+
+    count = np.bincount(label, minlength=n_labels + 1)[1:]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(label, value, minlength=n_labels + 1)[1:] / count
+        deviation = value - mean[label - 1]
+        var = np.bincount(label, deviation * deviation, minlength=n_labels + 1)[1:] / count
+
+    # Uma única ordenação por (rótulo, valor) fornece mínimo, máximo e mediana de cada rótulo
+    order = np.lexsort((value, label))
+    sorted_values = value[order]
+    stop = np.cumsum(count)
+    start = stop - count
+    present = count > 0
+
+    minimum = np.full(n_labels, np.nan)
+    maximum = np.full(n_labels, np.nan)
+    median = np.full(n_labels, np.nan)
+    minimum[present] = sorted_values[start[present]]
+    maximum[present] = sorted_values[stop[present] - 1]
+    lower = start[present] + (count[present] - 1) // 2
+    upper = start[present] + count[present] // 2
+    median[present] = (sorted_values[lower] + sorted_values[upper]) / 2
+
+    return {
+        "count": count,
+        "mean": mean,
+        "std": np.sqrt(var),
+        "min": minimum,
+        "max": maximum,
+        "median": median,
+    }
+
+def _empty_statistics(n_labels):
+    # Estatísticas de n_labels rótulos ainda sem pixels (como em labeled_statistics)
+    statistics = {key: np.full(n_labels, np.nan) for key in ("mean", "std", "min", "max", "median")}
+    statistics["count"] = np.zeros(n_labels, dtype=np.int64)
+    return statistics
+
+def _scatter(statistics, partial, positions):
+    # Copia as estatísticas de um grupo de rótulos (partial) para as posições dos polígonos
+    for key, values in partial.items():
+        statistics[key][positions] = values
+
+def window_batches(polygon_windows, max_pixels):
+    """
+    Agrupa os polígonos próximos em lotes cuja janela conjunta tem no máximo max_pixels pixels
+    (um polígono maior que isso forma sozinho o seu lote). Os polígonos são percorridos por
+    ladrilhos da imagem, para que cada lote reúna vizinhos.
+    
+    Parâmetros:
+    polygon_windows (list): Janela de cada polígono (None para polígonos fora da imagem).
+    max_pixels (int): Tamanho máximo da janela de um lote.
+    
+    Retorna:
+    list: Tuplas (posições dos polígonos, janela conjunta), uma por lote.
+    """
+    tile = max(int(np.sqrt(max_pixels)) // 2, 1)
+    positions = [idx for idx, window in enumerate(polygon_windows) if window is not None]
+    positions.sort(key=lambda idx: (int(polygon_windows[idx].row_off) // tile,
+                                    int(polygon_windows[idx].col_off) // tile))
+    batches = []
+    members, batch_window = [], None
+    for idx in positions:
+        window = polygon_windows[idx]
+        if batch_window is not None:
+            joined = windows.union(batch_window, window)
+            if joined.width * joined.height <= max_pixels:
+                members.append(idx)
+                batch_window = joined
+                continue
+            batches.append((members, batch_window))
+        members, batch_window = [idx], window
+    if members:
+        batches.append((members, batch_window))
+    return batches
+
+def bbox_background_labels(polygons, object_labels, transform, buffer_percent):
+    """
+    Rasteriza o fundo de cada polígono: o retângulo envolvente expandido por buffer_percent
+    (como em crop_image_around_polygon), sem os pixels de nenhum polígono. Onde retângulos se
+    sobrepõem, o pixel fica com o polígono de menor retângulo.
+    
+    Retorna:
+    numpy.ndarray: Raster int32 de rótulos (posição do polígono + 1), com 0 fora dos fundos.
+    """
+    boxes = [buffered_bbox(polygon, buffer_percent) for polygon in polygons.geometry]
+    order = np.argsort([-bbox.area for bbox in boxes], kind='stable')
+    background_labels = rasterize(((boxes[idx], idx + 1) for idx in order), out_shape=object_labels.shape,
+                                  transform=transform, fill=0, dtype='int32')
+    background_labels[object_labels > 0] = 0
+    return background_labels
+
+def pixel_size_meters(transform, crs, center_y=0.0):
+    """
+    Tamanho do pixel (altura, largura) em metros. Em imagens geográficas, os graus são convertidos
+    na latitude center_y.
+    """
+    height, width = abs(transform.e), abs(transform.a)
+    if crs is not None and crs.is_geographic:
+        return height * METERS_PER_DEGREE, width * METERS_PER_DEGREE * np.cos(np.radians(center_y))
+    return height, width
+
+def ring_background_labels(object_labels, ring_width, pixel_size=(1.0, 1.0)):
+    """
+    Rasteriza o fundo de todos os polígonos de uma vez como anéis de largura fixa: com uma única
+    transformada de distância sobre o raster de rótulos, cada pixel fora dos polígonos a até
+    ring_width do polígono mais próximo recebe o rótulo desse polígono. Pixels de outros
+    polígonos (manchas) nunca entram no fundo.
+
+    A transformada guarda os índices do pixel mais próximo (dois int64 por pixel), por isso
+    zonal_features a chama por janela de lote, com margem de duas larguras de anel, e não
+    sobre a imagem inteira.
+    
+    Parâmetros:
+    object_labels (numpy.ndarray): Raster de rótulos dos polígonos, com 0 fora deles.
+    ring_width (float): Largura do anel, nas unidades de pixel_size.
+    pixel_size (tuple): Altura e largura do pixel (ex.: em metros, ver pixel_size_meters);
+        com (1, 1), ring_width é dado em pixels.
+    
+    Retorna:
+    numpy.ndarray: Raster int32 de rótulos (os mesmos de object_labels), com 0 fora dos anéis.
+    """
+    outside = object_labels == 0
+    if outside.all():
+        return np.zeros(object_labels.shape, dtype='int32')
+    distance, (rows, cols) = ndi.distance_transform_edt(outside, sampling=pixel_size, return_indices=True)
+    ring = outside & (distance <= ring_width)
+    background_labels = np.zeros(object_labels.shape, dtype='int32')
+    background_labels[ring] = object_labels[rows[ring], cols[ring]]
+    return background_labels
+
+def border_gradient(band, object_labels):
+    """
+    Magnitude do gradiente (Sobel) da banda com os polígonos em NaN, como nos recortes de fundo,
+    e máscara das bordas (gradiente positivo e finito). Nas bordas dos retângulos de fundo o
+    gradiente usa os pixels vizinhos reais da imagem, e não o reflexo da borda do recorte.
+    """
+    finite = np.isfinite(band) & (object_labels == 0)
+    gradient_magnitude = sobel_gradient(band, finite)
+    edges = finite & (gradient_magnitude > 0)
+    return gradient_magnitude, edges
+
+def zonal_features(image_file, polygons, class_data=None, buffer_percent=0.05, id_field='ID_POLY',
+                   img_name=None, img_number=None, band_index=1, background='bbox', ring_width=10,
+                   ring_units='pixels', max_window_pixels=MAX_WINDOW_PIXELS):
+    """
+    Calcula as estatísticas de objeto (FG), fundo (BG), contraste, gradiente de borda e forma de
+    todos os polígonos de uma imagem, lendo a imagem por lotes de polígonos vizinhos, cada um
+    com uma janela de no máximo max_window_pixels (mais as margens).
+
+    A convenção é a de stats_obj_img.stats_obj_img e pipeline.process_scene: FG_* vêm dos pixels
+    do polígono, BG_* dos pixels do fundo e BORDER_GRAD_* do gradiente da imagem com os polígonos
+    em NaN. Com fundos isolados, FG_* e BG_* são os mesmos dos recortes; as diferenças são que
+    aqui os pixels de outros polígonos dentro do retângulo não entram no fundo, onde retângulos
+    se sobrepõem cada pixel vai para um único polígono, e o gradiente nas bordas do retângulo
+    usa os vizinhos reais da imagem (tests/test_engines.py compara os três caminhos).
+    
+    Parâmetros:
+    image_file (str): Caminho do arquivo da imagem.
+    polygons (GeoDataFrame): Polígonos da imagem (um por linha).
+    class_data (dict): Dados de classe por ID_POLY (ver stats_obj_img.load_class_data).
+    buffer_percent (float): Percentual de buffer do retângulo de fundo ao redor de cada polígono.
+    background (str): Definição do fundo: 'bbox' (retângulo expandido por buffer_percent, como em
+        crop_image_around_polygon) ou 'ring' (anel de largura ring_width ao redor do polígono,
+        ver ring_background_labels).
+    ring_width (float): Largura do anel de fundo no modo 'ring'.
+    ring_units (str): Unidade de ring_width: 'pixels' ou 'meters'.
+    id_field (str): Coluna com o ID_POLY de cada polígono.
+    img_name (str): Nome da imagem nos resultados (padrão: nome do arquivo).
+    img_number (str): IMG_NUMBER nos resultados (padrão: primeiro termo numérico do nome do arquivo).
+    band_index (int): Banda usada nas estatísticas.
+    max_window_pixels (int): Tamanho máximo da janela lida de cada vez (ver window_batches); a
+        memória de trabalho fica em torno de 50 bytes por pixel da janela.
+    
+    Retorna:
+    list: Um dicionário por polígono, com as colunas de stats_obj_img.FIELDNAMES.
+    """
+    if background not in ('bbox', 'ring'):
+        raise ValueError(f"Fundo desconhecido: {background}")
+    if ring_units not in ('pixels', 'meters'):
+        raise ValueError(f"Unidade desconhecida: {ring_units}")
+    class_data = class_data or {}
+    if img_name is None:
+        img_name = os.path.splitext(os.path.basename(image_file))[0]
+    if img_number is None:
+        first_token = img_name.split(' ')[0]
+        img_number = first_token if first_token.isdigit() else ''
+
+    with open_raster(image_file) as src:
+        if polygons.crs is not None and src.crs is not None and polygons.crs != src.crs:
+            polygons = polygons.to_crs(src.crs)
+        polygons = polygons[~(polygons.geometry.isna() | polygons.geometry.is_empty)]
+        n_labels = len(polygons)
+
+        # Janela de cada polígono: o retângulo de fundo, ou o polígono com a margem do anel
+        pad_x = pad_y = 0
+        if background == 'bbox':
+            extents = [buffered_bbox(polygon, buffer_percent) for polygon in polygons.geometry]
+        else:
+            extents = [box(*polygon.bounds) for polygon in polygons.geometry]
+            pixel_size = (1.0, 1.0)
+            if ring_units == 'meters':
+                bounds = polygons.total_bounds
+                pixel_size = pixel_size_meters(src.transform, src.crs, (bounds[1] + bounds[3]) / 2)
+            # Margem da janela: a largura do anel, em pixels de cada eixo
+            pad_y, pad_x = (int(np.ceil(ring_width / size)) + 1 for size in pixel_size)
+        polygon_windows = [None] * n_labels
+        for idx, extent in enumerate(extents):
+            try:
+                polygon_windows[idx] = geometry_window(src, [extent])
+            except WindowError:
+                pass  # Polígono fora da imagem: fica sem pixels
+
+        fg = _empty_statistics(n_labels)
+        bg = _empty_statistics(n_labels)
+        grad = _empty_statistics(n_labels)
+        shape = pd.DataFrame(np.nan, index=range(n_labels), columns=SHAPE_COLUMNS)
+        extents_tree = STRtree(extents)
+        raster_window = Window(0, 0, src.width, src.height)
+
+        # Os polígonos são processados em lotes de vizinhos, cada um com a sua janela, e as
+        # estatísticas de cada lote vão para as posições dos seus polígonos
+        for members, window in window_batches(polygon_windows, max_window_pixels):
+            # Margem: um pixel para o gradiente de Sobel das bordas do fundo e, no anel, duas larguras
+            # de anel: a do próprio anel e a dos polígonos vizinhos que disputam os seus pixels
+            margin_x, margin_y = 2 * pad_x + 1, 2 * pad_y + 1
+            window = Window(window.col_off - margin_x, window.row_off - margin_y, window.width + 2 * margin_x,
+                            window.height + 2 * margin_y).intersection(raster_window)
+            transform = src.window_transform(window)
+            band = src.read(band_index, window=window, masked=True)
+            band = band.astype(np.result_type(band.dtype, np.float32)).filled(np.nan)
+
+            # Todos os polígonos cujo retângulo cai na janela entram nos rótulos (ficam fora do fundo
+            # e disputam os pixels de fundo), mas apenas os do lote têm estatísticas
+            nearby = np.sort(extents_tree.query(box(*windows.bounds(window, src.transform))))
+            nearby_polygons = polygons.iloc[nearby]
+            object_labels = rasterize_polygon_labels(nearby_polygons, band.shape, transform, id_field=None)
+            if background == 'bbox':
+                background_labels = bbox_background_labels(nearby_polygons, object_labels, transform,
+                                                            buffer_percent)
+            else:
+                background_labels = ring_background_labels(object_labels, ring_width, pixel_size)
+            gradient_magnitude, edges = border_gradient(band, object_labels)
+
+            # Rótulos dos vizinhos -> rótulos do lote (0 para os polígonos de fora do lote)
+            members = np.sort(members)
+            member_labels = np.zeros(len(nearby) + 1, dtype='int32')
+            member_labels[np.searchsorted(nearby, members) + 1] = np.arange(1, len(members) + 1)
+            object_labels = member_labels[object_labels]
+            background_labels = member_labels[background_labels]
+
+            _scatter(fg, labeled_statistics(band, object_labels, len(members)), members)
+            _scatter(bg, labeled_statistics(band, background_labels, len(members)), members)
+            _scatter(grad, labeled_statistics(gradient_magnitude, np.where(edges, background_labels, 0),
+                                              len(members)), members)
+            shape.iloc[members] = shape_features(polygons.iloc[members], labels=object_labels).to_numpy()
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fg_var_coef = fg['std'] / fg['mean']
+        bg_var_coef = bg['std'] / bg['mean']
+        max_contrast = np.abs(bg['mean'] - fg['min'])
+        mean_contrast = np.abs(bg['mean'] - fg['mean'])
+        power_mean_ratio = fg['mean'] / bg['mean']
+
+    if id_field in polygons.columns:
+        id_polys = polygons[id_field].astype(str).to_numpy()
+    else:
+        id_polys = np.arange(1, n_labels + 1).astype(str)
+
+    results = []
+    for idx, id_poly in enumerate(id_polys):
+        if fg['count'][idx] == 0 or bg['count'][idx] == 0:
+            print(f"Erro ao processar o polígono {id_poly}: objeto ou fundo sem valores válidos")
+            continue
+
+        classe_info = class_data.get(id_poly.split('_')[0], {'CLASSE': 'Desconhecido', 'SUBCLASSE': 'Desconhecido'})
+        results.append({
+            "img_name": img_name,
+            "IMG_NUMBER": img_number,
+            "ID_POLY": id_poly,
+            "CLASSE": classe_info['CLASSE'],
+            "SUBCLASSE": classe_info['SUBCLASSE'],
+            "area": shape['area'].iat[idx],
+            "perim": shape['perim'].iat[idx],
+            "complexity_measure": shape['complexity_measure'].iat[idx],
+            "spreading": shape['spreading'].iat[idx],
+            "shape_factor": shape['shape_factor'].iat[idx],
+            "hu_moment": shape['hu_moment'].iat[idx],
+            "circularity": shape['circularity'].iat[idx],
+            "FG_MEAN": fg['mean'][idx],
+            "FG_STD": fg['std'][idx],
+            "FG_MIN": fg['min'][idx],
+            "FG_MAX": fg['max'][idx],
+            "FG_MEDIAN": fg['median'][idx],
+            "FG_VAR_COEF": fg_var_coef[idx],
+            "FG_THRES": fg['mean'][idx],
+            "BG_MEAN": bg['mean'][idx],
+            "BG_STD": bg['std'][idx],
+            "BG_MIN": bg['min'][idx],
+            "BG_MAX": bg['max'][idx],
+            "BG_MEDIAN": bg['median'][idx],
+            "BG_VAR_COEF": bg_var_coef[idx],
+            "BG_THRES": bg['mean'][idx],
+            "FG_BG_MAX_CONTRAST": max_contrast[idx],
+            "FG_BG_MEAN_CONTRAST_RATIO": mean_contrast[idx],
+            "POWER_MEAN_RATIO": power_mean_ratio[idx],
+            "BORDER_GRAD_MEAN": grad['mean'][idx],
+            "BORDER_GRAD_STD": grad['std'][idx],
+            "BORDER_GRAD_MAX": grad['max'][idx],
+        })
+
+    return results
+
+def main():
+    # Uso do exemplo:
+    image_file = 'caminho para o arquivo.tif'
+    shp_file = 'caminho para o arquivo.shp'
+    class_data_csv = 'caminho para o arquivo.csv'
+    csv_filename = 'caminho para o arquivo.csv'
+
+    # Fundo: 'bbox' (retângulo expandido) ou 'ring' (anel de ring_width ao redor de cada polígono)
+    background = 'bbox'
+
+    polygons = gpd.read_file(shp_file)
+    results = zonal_features(image_file, polygons, load_class_data(class_data_csv), background=background,
+                             ring_width=100, ring_units='meters')
+
+    with open(csv_filename, mode='w', newline='') as csvfile:
+        csv_writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+        csv_writer.writeheader()
+        csv_writer.writerows(results)
+
+    print(f"Resultados de {len(results)} polígonos salvos em {csv_filename}")
+
+if __name__ == "__main__":
+    main()